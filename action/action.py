@@ -1,12 +1,15 @@
 from __future__ import annotations
 from value import Value
+from utility import SlotCopy
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from battle import BattleState
     from game import GameState
     from agent import Agent
 
-class Action:
+class Action(SlotCopy):
+    __slots__ = ('values',)
+
     def __init__(self, *values: Value) -> None:
         self.values = values
 
@@ -20,6 +23,8 @@ class Action:
         return self.__class__.__name__ + "({})".format('-'.join([value.__repr__() for value in self.values]))
     
 class AndAction(Action):
+    __slots__ = ('actions',)
+
     def __init__(self, *actions: Action):
         super().__init__(*[value for action in actions for value in action.values])
         self.actions = actions
@@ -32,6 +37,8 @@ class AndAction(Action):
         return ' and '.join([action.__repr__() for action in self.actions])
 
 class AddMana(Action):
+    __slots__ = ('val',)
+
     def __init__(self, val: Value):
         super().__init__(val)
         self.val = val
@@ -40,6 +47,8 @@ class AddMana(Action):
         battle_state.add_to_mana(self.val.get())
 
 class PlayCard(Action):
+    __slots__ = ('card_index',)
+
     def __init__(self, card_index: int):
         super().__init__()
         self.card_index = card_index
@@ -54,10 +63,14 @@ class PlayCard(Action):
         return f"Play card {self.card_index} from your hand"
 
 class NoAction(Action):
+    __slots__ = ()
+
     def play(self, by: Agent, game_state: GameState, battle_state: BattleState) -> None:
         pass
 
 class EndAgentTurn(Action):
+    __slots__ = ()
+
     def play(self, by: Agent, game_state: GameState, battle_state: BattleState) -> None:
         battle_state.end_agent_turn()
     
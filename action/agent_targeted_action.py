@@ -1,7 +1,7 @@
 from __future__ import annotations
 from value import Value, ConstValue
 from status_effecs import StatusEffectDefinition, strength_apply, vigor_apply, vulnerable_apply, weak_apply, vigor_after
-from utility import Event
+from utility import Event, SlotCopy
 from typing import TYPE_CHECKING
 from action.action import Action
 if TYPE_CHECKING:
@@ -11,6 +11,8 @@ if TYPE_CHECKING:
     from target.agent_target import AgentTarget
 
 class AgentTargetedAction(Action):
+    __slots__ = ('targeted', 'target')
+
     def __init__(self, targeted: AgentTargeted, target: AgentTarget):
         super().__init__(*targeted.values)
         self.targeted = targeted
@@ -22,7 +24,9 @@ class AgentTargetedAction(Action):
     def __repr__(self) -> str:
         return self.targeted.__repr__() + " to " + self.target.__repr__()
 
-class AgentTargeted:
+class AgentTargeted(SlotCopy):
+    __slots__ = ('values',)
+
     def __init__(self, *values: Value) -> None:
         self.values = values
 
@@ -43,6 +47,8 @@ class AgentTargeted:
         return self.__class__.__name__ + "({})".format('-'.join([value.__repr__() for value in self.values]))
 
 class AndAgentTargeted(AgentTargeted):
+    __slots__ = ('targeted_set',)
+
     def __init__(self, *targeted_set: AgentTargeted):
         super().__init__(*[value for targeted in targeted_set for value in targeted.values])
         self.targeted_set = targeted_set
@@ -55,6 +61,7 @@ class AndAgentTargeted(AgentTargeted):
         return ' and '.join([targeted.__repr__() for targeted in self.targeted_set])
 
 class DealAttackDamage(AgentTargeted):
+    __slots__ = ('val', 'times')
     event: Event[int, tuple[Agent, GameState, BattleState, Agent]] = Event()
     def __init__(self, val: Value, times: Value = ConstValue(1)):
         super().__init__(val)
@@ -78,6 +85,8 @@ class DealAttackDamage(AgentTargeted):
         
 
 class DealDamage(AgentTargeted):
+    __slots__ = ('val', 'times')
+
     def __init__(self, val: Value, times: Value = ConstValue(1)):
         super().__init__(val)
         self.val = val
@@ -97,6 +106,8 @@ class DealDamage(AgentTargeted):
         
 
 class Heal(AgentTargeted):
+    __slots__ = ('val',)
+
     def __init__(self, val: Value):
         super().__init__(val)
         self.val = val
@@ -108,6 +119,8 @@ class Heal(AgentTargeted):
         return f"Apply {self.val.peek()} heal"
 
 class AddBlock(AgentTargeted):
+    __slots__ = ('val',)
+
     def __init__(self, val: Value):
         super().__init__(val)
         self.val = val
@@ -119,6 +132,8 @@ class AddBlock(AgentTargeted):
         return f"Add {self.val.peek()} block"
 
 class ApplyStatus(AgentTargeted):
+    __slots__ = ('val', 'status_effect')
+
     def __init__(self, val: Value, status_effect: StatusEffectDefinition):
         super().__init__(val)
         self.val = val
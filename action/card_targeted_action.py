@@ -2,6 +2,7 @@ from __future__ import annotations
 from value import Value
 from action.action import Action
 import copy
+from utility import SlotCopy
 from target.card_target import CardTarget, CardPile
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -11,30 +12,30 @@ if TYPE_CHECKING:
     from agent import Agent
 
 class CardTargetedAction(Action):
-    def __init__(self, targeted: CardTargetedL1, target: CardTarget, by: Card):
+    # the targets depend on the card being played, so this is only played compiled, by run_program
+    __slots__ = ('targeted', 'target')
+
+    def __init__(self, targeted: CardTargetedL1):
         super().__init__(*targeted.values)
         self.targeted = targeted
-        self.target = target
-        self.by = by
+        self.target = targeted.target
     
     def play(self, by: Agent, game_state: GameState, battle_state: BattleState) -> None:
-        try:
-            target_card = self.target.get(self.by, battle_state)
-        except CardTarget.NoneAvailabeException:
-            return
-        self.targeted.play_many(by, game_state, battle_state, target_card)
+        raise Exception(f"{self} needs the card that plays it, it is played through run_program")
     
     def __repr__(self) -> str:
-        return self.targeted.__repr__()# + " by " + self.by.name
+        return self.targeted.__repr__()
+
+class CardTargetedL1(SlotCopy):
+    __slots__ = ('values', 'card_targetd', 'target')
 
-class CardTargetedL1:
     def __init__(self, card_targeted: CardTargetedL2, target: CardTarget, *values: Value) -> None:
         self.values = values
         self.card_targetd = card_targeted
         self.target = target
 
-    def By(self, by: Card) -> CardTargetedAction:
-        return CardTargetedAction(self, self.target, by)
+    def as_action(self) -> CardTargetedAction:
+        return CardTargetedAction(self)
     
     def play_many(self, by: Agent, game_state: GameState, battle_state: BattleState, targets: list[Card]) -> None:
         self.card_targetd.play_many(by, game_state, battle_state, targets)
@@ -42,7 +43,9 @@ class CardTargetedL1:
     def __repr__(self) -> str:
         return self.card_targetd.__repr__() + " to " + self.target.__repr__()
 
-class CardTargetedL2:
+class CardTargetedL2(SlotCopy):
+    __slots__ = ('values',)
+
     def __init__(self, *values: Value) -> None:
         self.values = values
 
@@ -63,6 +66,8 @@ class CardTargetedL2:
         return self.__class__.__name__ + "({})".format('-'.join([value.__repr__() for value in self.values]))
 
 class AndCardTargeted(CardTargetedL2):
+    __slots__ = ('targeted_set',)
+
     def __init__(self, *targeted_set: CardTargetedL2):
         super().__init__(*[value for targeted in targeted_set for value in targeted.values])
         self.targeted_set = targeted_set
@@ -75,6 +80,8 @@ class AndCardTargeted(CardTargetedL2):
         return ' and '.join(*[targeted.__repr__() for targeted in self.targeted_set])
 
 class Exhaust(CardTargetedL2):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
     
@@ -82,30 +89,27 @@ class Exhaust(CardTargetedL2):
         battle_state.exhaust(target)
 
 class AddCopy(CardTargetedL2):
+    __slots__ = ('card_pile',)
+
     def __init__(self, card_pile: CardPile):
         super().__init__()
         self.card_pile = card_pile
     
     def play(self, by: Agent, game_state: GameState, battle_state: BattleState, target: Card) -> None:
-        if self.card_pile == CardPile.DISCARD:
-            battle_state.discard_pile.append(copy.deepcopy(target))
-        elif self.card_pile == CardPile.DRAW:
-            battle_state.draw_pile.append(copy.deepcopy(target))
-        elif self.card_pile == CardPile.HAND:
-            battle_state.hand.append(copy.deepcopy(target))
-        elif self.card_pile == CardPile.EXHAUST:
-            battle_state.exhaust_pile.append(copy.deepcopy(target))
-        else:
-            raise Exception("Unrecognized CardPile to add a copy to")
+        battle_state.add_card(self.card_pile, copy.deepcopy(target))
 
 class UpgradeCard(CardTargetedL2):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
     def play(self, by: Agent, game_state: GameState, battle_state: BattleState, target: Card) -> None:
-        target.upgrade()
+        battle_state.upgrade_card(target)
 
 class DiscardCard(CardTargetedL2):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
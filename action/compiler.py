@@ -0,0 +1,131 @@
+from __future__ import annotations
+from action.action import Action, AndAction, AddMana
+from action.agent_targeted_action import AgentTargetedAction, AgentTargeted, AndAgentTargeted, DealAttackDamage, DealDamage, Heal, AddBlock, ApplyStatus
+from action.card_targeted_action import CardTargetedAction, CardTargetedL2, AndCardTargeted, Exhaust, AddCopy, UpgradeCard, DiscardCard
+from target.card_target import CardTarget
+from status_effecs import StatusEffectRepo, strength_apply, vigor_apply, vulnerable_apply, weak_apply, vigor_after
+from typing import TYPE_CHECKING, Any
+if TYPE_CHECKING:
+    from battle import BattleState
+    from game import GameState
+    from agent import Agent
+    from card import Card
+
+# An action tree is compiled into a flat list of instructions, each a tuple starting with its opcode:
+#   (MANA, value)
+#   (AGENT_TARGETED, agent_target, leaves): leaves are played in order on each target
+#   (CARD_TARGETED, card_target, leaves): the card playing the program is given to run_program
+#   (ACTION, action): any other action, played as is
+# and each leaf is an (opcode, node) pair, node being the AgentTargeted or CardTargetedL2 it came from.
+Instruction = tuple[Any, ...]
+
+class Opcode:
+    MANA = 0
+    AGENT_TARGETED = 1
+    CARD_TARGETED = 2
+    ACTION = 3
+    ATTACK = 4
+    DAMAGE = 5
+    HEAL = 6
+    BLOCK = 7
+    STATUS = 8
+    EXHAUST = 9
+    ADD_COPY = 10
+    UPGRADE = 11
+    PLAY = 12
+
+def _compile_agent_targeted(targeted: AgentTargeted) -> list[tuple[int, AgentTargeted]]:
+    if isinstance(targeted, AndAgentTargeted):
+        return [leaf for sub in targeted.targeted_set for leaf in _compile_agent_targeted(sub)]
+    if isinstance(targeted, DealAttackDamage):
+        return [(Opcode.ATTACK, targeted)]
+    if isinstance(targeted, DealDamage):
+        return [(Opcode.DAMAGE, targeted)]
+    if isinstance(targeted, Heal):
+        return [(Opcode.HEAL, targeted)]
+    if isinstance(targeted, AddBlock):
+        return [(Opcode.BLOCK, targeted)]
+    if isinstance(targeted, ApplyStatus):
+        return [(Opcode.STATUS, targeted)]
+    return [(Opcode.PLAY, targeted)]
+
+def _compile_card_targeted(targeted: CardTargetedL2) -> list[tuple[int, CardTargetedL2]]:
+    if isinstance(targeted, AndCardTargeted):
+        return [leaf for sub in targeted.targeted_set for leaf in _compile_card_targeted(sub)]
+    if isinstance(targeted, Exhaust):
+        return [(Opcode.EXHAUST, targeted)]
+    if isinstance(targeted, AddCopy):
+        return [(Opcode.ADD_COPY, targeted)]
+    if isinstance(targeted, UpgradeCard):
+        return [(Opcode.UPGRADE, targeted)]
+    if isinstance(targeted, DiscardCard):
+        return []
+    return [(Opcode.PLAY, targeted)]
+
+def compile_action(action: Action) -> list[Instruction]:
+    if isinstance(action, AndAction):
+        return [instruction for sub in action.actions for instruction in compile_action(sub)]
+    if isinstance(action, AddMana):
+        return [(Opcode.MANA, action.val)]
+    if isinstance(action, AgentTargetedAction):
+        return [(Opcode.AGENT_TARGETED, action.target, tuple(_compile_agent_targeted(action.targeted)))]
+    if isinstance(action, CardTargetedAction):
+        # kept even without leaves, the target is still chosen
+        return [(Opcode.CARD_TARGETED, action.target, tuple(_compile_card_targeted(action.targeted.card_targetd)))]
+    return [(Opcode.ACTION, action)]
+
+def compile_actions(actions: list[Action]) -> list[Instruction]:
+    return [instruction for action in actions for instruction in compile_action(action)]
+
+def _has_default_attack_listeners() -> bool:
+    event = DealAttackDamage.event
+    return len(event.before.listeners) == 0 and event.after.listeners == [vigor_after] and \
+        event.values.listeners == [vigor_apply, vulnerable_apply, weak_apply, strength_apply]
+
+def _attack(by: Agent, target: Agent, node: DealAttackDamage):
+    # DealAttackDamage.play with its default listeners inlined: vigor, vulnerable, weak, strength
+    by_state = by.status_effect_state
+    vigor = by_state.get(StatusEffectRepo.VIGOR)
+    amount = node.val.get() + vigor
+    if target.status_effect_state.get(StatusEffectRepo.VULNERABLE) > 0:
+        amount = int(amount * 1.5)
+    if by_state.get(StatusEffectRepo.WEAK) > 0:
+        amount = int(amount * 0.75)
+    amount += by_state.get(StatusEffectRepo.STRENGTH)
+    for _ in range(node.times.get()):
+        target.get_damaged(round(amount))
+    if vigor != 0:
+        by_state.remove_status(StatusEffectRepo.VIGOR)
+
+def run_program(program: list[Instruction], by: Agent, game_state: GameState, battle_state: BattleState, card: Card|None = None):
+    inline_attack: bool|None = None
+    for instruction in program:
+        opcode = instruction[0]
+        if opcode == Opcode.AGENT_TARGETED:
+            for target in instruction[1].get(by, battle_state):
+                for leaf_opcode, node in instruction[2]:
+                    if leaf_opcode == Opcode.ATTACK:
+                        if inline_attack is None:
+                            inline_attack = _has_default_attack_listeners()
+                        if inline_attack:
+                            _attack(by, target, node)
+                        else:
+                            node.play(by, game_state, battle_state, target)
+                    elif leaf_opcode == Opcode.BLOCK:
+                        target.gain_block(node.val.get())
+                    elif leaf_opcode == Opcode.STATUS:
+                        target.status_effect_state.apply_status(node.status_effect, node.val.get())
+                    else:
+                        node.play(by, game_state, battle_state, target)
+        elif opcode == Opcode.MANA:
+            battle_state.add_to_mana(instruction[1].get())
+        elif opcode == Opcode.CARD_TARGETED:
+            try:
+                targets = instruction[1].get(card, battle_state)
+            except CardTarget.NoneAvailabeException:
+                continue
+            for target_card in targets:
+                for _, node in instruction[2]:
+                    node.play(by, game_state, battle_state, target_card)
+        else:
+            instruction[1].play(by, game_state, battle_state)
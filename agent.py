@@ -1,8 +1,9 @@
 from __future__ import annotations
+import copy
 from action.action import Action
 from config import Character, MAX_HEALTH
 from value import RandomUniformRange, ConstValue
-from utility import RoundRobin, RoundRobinRandomStart, ItemSet, ItemSequence, RandomizedItemSet, PreventRepeats
+from utility import RoundRobin, RoundRobinRandomStart, ItemSet, ItemSequence, RandomizedItemSet, PreventRepeats, Zobrist, SlotCopy, UndoLog
 from action.action import EndAgentTurn
 from action.agent_targeted_action import DealAttackDamage, AddBlock, ApplyStatus
 from target.agent_target import PlayerAgentTarget, SelfAgentTarget
@@ -15,7 +16,9 @@ if TYPE_CHECKING:
     from action.action import Action
     from ggpa.ggpa import GGPA
 
-class Agent:
+class Agent(SlotCopy):
+    __slots__ = ('max_health', 'health', 'block', 'status_effect_state', 'name', 'prev_action', 'zobrist_hash')
+
     def __init__(self, name: str, max_health: int):
         self.max_health = max_health
         self.health = max_health
@@ -23,6 +26,8 @@ class Agent:
         self.status_effect_state = StatusEffectState()
         self.name = name
         self.prev_action: Action|None = None
+        # kept in sync by _set_health and _set_block, status effects keep their own hash
+        self.zobrist_hash = self._compute_zobrist_hash()
     
     def set_name(self) -> None:
         raise NotImplementedError("Set name is not implemented for {}.".format(self.__class__.__name__))
@@ -30,40 +35,64 @@ class Agent:
     def is_dead(self):
         return self.health <= 0
 
+    def _set_health(self, health: int):
+        if UndoLog.active is not None:
+            UndoLog.active.record(self._restore, self.health, self.block, self.zobrist_hash)
+        self.zobrist_hash += Zobrist.key('health', health) - Zobrist.key('health', self.health)
+        self.health = health
+
+    def _set_block(self, block: int):
+        if UndoLog.active is not None:
+            UndoLog.active.record(self._restore, self.health, self.block, self.zobrist_hash)
+        self.zobrist_hash += Zobrist.key('block', block) - Zobrist.key('block', self.block)
+        self.block = block
+
+    def _restore(self, health: int, block: int, zobrist_hash: int):
+        self.health = health
+        self.block = block
+        self.zobrist_hash = zobrist_hash
+
     def get_damaged(self, amount: int):
         assert amount >= 0, "Damage amount cannot be less than 0"
         blocked = min(self.block, amount)
         amount -= blocked
-        self.block -= blocked
-        self.health -= amount
-        if self.health <= 0:
-            self.health = 0
+        self._set_block(self.block - blocked)
+        self._set_health(max(self.health - amount, 0))
     
     def clear_block(self):
-        self.block = 0
+        self._set_block(0)
 
     def clean_up(self):
         self.status_effect_state.clean_up()
-        self.block = 0
+        self._set_block(0)
 
     def gain_block(self, amount: int):
         assert amount >= 0, "Block amount cannot be less than 0"
-        self.block += amount
-        if self.block >= MAX_BLOCK:
-            self.block = MAX_BLOCK
+        self._set_block(min(self.block + amount, MAX_BLOCK))
         
     def get_healed(self, amount: int):
         assert amount >= 0, "Heal amount cannot be less than 0"
-        self.health += amount
-        if self.health >= self.max_health:
-            self.health = self.max_health
+        self._set_health(min(self.health + amount, self.max_health))
     
     def _get_action(self, game_state: GameState, battle_state: BattleState) -> Action:
         raise NotImplementedError("The \"_get_action\" method is not implemented for {}.".format(self.__class__.__name__))
     
     def play(self, game_state: GameState, battle_state: BattleState) -> None:
+        if UndoLog.active is not None:
+            UndoLog.active.record(setattr, self, 'prev_action', self.prev_action)
         self.prev_action = self._get_action(game_state, battle_state)
         self.prev_action.play(self, game_state, battle_state)
+
+    def clone(self) -> Agent:
+        ret = copy.copy(self)
+        ret.status_effect_state = self.status_effect_state.clone()
+        return ret
+
+    def get_zobrist_hash(self) -> int:
+        return self.zobrist_hash + self.status_effect_state.get_zobrist_hash()
+
+    def _compute_zobrist_hash(self) -> int:
+        return Zobrist.key('agent', self.name, self.max_health) + Zobrist.key('health', self.health) + Zobrist.key('block', self.block)
     
     def __repr__(self) -> str:
         return "{}-hp:[{}/{}]-block:{}-status:{}".format(
@@ -71,6 +100,8 @@ class Agent:
         )
 
 class Player(Agent):
+    __slots__ = ('character', 'bot')
+
     def __init__(self, character: Character, bot: GGPA):
         self.character = character
         self.bot = bot
@@ -79,20 +110,40 @@ class Player(Agent):
     def _get_action(self, game_state: GameState, battle_state: BattleState):
         return self.bot.choose_card(game_state, battle_state)
 
+    def clone(self) -> Player:
+        # the bot is shared, it is not part of the battle state
+        ret = super().clone()
+        assert isinstance(ret, Player)
+        return ret
+
 class Enemy(Agent):
+    __slots__ = ('action_set',)
+
     def __init__(self, name: str, max_health: int, action_set: ItemSet[Action]):
         super().__init__(name, max_health)
         self.action_set = action_set
 
     def _get_action(self, game_state: GameState, battle_state: BattleState) -> Action:
-        return self.action_set.get().And(EndAgentTurn())
+        if UndoLog.active is not None:
+            UndoLog.active.record(self.action_set.set_state, self.action_set.get_state())
+        return self.action_set.get(battle_state.rng).And(EndAgentTurn())
 
     def get_intention(self, game_state: GameState, battle_state: BattleState) -> Action:
-        return self.action_set.peek()
+        if UndoLog.active is not None:
+            UndoLog.active.record(self.action_set.set_state, self.action_set.get_state())
+        return self.action_set.peek(battle_state.rng)
+
+    def clone(self) -> Enemy:
+        ret = super().clone()
+        assert isinstance(ret, Enemy)
+        ret.action_set = self.action_set.clone()
+        return ret
 
 class AcidSlimeSmall(Enemy):
+    __slots__ = ()
+
     def __init__(self, game_state: GameState):
-        max_health = RandomUniformRange(8, 12) if game_state.ascention < 7 else RandomUniformRange(9, 13)
+        max_health = RandomUniformRange(8, 12, game_state.rng) if game_state.ascention < 7 else RandomUniformRange(9, 13, game_state.rng)
         if game_state.ascention < 17:
             action_set: ItemSet[Action] = RoundRobinRandomStart(
                 DealAttackDamage(ConstValue(3 if game_state.ascention < 2 else 4)).To(PlayerAgentTarget()),
@@ -106,14 +157,18 @@ class AcidSlimeSmall(Enemy):
         super().__init__("AcidSlime(S)", max_health.get(), action_set)
 
 class SpikeSlimeSmall(Enemy):
+    __slots__ = ()
+
     def __init__(self, game_state: GameState):
-        max_health = RandomUniformRange(10, 14) if game_state.ascention < 7 else RandomUniformRange(11, 15)
+        max_health = RandomUniformRange(10, 14, game_state.rng) if game_state.ascention < 7 else RandomUniformRange(11, 15, game_state.rng)
         action_set: ItemSet[Action] = RoundRobin(0, DealAttackDamage(ConstValue(5 if game_state.ascention < 2 else 6)).To(PlayerAgentTarget()))
         super().__init__("SpikeSlime(S)", max_health.get(), action_set)
 
 class JawWorm(Enemy):
+    __slots__ = ()
+
     def __init__(self, game_state: GameState):
-        max_health = RandomUniformRange(40, 44) if game_state.ascention < 7 else RandomUniformRange(42, 46)
+        max_health = RandomUniformRange(40, 44, game_state.rng) if game_state.ascention < 7 else RandomUniformRange(42, 46, game_state.rng)
         chomp: Action = DealAttackDamage(ConstValue(11 if game_state.ascention < 2 else 12)).To(PlayerAgentTarget())
         thrash: Action = DealAttackDamage(ConstValue(7)).To(PlayerAgentTarget()).And(AddBlock(ConstValue(5)).To(SelfAgentTarget()))
         bellow: Action = ApplyStatus(ConstValue(3 if game_state.ascention < 2 else 4 if game_state.ascention < 17 else 5), StatusEffectRepo.STRENGTH).And(AddBlock(ConstValue(5))).To(SelfAgentTarget())
@@ -123,6 +178,8 @@ class JawWorm(Enemy):
         super().__init__("JawWorm", max_health.get(), action_set)
         
 class Goblin(Enemy):
+    __slots__ = ()
+
     def __init__(self, game_state: GameState):
         max_health = ConstValue(44)
         slash: Action = DealAttackDamage(ConstValue(11)).To(PlayerAgentTarget())
@@ -131,6 +188,8 @@ class Goblin(Enemy):
         super().__init__("Goblin", max_health.get(), action_set)
 
 class HobGoblin(Enemy):
+    __slots__ = ()
+
     def __init__(self, game_state: GameState):
         max_health = ConstValue(44)
         slash: Action = DealAttackDamage(ConstValue(22)).To(PlayerAgentTarget())
@@ -139,6 +198,8 @@ class HobGoblin(Enemy):
         super().__init__("Goblin", max_health.get(), action_set)
 
 class Leech(Enemy):
+    __slots__ = ()
+
     def __init__(self, game_state: GameState):
         max_health = ConstValue(70)
         drink: Action = DealAttackDamage(ConstValue(1)).To(PlayerAgentTarget()).And(ApplyStatus(ConstValue(1), StatusEffectRepo.WEAK).To(PlayerAgentTarget()))
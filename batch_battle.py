@@ -0,0 +1,496 @@
+from __future__ import annotations
+import random
+import numpy as np
+from typing import TYPE_CHECKING, Callable
+from action.action import Action, NoAction, EndAgentTurn
+from action.agent_targeted_action import AgentTargeted, DealAttackDamage, DealDamage, AddBlock, ApplyStatus, Heal
+from action.card_targeted_action import CardTargetedL2, AddCopy
+from action.compiler import Opcode, Instruction, compile_action, compile_actions
+from target.agent_target import AgentTarget, AgentSet, SelfAgentTarget, PlayerAgentTarget, ChooseAgentTarget, AllAgentsTarget, RandomAgentTarget
+from target.card_target import CardPile, SelfCardTarget
+from status_effecs import StatusEffectRepo
+from value import Value, RandomUniformRange
+from utility import ItemSet, RoundRobinCore, RoundRobinRandomStart, ItemSequence, RandomizedItemSet, PreventRepeat, PreventRepeats
+from config import Character, CardType, MAX_BLOCK, MAX_MANA, MAX_STATUS
+from game import GameState
+from ggpa.random_bot import RandomBot
+if TYPE_CHECKING:
+    from card import Card
+    from agent import Enemy
+
+# A struct-of-arrays version of BattleState.run with RandomBot, stepping many battles in lockstep.
+# Piles are kept as card counts per distinct card: with a uniformly shuffled draw pile, drawing the
+# top card is the same as drawing a uniformly random card from the pile.
+
+class Target:
+    NONE = 0
+    SELF = 1
+    PLAYER = 2
+    ENEMY = 3 # one enemy, chosen uniformly (RandomBot's choice or a random target)
+    ANY = 4 # one of the player or the enemies, chosen uniformly
+    ALL_ENEMIES = 5
+    ALL = 6
+
+class Op:
+    NOTHING = 0
+    ATTACK = 1
+    DAMAGE = 2
+    BLOCK = 3
+    HEAL = 4
+    STATUS = 5
+    BOMB = 6
+    MANA = 7
+    EXHAUST_SELF = 8
+    ADD_COPY = 9
+
+VULNERABLE, WEAK, STRENGTH, VIGOR, TOLERANCE = range(5)
+STATUS_INDEX = {
+    StatusEffectRepo.VULNERABLE.name: VULNERABLE,
+    StatusEffectRepo.WEAK.name: WEAK,
+    StatusEffectRepo.STRENGTH.name: STRENGTH,
+    StatusEffectRepo.VIGOR.name: VIGOR,
+    StatusEffectRepo.TOLERANCE.name: TOLERANCE,
+}
+PILES = [CardPile.HAND, CardPile.DRAW, CardPile.DISCARD, CardPile.EXHAUST]
+
+def _get_amount(value: Value) -> int:
+    if isinstance(value, RandomUniformRange):
+        raise BatchBattle.UnsupportedException("Random values are not supported by the batch simulator")
+    return value.peek()
+
+def _lower_agent_target(target: AgentTarget) -> int:
+    if isinstance(target, SelfAgentTarget):
+        return Target.SELF
+    if isinstance(target, PlayerAgentTarget):
+        return Target.PLAYER
+    if isinstance(target, (ChooseAgentTarget, RandomAgentTarget, AllAgentsTarget)):
+        if isinstance(target, AllAgentsTarget):
+            return Target.ALL_ENEMIES if target.among == AgentSet.ENEMY else Target.ALL
+        return Target.ENEMY if target.among == AgentSet.ENEMY else Target.ANY
+    raise BatchBattle.UnsupportedException(f"Agent target {target} is not supported by the batch simulator")
+
+def _lower_leaf(opcode: int, node: AgentTargeted|CardTargetedL2) -> tuple[int, int, int, int]:
+    if opcode == Opcode.ATTACK:
+        assert isinstance(node, DealAttackDamage)
+        return (Op.ATTACK, _get_amount(node.val), _get_amount(node.times), 0)
+    if opcode == Opcode.DAMAGE:
+        assert isinstance(node, DealDamage)
+        return (Op.DAMAGE, _get_amount(node.val), _get_amount(node.times), 0)
+    if opcode == Opcode.BLOCK:
+        assert isinstance(node, AddBlock)
+        return (Op.BLOCK, _get_amount(node.val), 1, 0)
+    if opcode == Opcode.HEAL:
+        assert isinstance(node, Heal)
+        return (Op.HEAL, _get_amount(node.val), 1, 0)
+    if opcode == Opcode.STATUS:
+        assert isinstance(node, ApplyStatus)
+        if node.status_effect.name == StatusEffectRepo.BOMB.name:
+            return (Op.BOMB, _get_amount(node.val), 1, 0)
+        if node.status_effect.name not in STATUS_INDEX:
+            raise BatchBattle.UnsupportedException(f"Status effect {node.status_effect} is not supported by the batch simulator")
+        return (Op.STATUS, _get_amount(node.val), 1, STATUS_INDEX[node.status_effect.name])
+    if opcode == Opcode.EXHAUST:
+        return (Op.EXHAUST_SELF, 0, 1, 0)
+    if opcode == Opcode.ADD_COPY:
+        assert isinstance(node, AddCopy)
+        return (Op.ADD_COPY, 0, 1, PILES.index(node.card_pile))
+    raise BatchBattle.UnsupportedException(f"{node.__class__.__name__} is not supported by the batch simulator")
+
+def _lower_program(program: list[Instruction]) -> list[tuple[int, list[tuple[int, int, int, int]]]]:
+    # a compiled program becomes a list of groups, a group is a target and the ops applied to each of its targets
+    groups: list[tuple[int, list[tuple[int, int, int, int]]]] = []
+    for instruction in program:
+        opcode = instruction[0]
+        if opcode == Opcode.AGENT_TARGETED:
+            groups.append((_lower_agent_target(instruction[1]), [_lower_leaf(*leaf) for leaf in instruction[2]]))
+        elif opcode == Opcode.MANA:
+            groups.append((Target.NONE, [(Op.MANA, _get_amount(instruction[1]), 1, 0)]))
+        elif opcode == Opcode.CARD_TARGETED:
+            if len(instruction[2]) > 0 and not isinstance(instruction[1], SelfCardTarget):
+                raise BatchBattle.UnsupportedException(f"Card target {instruction[1]} is not supported by the batch simulator")
+            groups.append((Target.NONE, [_lower_leaf(*leaf) for leaf in instruction[2]]))
+        elif not isinstance(instruction[1], (NoAction, EndAgentTurn)):
+            raise BatchBattle.UnsupportedException(f"{instruction[1].__class__.__name__} is not supported by the batch simulator")
+    return groups
+
+class ProgramTable:
+    # the lowered actions of a set of cards or enemy moves
+    def __init__(self, programs: list[list[tuple[int, list[tuple[int, int, int, int]]]]]):
+        self.programs = programs
+        self.max_bomb = max([0] + [amount for groups in programs for _, ops in groups for kind, amount, _, _ in ops if kind == Op.BOMB])
+
+class EnemySchedule:
+    # the order of an enemy's moves: a fixed prefix, then either a cycle or weighted random moves with repeat limits
+    def __init__(self, action_set: ItemSet[Action]):
+        limits: dict[int, int] = {}
+        if isinstance(action_set, PreventRepeats):
+            wrapped = action_set.wrapped
+            while isinstance(wrapped, PreventRepeat):
+                if not wrapped.consecutive:
+                    raise BatchBattle.UnsupportedException("Only consecutive repeat limits are supported by the batch simulator")
+                limits[id(wrapped.invalid_item)] = wrapped.invalid_count
+                wrapped = wrapped.wrapped
+            action_set = wrapped
+        self.moves: list[Action] = []
+        self.prefix: list[int] = []
+        self.is_cycle = False
+        weighted: list[tuple[Action, float]] = []
+        self.random_start = isinstance(action_set, RoundRobinRandomStart)
+        self.start = 0
+        if isinstance(action_set, RoundRobinCore):
+            self.is_cycle = True
+            self.moves = [move for move in action_set.values]
+            self.start = action_set.index
+        else:
+            items = action_set.item_set_list if isinstance(action_set, ItemSequence) else [action_set]
+            for item in items:
+                if isinstance(item, RandomizedItemSet):
+                    weighted = list(zip(item.values, item.weights))
+                elif isinstance(item, ItemSet):
+                    raise BatchBattle.UnsupportedException(f"{item.__class__.__name__} is not supported by the batch simulator")
+                else:
+                    self.prefix.append(self._get_move(item))
+            for move, _ in weighted:
+                self._get_move(move)
+        self.weights = np.zeros(len(self.moves))
+        for move, weight in weighted:
+            self.weights[self._get_move(move)] += weight
+        self.limits = np.array([limits.get(id(move), np.iinfo(np.int64).max) for move in self.moves], dtype=np.int64)
+        self.table = ProgramTable([_lower_program(compile_action(move)) for move in self.moves])
+
+    def _get_move(self, move: Action) -> int:
+        for i, known in enumerate(self.moves):
+            if known is move:
+                return i
+        self.moves.append(move)
+        return len(self.moves) - 1
+
+class _RangeRecorder(random.Random):
+    # stands in for the battle's stream while an enemy is built, keeps the ranges it was asked for
+    # and counts any other draw (every other method of random.Random goes through random or getrandbits)
+    def __init__(self):
+        super().__init__(0)
+        self.ranges: list[tuple[int, int]] = []
+        self.other_draws = 0
+
+    def randrange(self, start, stop=None, step=1):
+        if stop is None or step != 1:
+            self.other_draws += 1
+            return super().randrange(start, stop, step)
+        self.ranges.append((start, stop))
+        return start
+
+    def random(self):
+        self.other_draws += 1
+        return super().random()
+
+    def getrandbits(self, k):
+        self.other_draws += 1
+        return super().getrandbits(k)
+
+class BatchResult:
+    def __init__(self, player_health: np.ndarray, win: np.ndarray, turns: np.ndarray):
+        self.player_health = player_health
+        self.win = win
+        self.turns = turns
+
+    def get_win_rate(self) -> float:
+        return float(np.mean(self.win))
+
+    def get_mean_health(self) -> float:
+        return float(np.mean(self.player_health))
+
+class BatchBattle:
+    class UnsupportedException(Exception):
+        # a card or enemy move the batch simulator can't run, those battles can be run with BattleState.run instead.
+        # supported: attack, damage, block, heal, mana and status effect (vulnerable, weak, strength, vigor, tolerance, bomb)
+        # actions with constant values, on self, the player, a chosen or random agent or all of them, and exhausting or
+        # copying the played card. that is every card of CardGen but Armaments (Strike, Defend, Searing_Blow, Bash, BashStar,
+        # Anger, Cleave, Impervious, Survivor, Stimulate, Batter, Tolerate, Bomb, Suffer) and every enemy of agent.py.
+        pass
+
+    def __init__(self, deck: list[Card], enemy_factories: list[Callable[[GameState], Enemy]], count: int,
+                 seed: int|None = None, ascention: int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.count = count
+        game_state = GameState(Character.IRON_CLAD, RandomBot(), ascention, seed)
+        self.draw_count = game_state.draw_count
+        self.max_mana = game_state.max_mana
+        # distinct cards of the deck, copies added during the battle are the same distinct card
+        card_reprs: list[str] = []
+        cards: list[Card] = []
+        for card in deck:
+            if repr(card) not in card_reprs:
+                card_reprs.append(repr(card))
+                cards.append(card)
+        self.cost = np.array([_get_amount(card.mana_cost) for card in cards], dtype=np.int64)
+        self.is_power = np.array([card.card_type == CardType.POWER for card in cards])
+        self.cards = ProgramTable([_lower_program(compile_actions(card.actions)) for card in cards])
+        deck_counts = np.zeros(len(cards), dtype=np.int64)
+        for card in deck:
+            deck_counts[card_reprs.index(repr(card))] += 1
+        agent_count = 1 + len(enemy_factories)
+        self.max_health = np.zeros((count, agent_count), dtype=np.int64)
+        self.max_health[:, 0] = game_state.player.max_health
+        # each enemy is built once, the health it draws from the battle's stream is then drawn for every battle
+        enemies = [self._build_enemy(factory, game_state, e + 1) for e, factory in enumerate(enemy_factories)]
+        self.schedules = [EnemySchedule(enemy.action_set) for enemy in enemies]
+        self.health = self.max_health.copy()
+        self.block = np.zeros((count, agent_count), dtype=np.int64)
+        self.status = np.zeros((count, agent_count, len(STATUS_INDEX)), dtype=np.int64)
+        max_bomb = max([self.cards.max_bomb] + [schedule.table.max_bomb for schedule in self.schedules])
+        self.bombs = np.zeros((count, agent_count, max_bomb + 2), dtype=np.int64)
+        self.mana = np.zeros(count, dtype=np.int64)
+        self.turn = np.zeros(count, dtype=np.int64)
+        self.piles = np.zeros((len(PILES), count, len(cards)), dtype=np.int64)
+        self.piles[PILES.index(CardPile.DISCARD)] = deck_counts
+        self.next_move = np.zeros((count, len(self.schedules)), dtype=np.int64)
+        self.prefix_index = np.zeros((count, len(self.schedules)), dtype=np.int64)
+        self.last_move = np.full((count, len(self.schedules)), -1, dtype=np.int64)
+        self.repeat_count = np.zeros((count, len(self.schedules)), dtype=np.int64)
+        all_rows = np.arange(count)
+        for e, schedule in enumerate(self.schedules):
+            if schedule.is_cycle and schedule.random_start:
+                self.next_move[:, e] = self.rng.integers(0, len(schedule.moves), count)
+            elif schedule.is_cycle:
+                self.next_move[:, e] = schedule.start
+            else:
+                self._sample_move(e, all_rows)
+
+    def _build_enemy(self, factory: Callable[[GameState], Enemy], game_state: GameState, agent: int) -> Enemy:
+        rng = game_state.rng
+        recorder = _RangeRecorder()
+        game_state.rng = recorder
+        try:
+            enemy = factory(game_state)
+        finally:
+            game_state.rng = rng
+        ranges = recorder.ranges
+        if recorder.other_draws > 0 or len(ranges) > 1 or (len(ranges) == 1 and ranges[0][0] != enemy.max_health):
+            raise BatchBattle.UnsupportedException(f"{enemy.name} takes random numbers for more than its health")
+        self.max_health[:, agent] = enemy.max_health if len(ranges) == 0 else self.rng.integers(ranges[0][0], ranges[0][1], self.count)
+        return enemy
+
+    @property
+    def hand(self) -> np.ndarray:
+        return self.piles[PILES.index(CardPile.HAND)]
+
+    @property
+    def draw_pile(self) -> np.ndarray:
+        return self.piles[PILES.index(CardPile.DRAW)]
+
+    @property
+    def discard_pile(self) -> np.ndarray:
+        return self.piles[PILES.index(CardPile.DISCARD)]
+
+    def ended(self, rows: np.ndarray|None = None) -> np.ndarray:
+        health = self.health if rows is None else self.health[rows]
+        return (health[:, 0] <= 0) | np.all(health[:, 1:] <= 0, axis=1)
+
+    def _sample_counts(self, counts: np.ndarray, total: np.ndarray|None = None) -> np.ndarray:
+        # index of a uniformly chosen item per row, counts[row, i] being the number of items of kind i.
+        # a row without items gets 0
+        threshold = self.rng.random(len(counts)) * (counts.sum(axis=1) if total is None else total)
+        return np.argmax(np.cumsum(counts, axis=1) > threshold[:, None], axis=1)
+
+    def _sample_move(self, e: int, rows: np.ndarray):
+        schedule = self.schedules[e]
+        if schedule.is_cycle:
+            self.next_move[rows, e] = (self.next_move[rows, e] + 1) % len(schedule.moves)
+            return
+        in_prefix = self.prefix_index[rows, e] < len(schedule.prefix)
+        moves = np.zeros(len(rows), dtype=np.int64)
+        if in_prefix.any():
+            moves[in_prefix] = np.array(schedule.prefix)[self.prefix_index[rows[in_prefix], e]]
+            self.prefix_index[rows[in_prefix], e] += 1
+        random_rows = ~in_prefix
+        if random_rows.any():
+            last = self.last_move[rows[random_rows], e]
+            repeats = self.repeat_count[rows[random_rows], e]
+            move_ids = np.arange(len(schedule.moves))
+            blocked = (move_ids[None, :] == last[:, None]) & (repeats[:, None] + 1 >= schedule.limits[None, :])
+            weights = np.where(blocked, 0, schedule.weights[None, :])
+            moves[random_rows] = self._sample_counts(weights)
+        same = moves == self.last_move[rows, e]
+        self.repeat_count[rows, e] = np.where(same, self.repeat_count[rows, e] + 1, 1)
+        self.last_move[rows, e] = moves
+        self.next_move[rows, e] = moves
+
+    def _draw(self, rows: np.ndarray):
+        # the piles of the rows are taken out once, drawn from with the size of each draw pile kept, and put back
+        draw_pile, discard_pile, hand = self.draw_pile[rows], self.discard_pile[rows], self.hand[rows]
+        draw_size = draw_pile.sum(axis=1)
+        all_rows = np.arange(len(rows))
+        for _ in range(self.draw_count):
+            empty = draw_size == 0
+            if empty.any():
+                draw_pile[empty] += discard_pile[empty]
+                discard_pile[empty] = 0
+                draw_size[empty] = draw_pile[empty].sum(axis=1)
+            drawing = draw_size > 0
+            if not drawing.any():
+                break
+            drawn = self._sample_counts(draw_pile, draw_size)
+            draw_pile[all_rows, drawn] -= drawing
+            hand[all_rows, drawn] += drawing
+            draw_size -= drawing
+        self.draw_pile[rows], self.discard_pile[rows], self.hand[rows] = draw_pile, discard_pile, hand
+
+    def _get_damaged(self, rows: np.ndarray, agent: int, amount: np.ndarray):
+        blocked = np.minimum(self.block[rows, agent], amount)
+        self.block[rows, agent] -= blocked
+        self.health[rows, agent] = np.maximum(self.health[rows, agent] - (amount - blocked), 0)
+
+    def _attack(self, rows: np.ndarray, by: int, agent: int|np.ndarray, amount: int, times: int):
+        # the order of DealAttackDamage.event listeners: vigor, vulnerable, weak, strength
+        damage = amount + self.status[rows, by, VIGOR]
+        damage = np.where(self.status[rows, agent, VULNERABLE] > 0, damage * 3 // 2, damage)
+        damage = np.where(self.status[rows, by, WEAK] > 0, damage * 3 // 4, damage)
+        damage = damage + self.status[rows, by, STRENGTH]
+        for _ in range(times):
+            self._get_damaged(rows, agent, damage)
+        self.status[rows, by, VIGOR] = 0
+
+    def _apply_status(self, rows: np.ndarray, agent: int|np.ndarray, status: int, amount: int):
+        current = self.status[rows, agent, status]
+        if status == TOLERANCE:
+            # tolerance does not stack, the first one applied is kept
+            self.status[rows, agent, status] = np.where(current > 0, current, amount)
+        else:
+            self.status[rows, agent, status] = np.minimum(current + amount, MAX_STATUS)
+
+    def _get_targets(self, target: int, by: int, alive: np.ndarray) -> list[tuple[np.ndarray, int|np.ndarray]]:
+        # the targets of a group as (rows, agent), in the order the scalar engine plays them. agent is an array,
+        # one per row, for a target chosen at random
+        rows = np.arange(len(alive))
+        if target == Target.NONE or target == Target.SELF:
+            return [(rows, by)]
+        if target == Target.PLAYER:
+            return [(rows, 0)]
+        enemies = [(np.nonzero(alive[:, agent])[0], agent) for agent in range(1, alive.shape[1])]
+        if target == Target.ALL_ENEMIES:
+            return enemies
+        if target == Target.ALL:
+            return [(rows, 0)] + enemies
+        among = alive.copy()
+        among[:, 0] = target == Target.ANY
+        choosing = np.nonzero(among.any(axis=1))[0]
+        return [(choosing, self._sample_counts(among[choosing]))]
+
+    def _run_op(self, rows: np.ndarray, by: int, agent: int|np.ndarray, kind: int, amount: int, times: int, arg: int):
+        if kind == Op.ATTACK:
+            self._attack(rows, by, agent, amount, times)
+        elif kind == Op.DAMAGE:
+            for _ in range(times):
+                self._get_damaged(rows, agent, amount)
+        elif kind == Op.BLOCK:
+            self.block[rows, agent] = np.minimum(self.block[rows, agent] + amount, MAX_BLOCK)
+        elif kind == Op.HEAL:
+            self.health[rows, agent] = np.minimum(self.health[rows, agent] + amount, self.max_health[rows, agent])
+        elif kind == Op.STATUS:
+            self._apply_status(rows, agent, arg, amount)
+        elif kind == Op.BOMB:
+            # a bomb that goes off in 0 turns never does
+            if amount > 0:
+                self.bombs[rows, agent, amount] += 1
+        elif kind == Op.MANA:
+            self.mana[rows] = np.minimum(self.mana[rows] + amount, MAX_MANA)
+            assert np.all(self.mana[rows] >= 0), "Mana value cannot be negative"
+
+    def _run_programs(self, table: ProgramTable, rows: np.ndarray, programs: np.ndarray, by: int) -> np.ndarray:
+        # the rows are grouped by program, so the groups and ops of a program are known here and only its targets are per row.
+        # returns for each row whether the card exhausted itself
+        exhausted = np.zeros(len(rows), dtype=bool)
+        for program in np.unique(programs):
+            indices = np.nonzero(programs == program)[0]
+            program_rows = rows[indices]
+            alive = self.health[program_rows] > 0
+            for target, ops in table.programs[program]:
+                for selected, agent in self._get_targets(target, by, alive):
+                    if len(selected) == 0:
+                        continue
+                    for kind, amount, times, arg in ops:
+                        if kind == Op.EXHAUST_SELF:
+                            exhausted[indices[selected]] = True
+                        elif kind == Op.ADD_COPY:
+                            self.piles[arg, program_rows[selected], program] += 1
+                        else:
+                            self._run_op(program_rows[selected], by, agent, kind, amount, times, arg)
+        return exhausted
+
+    def _play_cards(self, rows: np.ndarray, cards: np.ndarray):
+        self.hand[rows, cards] -= 1
+        self.mana[rows] -= self.cost[cards]
+        exhausted = self._run_programs(self.cards, rows, cards, 0)
+        self.piles[PILES.index(CardPile.EXHAUST), rows[exhausted], cards[exhausted]] += 1
+        discarded = ~exhausted & ~self.is_power[cards]
+        self.discard_pile[rows[discarded], cards[discarded]] += 1
+
+    def _player_step(self, rows: np.ndarray) -> np.ndarray:
+        # RandomBot: uniform between the playable cards in hand and ending the turn, returns which rows ended their turn
+        playable = self.hand[rows] * (self.cost[None, :] <= self.mana[rows, None])
+        playable_count = playable.sum(axis=1)
+        choice = np.floor(self.rng.random(len(rows)) * (playable_count + 1)).astype(np.int64)
+        ending = choice == playable_count
+        playing = np.nonzero(~ending)[0]
+        if len(playing) > 0:
+            cards = np.argmax(np.cumsum(playable[playing], axis=1) > choice[playing, None], axis=1)
+            self._play_cards(rows[playing], cards)
+        return ending
+
+    def _side_after(self, rows: np.ndarray, agents: list[int], other_side: list[int]):
+        # bomb_after and then tolerance_after, then the end of turn for status effects
+        if self.bombs.shape[2] > 2:
+            for agent in agents:
+                bombs = self.bombs[rows, agent, 1]
+                for b in range(int(bombs.max(initial=0))):
+                    exploding = rows[bombs > b]
+                    for other in other_side:
+                        self._get_damaged(exploding, other, np.full(len(exploding), 40))
+            bombs = self.bombs[rows]
+            bombs[:, agents, :-1] = bombs[:, agents, 1:]
+            bombs[:, agents, -1] = 0
+            bombs[:, agents, 0] = 0
+            self.bombs[rows] = bombs
+        block, status = self.block[rows], self.status[rows]
+        block[:, agents] = np.minimum(block[:, agents] + status[:, agents, TOLERANCE], MAX_BLOCK)
+        for effect in [VULNERABLE, WEAK]:
+            status[:, agents, effect] = np.maximum(status[:, agents, effect] - 1, 0)
+        tolerance = status[:, agents, TOLERANCE]
+        status[:, agents, TOLERANCE] = np.where(tolerance > 0, tolerance + 2, 0)
+        block[:, other_side] = 0
+        self.block[rows], self.status[rows] = block, status
+
+    def _take_turn(self, rows: np.ndarray):
+        self.mana[rows] = self.max_mana
+        self.turn[rows] += 1
+        self._draw(rows)
+        acting = rows[~self.ended(rows)]
+        while len(acting) > 0:
+            acting = acting[~self._player_step(acting)]
+            acting = acting[~self.ended(acting)]
+        enemies = list(range(1, self.health.shape[1]))
+        self._side_after(rows, [0], enemies)
+        for e, schedule in enumerate(self.schedules):
+            agent = e + 1
+            acting = rows[(self.health[rows, agent] > 0) & (self.health[rows, 0] > 0)]
+            if len(acting) == 0:
+                continue
+            self._run_programs(schedule.table, acting, self.next_move[acting, e], agent)
+            self._sample_move(e, acting)
+        self._side_after(rows, enemies, [0])
+        self.discard_pile[rows] += self.hand[rows]
+        self.hand[rows] = 0
+
+    def run(self, max_turns: int = 1000) -> BatchResult:
+        rows = np.arange(self.count)
+        for _ in range(max_turns):
+            rows = rows[~self.ended(rows)]
+            if len(rows) == 0:
+                break
+            self._take_turn(rows)
+        return BatchResult(self.health[:, 0].copy(), self.health[:, 0] > 0, self.turn.copy())
+
+def simulate_random_bot(deck: list[Card], enemy_factories: list[Callable[[GameState], Enemy]], count: int,
+                        seed: int|None = None, ascention: int = 0) -> BatchResult:
+    return BatchBattle(deck, enemy_factories, count, seed, ascention).run()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 import copy
+import math
 import os.path
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -7,16 +8,23 @@ if TYPE_CHECKING:
     from game import GameState
     from card import Card
     from action.action import Action
-from config import MAX_MANA, Verbose
+from config import MAX_MANA, DEBUG_STATE_HASH, LOG_BUFFER_SIZE, LOG_IN_THREAD, Verbose
 from card import CardType
-from utility import get_unique_filename, Event
+from target.card_target import CardPile
+from utility import get_unique_filename, Event, Zobrist, LogWriter, UndoLog
+from battle_trace import TraceWriter
 from status_effecs import tolerance_after, bomb_after
 
 import random
 
 class BattleState:
     side_turn_event: Event[None, tuple[Agent, GameState, BattleState, list[Agent]]] = Event()
-    def __init__(self, game_state: GameState, *enemies: Enemy, verbose: Verbose, log_filename: str|None = None):
+    def __init__(self, game_state: GameState, *enemies: Enemy, verbose: Verbose, log_filename: str|None = None, rng: random.Random|None = None, trace_filename: str|None = None,
+                 policy_rng: random.Random|None = None):
+        # the random events of the battle (draws, enemy moves and random targets) come from this
+        self.rng = rng if rng is not None else game_state.rng
+        # the random choices of the bots, and the streams of the copies made by copy_undeterministic and make
+        self.policy_rng = policy_rng if policy_rng is not None else game_state.policy_rng
         self.player = game_state.player
         self.enemies = [enemy for enemy in enemies]
         self.game_state = game_state
@@ -30,12 +38,77 @@ class BattleState:
         self.exhaust_pile: list[Card] = []
         self.verbose = verbose
         self.log_filename = log_filename
+        # created on the first write, shared with clones so that their lines keep their order
+        self.log_writer: LogWriter|None = None
+        self.trace_filename = trace_filename
+        # created by run, clones are never traced
+        self.trace_writer: TraceWriter|None = None
+        # sum of the zobrist keys of the cards in each pile, updated by every pile operation
+        self.pile_zobrist: dict[CardPile, int] = {card_pile: 0 for card_pile in CardPile}
+        self.pile_zobrist[CardPile.DISCARD] = sum([card.get_zobrist_key() for card in self.discard_pile])
+        # the pile each card is in, updated by every pile operation
+        self.card_piles: dict[Card, CardPile] = {card: CardPile.DISCARD for card in self.discard_pile}
+        # each pile sorted by repr, with the pile hash it was sorted for; shared with clones
+        self.sorted_piles: dict[CardPile, tuple[int, list[Card]]] = {}
+
+    def clone(self) -> BattleState:
+        # Copies only what changes during a battle. Cards, actions, the bot and the rngs are shared.
+        # Cards are never changed in place (see upgrade_card), so sharing them is safe.
+        battle_state_copy = copy.copy(self)
+        battle_state_copy.game_state = self.game_state.clone()
+        battle_state_copy.player = battle_state_copy.game_state.player
+        battle_state_copy.enemies = [enemy.clone() for enemy in self.enemies]
+        battle_state_copy.draw_pile = [card for card in self.draw_pile]
+        battle_state_copy.discard_pile = [card for card in self.discard_pile]
+        battle_state_copy.hand = [card for card in self.hand]
+        battle_state_copy.exhaust_pile = [card for card in self.exhaust_pile]
+        battle_state_copy.pile_zobrist = dict(self.pile_zobrist)
+        battle_state_copy.card_piles = dict(self.card_piles)
+        battle_state_copy.trace_writer = None
+        return battle_state_copy
 
     def copy_undeterministic(self) -> BattleState:
-        battle_state_copy = copy.deepcopy(self)
-        random.shuffle(battle_state_copy.draw_pile)
+        # the copy gets its own stream, so that copies sample different draw orders and future draws
+        # it is seeded from the policy stream, searching leaves the battle's own events as they would be
+        battle_state_copy = self.clone()
+        battle_state_copy.rng = random.Random(self.policy_rng.getrandbits(64))
+        battle_state_copy.rng.shuffle(battle_state_copy.draw_pile)
         return battle_state_copy
     
+    def make(self, action: Action) -> bool:
+        # tick_player on this state as if it was a copy_undeterministic, every change is recorded so that unmake can take it back
+        if UndoLog.active is None:
+            UndoLog.active = UndoLog()
+        UndoLog.active.push()
+        UndoLog.active.record(self._restore_fields, self.turn, self.mana, self.agent_turn_ended, self.turn_phase,
+            self.enemies, self.draw_pile, self.rng, self.verbose, self.trace_writer)
+        # the chance event of copy_undeterministic: a new stream and a new draw order
+        self.rng = random.Random(self.policy_rng.getrandbits(64))
+        self.draw_pile = [card for card in self.draw_pile]
+        self.rng.shuffle(self.draw_pile)
+        self.verbose = Verbose.NO_LOG
+        self.trace_writer = None
+        return self.tick_player(action)
+
+    def unmake(self):
+        log = UndoLog.active
+        assert log is not None, "unmake is called without make"
+        log.pop()
+        if len(log.marks) == 0:
+            UndoLog.active = None
+
+    def _restore_fields(self, turn: int, mana: int, agent_turn_ended: bool, turn_phase: int, enemies: list[Enemy],
+                        draw_pile: list[Card], rng: random.Random, verbose: Verbose, trace_writer: TraceWriter|None):
+        self.turn = turn
+        self.mana = mana
+        self.agent_turn_ended = agent_turn_ended
+        self.turn_phase = turn_phase
+        self.enemies = enemies
+        self.draw_pile = draw_pile
+        self.rng = rng
+        self.verbose = verbose
+        self.trace_writer = trace_writer
+
     def get_undeterministic_repr_hash(self) -> str:
         import hashlib
         combined_hash = hashlib.sha256()
@@ -45,10 +118,10 @@ class BattleState:
         combined_hash.update(hashlib.sha256(self.mana.__repr__().encode()).digest())
         combined_hash.update(hashlib.sha256(self.agent_turn_ended.__repr__().encode()).digest())
         combined_hash.update(hashlib.sha256(self.turn_phase.__repr__().encode()).digest())
-        sorted_draw_pile = sorted(self.draw_pile, key=lambda card: repr(card))
-        sorted_discard_pile = sorted(self.discard_pile, key=lambda card: repr(card))
-        sorted_hand = sorted(self.hand, key=lambda card: repr(card))
-        sorted_exhaust_pile = sorted(self.exhaust_pile, key=lambda card: repr(card))
+        sorted_draw_pile = self.get_sorted_pile(CardPile.DRAW)
+        sorted_discard_pile = self.get_sorted_pile(CardPile.DISCARD)
+        sorted_hand = self.get_sorted_pile(CardPile.HAND)
+        sorted_exhaust_pile = self.get_sorted_pile(CardPile.EXHAUST)
         for card in sorted_draw_pile:
             combined_hash.update(hashlib.sha256(card.__repr__().encode()).digest())
         combined_hash.update(hashlib.sha256('-'.encode()).digest())
@@ -62,19 +135,128 @@ class BattleState:
             combined_hash.update(hashlib.sha256(card.__repr__().encode()).digest())
         return combined_hash.hexdigest()
 
+    _debug_repr_hashes: dict[int, str] = {}
+
+    def get_zobrist_hash(self) -> int:
+        # O(1) replacement for get_undeterministic_repr_hash, states with the same repr get the same hash
+        ret = Zobrist.key('turn', self.turn) + Zobrist.key('mana', self.mana) +\
+            Zobrist.key('agent_turn_ended', self.agent_turn_ended) + Zobrist.key('turn_phase', self.turn_phase)
+        ret += Zobrist.mix(self.player.get_zobrist_hash(), 0)
+        for i, enemy in enumerate(self.enemies):
+            ret += Zobrist.mix(enemy.get_zobrist_hash(), i + 1)
+        for card_pile, pile_hash in self.pile_zobrist.items():
+            ret += Zobrist.mix(pile_hash, -card_pile.value)
+        ret &= Zobrist.MASK
+        if DEBUG_STATE_HASH:
+            self._verify_zobrist_hash(ret)
+        return ret
+
+    def _compute_zobrist_hash(self) -> int:
+        # the state hash from scratch, what get_zobrist_hash keeps up to date
+        ret = Zobrist.key('turn', self.turn) + Zobrist.key('mana', self.mana) +\
+            Zobrist.key('agent_turn_ended', self.agent_turn_ended) + Zobrist.key('turn_phase', self.turn_phase)
+        for i, agent in enumerate([self.player] + self.enemies):
+            ret += Zobrist.mix(agent._compute_zobrist_hash() + agent.status_effect_state._compute_zobrist_hash(), i)
+        for card_pile in CardPile:
+            ret += Zobrist.mix(sum([Zobrist.hash_str(repr(card)) for card in self.get_pile(card_pile)]), -card_pile.value)
+        return ret & Zobrist.MASK
+
+    def _verify_zobrist_hash(self, zobrist_hash: int):
+        assert zobrist_hash == self._compute_zobrist_hash(), "Incremental state hash is out of sync with the battle state"
+        repr_hash = self.get_undeterministic_repr_hash()
+        seen = BattleState._debug_repr_hashes.setdefault(zobrist_hash, repr_hash)
+        assert seen == repr_hash, "Different states share the same state hash"
+
+    def get_pile(self, card_pile: CardPile) -> list[Card]:
+        if card_pile == CardPile.HAND:
+            return self.hand
+        elif card_pile == CardPile.DISCARD:
+            return self.discard_pile
+        elif card_pile == CardPile.DRAW:
+            return self.draw_pile
+        elif card_pile == CardPile.EXHAUST:
+            return self.exhaust_pile
+        else:
+            raise Exception("Unrecognized CardPile {}".format(card_pile))
+
+    def get_sorted_pile(self, card_pile: CardPile) -> list[Card]:
+        # piles with the same hash hold the same cards, so a sorted pile is reused until its pile changes
+        pile_hash = self.pile_zobrist[card_pile]
+        cached = self.sorted_piles.get(card_pile)
+        if cached is None or cached[0] != pile_hash:
+            cached = (pile_hash, sorted(self.get_pile(card_pile), key=lambda card: repr(card)))
+            self.sorted_piles[card_pile] = cached
+        return cached[1]
+
+    def set_pile(self, card_pile: CardPile, cards: list[Card]):
+        for card in self.get_pile(card_pile):
+            if self.card_piles.get(card) == card_pile:
+                del self.card_piles[card]
+        pile = self.get_pile(card_pile)
+        pile[:] = cards
+        for card in cards:
+            self.card_piles[card] = card_pile
+        self.pile_zobrist[card_pile] = sum([card.get_zobrist_key() for card in cards])
+
+    def add_card(self, card_pile: CardPile, card: Card):
+        if UndoLog.active is not None:
+            UndoLog.active.record(self._pop_card, card_pile)
+        self.get_pile(card_pile).append(card)
+        self.pile_zobrist[card_pile] += card.get_zobrist_key()
+        self.card_piles[card] = card_pile
+
+    def _pop_card(self, card_pile: CardPile):
+        card = self.get_pile(card_pile).pop()
+        self.pile_zobrist[card_pile] -= card.get_zobrist_key()
+        del self.card_piles[card]
+
+    def _insert_card(self, card_pile: CardPile, index: int, card: Card):
+        self.get_pile(card_pile).insert(index, card)
+        self.pile_zobrist[card_pile] += card.get_zobrist_key()
+        self.card_piles[card] = card_pile
+
+    def _remove_at(self, card_pile: CardPile, index: int):
+        card = self.get_pile(card_pile).pop(index)
+        self.pile_zobrist[card_pile] -= card.get_zobrist_key()
+        del self.card_piles[card]
+
+    def _set_piles(self, piles: dict[CardPile, list[Card]], pile_zobrist: dict[CardPile, int]):
+        for card_pile, cards in piles.items():
+            self.get_pile(card_pile)[:] = cards
+            for card in cards:
+                self.card_piles[card] = card_pile
+        self.pile_zobrist.update(pile_zobrist)
+
     def discard_hand(self):
+        if UndoLog.active is not None:
+            UndoLog.active.record(self._set_piles, {CardPile.HAND: self.hand, CardPile.DISCARD: [card for card in self.discard_pile]}, dict(self.pile_zobrist))
+        for card in self.hand:
+            self.card_piles[card] = CardPile.DISCARD
         self.discard_pile += self.hand
         self.hand = []
+        self.pile_zobrist[CardPile.DISCARD] += self.pile_zobrist[CardPile.HAND]
+        self.pile_zobrist[CardPile.HAND] = 0
 
     def reshuffle(self):
+        if UndoLog.active is not None:
+            UndoLog.active.record(self._set_piles, {CardPile.DRAW: self.draw_pile, CardPile.DISCARD: self.discard_pile}, dict(self.pile_zobrist))
+        for card in self.discard_pile:
+            self.card_piles[card] = CardPile.DRAW
         self.draw_pile, self.discard_pile = self.draw_pile + self.discard_pile, []
-        random.shuffle(self.draw_pile)
+        self.pile_zobrist[CardPile.DRAW] += self.pile_zobrist[CardPile.DISCARD]
+        self.pile_zobrist[CardPile.DISCARD] = 0
+        self.rng.shuffle(self.draw_pile)
 
     def draw_one(self):
         if len(self.draw_pile) == 0:
             self.reshuffle()
         if len(self.draw_pile) > 0:
-            self.hand.append(self.draw_pile.pop())
+            card = self.draw_pile.pop()
+            if UndoLog.active is not None:
+                UndoLog.active.record(self._insert_card, CardPile.DRAW, len(self.draw_pile), card)
+            self.pile_zobrist[CardPile.DRAW] -= card.get_zobrist_key()
+            del self.card_piles[card]
+            self.add_card(CardPile.HAND, card)
         else:
             #discard+draw+hand is empty
             pass
@@ -87,49 +269,91 @@ class BattleState:
         draw_count = self.game_state.draw_count
         self.draw(draw_count)
     
+    def get_draw_outcomes(self) -> list[tuple[float, BattleState]]:
+        # every hand draw_hand can end up with, as (probability, a copy of this state with that hand drawn)
+        # the draw pile is taken as unordered, and cards with the same repr are merged
+        count = self.game_state.draw_count
+        drawn: list[Card] = []
+        source = self.draw_pile
+        discard_pile = self.discard_pile
+        if len(self.draw_pile) < count:
+            # the whole draw pile is drawn, the rest comes from the reshuffled discard pile
+            drawn = [card for card in self.draw_pile]
+            count -= len(self.draw_pile)
+            source = self.discard_pile
+            discard_pile = []
+        count = min(count, len(source))
+        groups: dict[str, list[Card]] = {}
+        for card in source:
+            groups.setdefault(repr(card), []).append(card)
+        group_list = [groups[key] for key in sorted(groups)]
+        total = math.comb(len(source), count)
+        outcomes: list[tuple[float, BattleState]] = []
+        for counts in _get_draw_counts([len(group) for group in group_list], count):
+            probability = math.prod([math.comb(len(group), taken) for group, taken in zip(group_list, counts)]) / total
+            outcome = self.clone()
+            outcome.set_pile(CardPile.DRAW, [card for group, taken in zip(group_list, counts) for card in group[taken:]])
+            outcome.set_pile(CardPile.HAND, self.hand + drawn + [card for group, taken in zip(group_list, counts) for card in group[:taken]])
+            outcome.set_pile(CardPile.DISCARD, [card for card in discard_pile])
+            outcomes.append((probability, outcome))
+        return outcomes
+
     def get_hand(self):
         return self.hand
     
     def play_card(self, card_index: int):
         assert card_index < len(self.hand) and card_index >= 0, "Card index {} out of range for hand {}".format(card_index, self.hand)
         card = self.hand.pop(card_index)
+        if UndoLog.active is not None:
+            UndoLog.active.record(self._insert_card, CardPile.HAND, card_index, card)
+        self.pile_zobrist[CardPile.HAND] -= card.get_zobrist_key()
+        del self.card_piles[card]
         card.play(self.game_state, self)
         if not self.is_present(card) and not card.card_type == CardType.POWER:
-            self.discard_pile.append(card)
+            self.add_card(CardPile.DISCARD, card)
 
     def is_present(self, card: Card):
-        if card in self.hand:
-            return True
-        if card in self.draw_pile:
-            return True
-        if card in self.discard_pile:
-            return True
-        if card in self.exhaust_pile:
-            return True
-        return False
+        return card in self.card_piles
     
     def remove_card(self, card: Card):
-        if card in self.hand:
-            self.hand.remove(card)
-        if card in self.draw_pile:
-            self.draw_pile.remove(card)
-        if card in self.discard_pile:
-            self.discard_pile.remove(card)
-        if card in self.exhaust_pile:
-            self.exhaust_pile.remove(card)
+        card_pile = self.card_piles.pop(card, None)
+        if card_pile is not None:
+            pile = self.get_pile(card_pile)
+            index = pile.index(card)
+            if UndoLog.active is not None:
+                UndoLog.active.record(self._insert_card, card_pile, index, card)
+            del pile[index]
+            self.pile_zobrist[card_pile] -= card.get_zobrist_key()
     
     def exhaust(self, card: Card):
         self.remove_card(card)
-        self.exhaust_pile.append(card)
+        self.add_card(CardPile.EXHAUST, card)
+
+    def upgrade_card(self, card: Card):
+        # copy on write: the card object might be shared with cloned battle states
+        upgraded = copy.deepcopy(card)
+        upgraded.upgrade()
+        card_pile = self.card_piles.pop(card, None)
+        if card_pile is not None:
+            pile = self.get_pile(card_pile)
+            index = pile.index(card)
+            if UndoLog.active is not None:
+                UndoLog.active.record(self._insert_card, card_pile, index, card)
+                UndoLog.active.record(self._remove_at, card_pile, index)
+            pile[index] = upgraded
+            self.pile_zobrist[card_pile] += upgraded.get_zobrist_key() - card.get_zobrist_key()
+            self.card_piles[upgraded] = card_pile
 
     def get_player_card_target(self, name: str, card_list: list[Card]) -> Card:
         card = self.player.bot.choose_card_target(self, name, card_list)
-        self.log(f"Card choice {repr(card)}\n")
+        if self.verbose != Verbose.NO_LOG:
+            self.log(f"Card choice {repr(card)}\n")
         return card
     
     def get_player_agent_target(self, name: str, agent_list: list[Agent]) -> Agent:
         agent = self.player.bot.choose_agent_target(self, name, agent_list)
-        self.log(f"Agent choice {repr(agent)}\n")
+        if self.verbose != Verbose.NO_LOG:
+            self.log(f"Agent choice {repr(agent)}\n")
         return agent
 
     def log(self, log: str):
@@ -138,8 +362,14 @@ class BattleState:
         if self.log_filename is None:
             print(log)
         else:
-            with open(self.log_filename, 'a') as f:
-                f.write(log)
+            if self.log_writer is None:
+                self.log_writer = LogWriter(self.log_filename, LOG_BUFFER_SIZE, LOG_IN_THREAD)
+            self.log_writer.write(log)
+
+    def flush_log(self):
+        # writes out the buffered log, run does this at the end of the battle
+        if self.log_writer is not None:
+            self.log_writer.close()
     
     def get_visualization(self):
         log = ''
@@ -152,7 +382,7 @@ class BattleState:
         log += "discard pile: "
         log += ' '.join(['{}:{}'.format(i, card.get_name()) for i, card in enumerate(self.discard_pile)]) + '\n'
         log += "draw pile: "
-        sorted_draw: list[Card] = sorted(self.draw_pile, key=lambda card: repr(card))
+        sorted_draw: list[Card] = self.get_sorted_pile(CardPile.DRAW)
         log += ' '.join('{}:{}'.format(i, card.get_name()) for i, card in enumerate(sorted_draw)) + '\n'
         log += "hand: "
         log += ' '.join(['{}:{}'.format(i, card.get_name()) for i, card in enumerate(self.hand)]) + '\n'
@@ -176,9 +406,14 @@ class BattleState:
         if agent.is_dead() or self.ended() or self.agent_turn_ended:
             return False
         self.visualize()
+        if self.trace_writer is not None:
+            self.trace_writer.record_state(self)
         agent.play(self.game_state, self)
+        if self.trace_writer is not None:
+            self.trace_writer.record_choice(agent, agent.prev_action)
         assert agent.prev_action is not None, "Action taken is not recorded for agent {}".format(agent.name)
-        self.log(str(agent.prev_action) + '\n')
+        if self.verbose != Verbose.NO_LOG:
+            self.log(str(agent.prev_action) + '\n')
         return True
 
     def _take_agent_turn(self, agent: Agent):
@@ -208,7 +443,8 @@ class BattleState:
         self._play_side([enemy for enemy in self.enemies], [self.player])
         self.discard_hand()
 
-    def tick_player(self, action: Action) -> bool:
+    def tick_player(self, action: Action, draw: bool = True) -> bool:
+        # without draw, the next hand is left to the caller, see get_draw_outcomes
         if self.ended():
             return False
         other_side: list[Agent] = [enemy for enemy in self.enemies]
@@ -228,7 +464,8 @@ class BattleState:
         self.mana = self.game_state.max_mana
         self.turn += 1
         self.turn_phase = 0
-        self.draw_hand()
+        if draw:
+            self.draw_hand()
         self.agent_turn_ended = False
         return True
         
@@ -251,12 +488,32 @@ class BattleState:
             self.log(f'{card}\n')
     
     def run(self):
+        if DEBUG_STATE_HASH:
+            # the states of one battle are checked against each other, so that the check doesn't grow for the whole process
+            BattleState._debug_repr_hashes.clear()
         self.initiate_log()
-        while not self.ended():
-            self.take_turn()
-        self.player.clean_up()
-        self.visualize()
-        self.log("WIN\n" if self.get_end_result() == 1 else "LOSE\n")
+        if self.trace_filename is not None:
+            self.trace_writer = TraceWriter(self.trace_filename, self)
+        try:
+            while not self.ended():
+                self.take_turn()
+            self.player.clean_up()
+            self.visualize()
+            self.log("WIN\n" if self.get_end_result() == 1 else "LOSE\n")
+        finally:
+            # so that the log of a battle that raised is still written
+            self.flush_log()
+        if self.trace_writer is not None:
+            self.trace_writer.close(self)
+
+def _get_draw_counts(sizes: list[int], count: int) -> list[list[int]]:
+    # the ways to take count cards from groups of the given sizes, as the number taken from each group
+    if len(sizes) == 0:
+        return [[]] if count == 0 else []
+    ret: list[list[int]] = []
+    for taken in range(min(sizes[0], count) + 1):
+        ret += [[taken] + rest for rest in _get_draw_counts(sizes[1:], count - taken)]
+    return ret
 
 BattleState.side_turn_event.subscribe_after(tolerance_after)
 BattleState.side_turn_event.subscribe_after(bomb_after)
\ No newline at end of file
@@ -0,0 +1,261 @@
+from __future__ import annotations
+import copy
+import json
+import zlib
+import agent as agent_module
+from action.action import PlayCard
+from card import Card, CardGen
+from config import Character, Verbose
+from game import GameState
+from status_effecs import StatusEffectDefinition, StatusEffectRepo
+from target.card_target import CardPile
+from utility import get_unique_filename, CountedRandom
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from battle import BattleState
+    from agent import Agent, Enemy
+    from action.action import Action
+    from ggpa.ggpa import GGPA
+
+# A trace file is MAGIC followed by a zlib compressed body:
+#   the header as json, prefixed with its length
+#   one record per decision, and a last record for the final state, each made of
+#     agent index (0 for the player, -1 for the final record), choice (hand index of PlayCard, -1 otherwise),
+#     new cards: count, then (source card, upgrade count) for each
+#     changed fields: count, then (field index, length, values) for each
+# All the numbers are zigzag varints. A record holds the state the decision was made in,
+# as the fields that changed since the previous record. The fields are listed in _get_fields.
+# Version 2 adds the positions of the random streams as the last field, version 1 traces are still read.
+MAGIC = b'MSTRACE2'
+MAGIC_V1 = b'MSTRACE1'
+
+STATUS_EFFECTS: list[StatusEffectDefinition] = [definition for definition in vars(StatusEffectRepo).values() if isinstance(definition, StatusEffectDefinition)]
+STATUS_INDEX: dict[str, int] = {definition.name: i for i, definition in enumerate(STATUS_EFFECTS)}
+
+def _write_int(out: bytearray, value: int):
+    value = value << 1 if value >= 0 else (-value << 1) - 1
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_int(data: bytes, pos: int) -> tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1) if value & 1 == 0 else -((value + 1) >> 1), pos
+
+def _get_choice(action: Action|None) -> int:
+    return action.get_card_index() if isinstance(action, PlayCard) else -1
+
+class TraceWriter:
+    def __init__(self, filename: str, battle_state: BattleState):
+        self.filename = get_unique_filename(filename, 'trace')
+        # the agents of the battle, enemies keep their index after they die
+        self.agents: list[Agent] = [battle_state.player] + [enemy for enemy in battle_state.enemies]
+        # every card seen so far, the index in this list is the card's id in the trace
+        self.cards: list[Card] = [card for card in battle_state.discard_pile]
+        self.card_ids: dict[int, int] = {id(card): i for i, card in enumerate(self.cards)}
+        self.fields: list[list[int]] = []
+        self.body = bytearray()
+        header = {
+            'seed': battle_state.game_state.seed,
+            'character': battle_state.player.character.name,
+            'ascention': battle_state.game_state.ascention,
+            'deck': [[repr(card), card.upgrade_count] for card in self.cards],
+            'enemies': [[enemy.__class__.__name__, enemy.max_health] for enemy in battle_state.enemies],
+        }
+        header_bytes = json.dumps(header).encode()
+        _write_int(self.body, len(header_bytes))
+        self.body += header_bytes
+        self.pending = bytearray()
+
+    def _get_card_id(self, card: Card, new_cards: list[tuple[int, int]]) -> int:
+        card_id = self.card_ids.get(id(card))
+        if card_id is not None:
+            return card_id
+        # copies and upgrades are deep copies of cards seen before
+        for source in range(len(self.cards) - 1, -1, -1):
+            source_card = self.cards[source]
+            if source_card.name != card.name or source_card.upgrade_count > card.upgrade_count:
+                continue
+            made = copy.deepcopy(source_card)
+            made.upgrade(card.upgrade_count - source_card.upgrade_count)
+            if repr(made) == repr(card):
+                break
+        else:
+            raise Exception(f"Card {card.get_name()} cannot be made from the cards of the battle")
+        new_cards.append((source, card.upgrade_count - source_card.upgrade_count))
+        self.cards.append(card)
+        self.card_ids[id(card)] = len(self.cards) - 1
+        return len(self.cards) - 1
+
+    def record_state(self, battle_state: BattleState):
+        new_cards: list[tuple[int, int]] = []
+        fields = _get_fields(battle_state, self.agents, lambda card: self._get_card_id(card, new_cards))
+        record = bytearray()
+        _write_int(record, len(new_cards))
+        for source, upgrades in new_cards:
+            _write_int(record, source)
+            _write_int(record, upgrades)
+        changed = [i for i in range(len(fields)) if i >= len(self.fields) or fields[i] != self.fields[i]]
+        _write_int(record, len(changed))
+        for i in changed:
+            _write_int(record, i)
+            _write_int(record, len(fields[i]))
+            for value in fields[i]:
+                _write_int(record, value)
+        self.fields = fields
+        self.pending = record
+
+    def record_choice(self, agent: Agent, action: Action|None):
+        _write_int(self.body, next(i for i in range(len(self.agents)) if self.agents[i] is agent))
+        _write_int(self.body, _get_choice(action))
+        self.body += self.pending
+
+    def close(self, battle_state: BattleState):
+        self.record_state(battle_state)
+        _write_int(self.body, -1)
+        _write_int(self.body, -1)
+        self.body += self.pending
+        with open(self.filename, 'wb') as f:
+            f.write(MAGIC + zlib.compress(bytes(self.body)))
+
+def _get_fields(battle_state: BattleState, agents: list[Agent], get_card_id) -> list[list[int]]:
+    # turn and mana, then health, block and status effects of each agent, the action cursors of each enemy, the card piles,
+    # and how many words the environment and policy streams have taken (-1 for a stream that doesn't count them)
+    fields = [[battle_state.turn, battle_state.turn_phase, battle_state.mana, int(battle_state.agent_turn_ended)]]
+    for i, agent in enumerate(agents):
+        present = i == 0 or any(enemy is agent for enemy in battle_state.enemies)
+        fields.append([int(present), agent.health, agent.block])
+        fields.append([value for se in agent.status_effect_state.status_effects for value in (STATUS_INDEX[se.definition.name], se.val)])
+    for enemy in agents[1:]:
+        assert isinstance(enemy, agent_module.Enemy)
+        fields.append(enemy.action_set.get_state())
+    for card_pile in CardPile:
+        fields.append([get_card_id(card) for card in battle_state.get_pile(card_pile)])
+    fields.append([rng.word_count if isinstance(rng, CountedRandom) else -1 for rng in (battle_state.rng, battle_state.policy_rng)])
+    return fields
+
+def _set_fields(battle_state: BattleState, agents: list[Agent], fields: list[list[int]], get_card) -> int:
+    # the inverse of _get_fields up to the card piles, returns the index of the field after them.
+    # agents holds every agent of the battle, dead enemies included
+    battle_state.turn, battle_state.turn_phase, battle_state.mana, agent_turn_ended = fields[0]
+    battle_state.agent_turn_ended = agent_turn_ended == 1
+    for i, agent in enumerate(agents):
+        _, health, block = fields[1 + 2*i]
+        agent._set_health(health)
+        agent._set_block(block)
+        statuses = fields[2 + 2*i]
+        agent.status_effect_state.clean_up()
+        for j in range(0, len(statuses), 2):
+            agent.status_effect_state.apply_status(STATUS_EFFECTS[statuses[j]], statuses[j + 1])
+    enemies = agents[1:]
+    for i, enemy in enumerate(enemies):
+        assert isinstance(enemy, agent_module.Enemy)
+        enemy.action_set.set_state(fields[1 + 2*len(agents) + i])
+    battle_state.enemies = [enemy for i, enemy in enumerate(enemies) if fields[1 + 2*(i + 1)][0] == 1]
+    piles_start = 1 + 2*len(agents) + len(enemies)
+    for i, card_pile in enumerate(CardPile):
+        battle_state.set_pile(card_pile, [get_card(card_id) for card_id in fields[piles_start + i]])
+    return piles_start + len(CardPile)
+
+class Replayer:
+    class Step:
+        def __init__(self, agent_index: int, choice: int, fields: list[list[int]], card_count: int):
+            self.agent_index = agent_index
+            self.choice = choice
+            self.fields = fields
+            self.card_count = card_count
+
+    def __init__(self, filename: str, deck: list[Card]|None = None):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        assert data[:len(MAGIC)] in (MAGIC, MAGIC_V1), f"{filename} is not a battle trace"
+        data = zlib.decompress(data[len(MAGIC):])
+        header_length, pos = _read_int(data, 0)
+        header = json.loads(data[pos:pos + header_length])
+        pos += header_length
+        self.seed: int|None = header['seed']
+        self.character = Character[header['character']]
+        self.ascention: int = header['ascention']
+        self.enemies: list[tuple[str, int]] = [(name, max_health) for name, max_health in header['enemies']]
+        self.deck = deck if deck is not None else [Replayer._find_card(card_repr, upgrade_count) for card_repr, upgrade_count in header['deck']]
+        # new cards as (source card, upgrade count), after the deck
+        self.new_cards: list[tuple[int, int]] = []
+        self.steps: list[Replayer.Step] = []
+        fields: list[list[int]] = []
+        while pos < len(data):
+            agent_index, pos = _read_int(data, pos)
+            choice, pos = _read_int(data, pos)
+            count, pos = _read_int(data, pos)
+            for _ in range(count):
+                source, pos = _read_int(data, pos)
+                upgrades, pos = _read_int(data, pos)
+                self.new_cards.append((source, upgrades))
+            count, pos = _read_int(data, pos)
+            fields = [field for field in fields]
+            for _ in range(count):
+                index, pos = _read_int(data, pos)
+                length, pos = _read_int(data, pos)
+                values: list[int] = []
+                for _ in range(length):
+                    value, pos = _read_int(data, pos)
+                    values.append(value)
+                if index == len(fields):
+                    fields.append(values)
+                else:
+                    fields[index] = values
+            self.steps.append(Replayer.Step(agent_index, choice, fields, len(self.deck) + len(self.new_cards)))
+
+    @staticmethod
+    def _find_card(card_repr: str, upgrade_count: int) -> Card:
+        for name, card_gen in vars(CardGen).items():
+            if name.startswith('_') or not callable(card_gen):
+                continue
+            card = card_gen()
+            card.upgrade(upgrade_count)
+            if repr(card) == card_repr:
+                return card
+        raise Exception(f"Card {card_repr.splitlines()[0]} is not in CardGen, the deck should be given to the Replayer")
+
+    def get_step_count(self) -> int:
+        # the last step is the state the battle ended in
+        return len(self.steps)
+
+    def get_choice(self, step: int) -> tuple[int, int]:
+        # the agent that acted at this step, and its choice
+        return self.steps[step].agent_index, self.steps[step].choice
+
+    def get_battle_state(self, step: int, bot: GGPA|None = None) -> BattleState:
+        from battle import BattleState
+        from ggpa.random_bot import RandomBot
+        game_state = GameState(self.character, bot if bot is not None else RandomBot(), self.ascention, self.seed)
+        game_state.set_deck(*self.deck)
+        enemies: list[Enemy] = []
+        for name, max_health in self.enemies:
+            enemy = getattr(agent_module, name)(game_state)
+            enemy.max_health = max_health
+            enemy.zobrist_hash = enemy._compute_zobrist_hash()
+            enemies.append(enemy)
+        battle_state = BattleState(game_state, *enemies, verbose=Verbose.NO_LOG)
+        cards: list[Card] = [card for card in battle_state.discard_pile]
+        for source, upgrades in self.new_cards[:self.steps[step].card_count - len(cards)]:
+            card = copy.deepcopy(cards[source])
+            card.upgrade(upgrades)
+            cards.append(card)
+        fields = self.steps[step].fields
+        streams_index = _set_fields(battle_state, [battle_state.player] + enemies, fields, cards.__getitem__)
+        # the streams are moved to where they were at this step. they can't be for a battle without a seed,
+        # a version 1 trace, or a stream that wasn't counted; those start where a new battle would
+        if self.seed is not None and streams_index < len(fields):
+            for rng, word_count in zip((battle_state.rng, battle_state.policy_rng), fields[streams_index]):
+                if isinstance(rng, CountedRandom) and word_count >= rng.word_count:
+                    rng.advance(word_count - rng.word_count)
+        return battle_state
@@ -1,129 +1,220 @@
 from __future__ import annotations
+import copy
+import random
 from target.agent_target import AgentSet, ChooseAgentTarget, SelfAgentTarget, AllAgentsTarget, RandomAgentTarget
 from target.card_target import CardPile, SelfCardTarget, ChooseCardTarget
 from action.action import Action, AddMana
 from action.agent_targeted_action import DealAttackDamage, ApplyStatus, AddBlock, Heal
 from action.card_targeted_action import CardTargetedL1, Exhaust, AddCopy, UpgradeCard, DiscardCard
+from action.compiler import Instruction, compile_actions, run_program
 from config import CardType, Character, Rarity
 from status_effecs import StatusEffectRepo, StatusEffectDefinition
 from value import Value, ConstValue, UpgradableOnce, LinearUpgradable
-from utility import RandomStr
+from utility import RandomStr, Zobrist, SlotCopy
 from typing import TYPE_CHECKING, Callable
 if TYPE_CHECKING:
     from game import GameState
     from battle import BattleState
 
-class Card:
+class CardDefinition(SlotCopy):
+    # what every copy of a card shares, it is not changed after it is built
+    __slots__ = ('name', 'card_type', 'mana_cost', 'character', 'rarity', 'mana_action', 'actions', 'desc', 'levels')
+
     def __init__(self, name: str, card_type: CardType, mana_cost: Value, character: Character, rarity: Rarity, *actions: Action|CardTargetedL1, desc: str|None = None):
         self.name = name
         self.card_type = card_type
         self.mana_cost = mana_cost
         self.character = character
         self.rarity = rarity
-        self.upgrade_count = 0
         self.mana_action = AddMana(mana_cost.negative())
-        self.actions: list[Action] = []
-        for action in actions:
-            if isinstance(action, Action):
-                self.actions.append(action)
-            else:
-                self.actions.append(action.By(self))
+        # card targeted actions get the playing card from run_program
+        self.actions: list[Action] = [action if isinstance(action, Action) else action.as_action() for action in actions]
         self.desc = desc if desc is not None else " ".join([f"{action}" for action in self.actions])
+        self.levels: dict[int, CardLevel] = {}
+
+    def create(self) -> Card:
+        return Card(self)
+
+    def get_level(self, upgrade_count: int) -> CardLevel:
+        level = self.levels.get(upgrade_count)
+        if level is None:
+            if upgrade_count == 0:
+                level = CardLevel(self, 0, self.mana_cost, self.mana_action, self.actions)
+            else:
+                mana_cost, mana_action, actions = copy.deepcopy((self.mana_cost, self.mana_action, self.actions))
+                mana_cost.upgrade(upgrade_count)
+                for action in actions:
+                    for val in action.values:
+                        val.upgrade(upgrade_count)
+                level = CardLevel(self, upgrade_count, mana_cost, mana_action, actions)
+            self.levels[upgrade_count] = level
+        return level
+
+    def renamed(self, name: str) -> CardDefinition:
+        ret = copy.copy(self)
+        ret.name = name
+        ret.levels = {}
+        return ret
+
+    def __deepcopy__(self, memo: dict):
+        return self
+
+class CardLevel(SlotCopy):
+    # the values and actions of a card definition at one upgrade count, built once and shared
+    __slots__ = ('mana_cost', 'mana_action', 'actions', 'program', 'repr', 'zobrist_key')
+
+    def __init__(self, definition: CardDefinition, upgrade_count: int, mana_cost: Value, mana_action: Action, actions: list[Action]):
+        self.mana_cost = mana_cost
+        self.mana_action = mana_action
+        self.actions = actions
+        self.program: list[Instruction]|None = None
+        self.repr = "{}{}-cost:{}-{}-{}\n-".format(definition.name, "+"*upgrade_count, mana_cost.peek(), definition.card_type, definition.rarity) + \
+            "\n-".join(['' + action.__repr__() for action in actions])
+        self.zobrist_key = Zobrist.hash_str(self.repr)
+
+class Card(SlotCopy):
+    # a copy of a card in a deck or a pile: its definition and how many times it was upgraded
+    __slots__ = ('definition', 'upgrade_count', 'level')
+
+    def __init__(self, definition: CardDefinition, upgrade_count: int = 0):
+        self.definition = definition
+        self.upgrade_count = upgrade_count
+        self.level = definition.get_level(upgrade_count)
+
+    @property
+    def name(self) -> str:
+        return self.definition.name
+
+    @property
+    def card_type(self) -> CardType:
+        return self.definition.card_type
+
+    @property
+    def character(self) -> Character:
+        return self.definition.character
+
+    @property
+    def rarity(self) -> Rarity:
+        return self.definition.rarity
+
+    @property
+    def desc(self) -> str:
+        return self.definition.desc
+
+    @property
+    def mana_cost(self) -> Value:
+        return self.level.mana_cost
+
+    @property
+    def mana_action(self) -> Action:
+        return self.level.mana_action
+
+    @property
+    def actions(self) -> list[Action]:
+        return self.level.actions
     
     def play(self, game_state: GameState, battle_state: BattleState):
         assert self.is_playable(game_state, battle_state)
-        self.mana_action.play(game_state.player, game_state, battle_state)
-        for action in self.actions:
-            action.play(game_state.player, game_state, battle_state)
+        run_program(self.get_program(), game_state.player, game_state, battle_state, self)
+
+    def get_program(self) -> list[Instruction]:
+        # compiled on first play, and shared by every copy with the same upgrade count
+        if self.level.program is None:
+            self.level.program = compile_actions([self.level.mana_action] + self.level.actions)
+        return self.level.program
 
     def is_playable(self, game_state: GameState, battle_state: BattleState):
-        return self.mana_cost.peek() <= battle_state.mana
+        return self.level.mana_cost.peek() <= battle_state.mana
 
     def upgrade(self, times: int = 1):
         self.upgrade_count += times
-        self.mana_cost.upgrade(times)
-        for action in self.actions:
-            for val in action.values:
-                val.upgrade(times)
+        self.level = self.definition.get_level(self.upgrade_count)
+
+    def rename(self, name: str):
+        self.definition = self.definition.renamed(name)
+        self.level = self.definition.get_level(self.upgrade_count)
+
+    def get_zobrist_key(self) -> int:
+        return self.level.zobrist_key
 
     def get_name(self) -> str:
-        return "{}{}".format(self.name, "+"*self.upgrade_count)
+        return "{}{}".format(self.definition.name, "+"*self.upgrade_count)
     
     def __repr__(self) -> str:
-        return "{}-cost:{}-{}-{}\n-".format(self.get_name(), self.mana_cost.peek(), self.card_type, self.rarity) + \
-            "\n-".join(['' + action.__repr__() for action in self.actions])
+        return self.level.repr
 
     def get_description(self) -> str:
-        return self.desc
+        return self.definition.desc
+
+    def __copy__(self) -> Card:
+        return Card(self.definition, self.upgrade_count)
+
+    def __deepcopy__(self, memo: dict) -> Card:
+        # the definition is shared, so a copy is a new card with the same upgrade count
+        return Card(self.definition, self.upgrade_count)
 
 class CardGen:
-    Strike = lambda: Card("Strike", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(6, 9)).To(ChooseAgentTarget(AgentSet.ENEMY)))
-    Defend = lambda: Card("Defend", CardType.SKILL, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, AddBlock(UpgradableOnce(5, 8)).To(SelfAgentTarget()))
-    Searing_Blow = lambda: Card("SearingBlow", CardType.ATTACK, ConstValue(2), Character.IRON_CLAD, Rarity.UNCOMMON, DealAttackDamage(LinearUpgradable(12, 4)).To(ChooseAgentTarget(AgentSet.ENEMY)))
-    Bash = lambda: Card("Bash", CardType.ATTACK, ConstValue(2), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(8, 10)).And(ApplyStatus(UpgradableOnce(2, 3), StatusEffectRepo.VULNERABLE)).To(ChooseAgentTarget(AgentSet.ENEMY)))
-    BashStar = lambda: Card("Bash", CardType.ATTACK, ConstValue(2), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(8, 10)).To(ChooseAgentTarget(AgentSet.ENEMY)).And(ApplyStatus(UpgradableOnce(2, 3), StatusEffectRepo.VULNERABLE).To(ChooseAgentTarget(AgentSet.ENEMY))))
-    Anger = lambda: Card("Anger", CardType.ATTACK, ConstValue(0), Character.IRON_CLAD, Rarity.COMMON, DealAttackDamage(UpgradableOnce(6, 8)).To(ChooseAgentTarget(AgentSet.ENEMY)), AddCopy(CardPile.DISCARD).To(SelfCardTarget()))
+    Strike = CardDefinition("Strike", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(6, 9)).To(ChooseAgentTarget(AgentSet.ENEMY))).create
+    Defend = CardDefinition("Defend", CardType.SKILL, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, AddBlock(UpgradableOnce(5, 8)).To(SelfAgentTarget())).create
+    Searing_Blow = CardDefinition("SearingBlow", CardType.ATTACK, ConstValue(2), Character.IRON_CLAD, Rarity.UNCOMMON, DealAttackDamage(LinearUpgradable(12, 4)).To(ChooseAgentTarget(AgentSet.ENEMY))).create
+    Bash = CardDefinition("Bash", CardType.ATTACK, ConstValue(2), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(8, 10)).And(ApplyStatus(UpgradableOnce(2, 3), StatusEffectRepo.VULNERABLE)).To(ChooseAgentTarget(AgentSet.ENEMY))).create
+    BashStar = CardDefinition("Bash", CardType.ATTACK, ConstValue(2), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(8, 10)).To(ChooseAgentTarget(AgentSet.ENEMY)).And(ApplyStatus(UpgradableOnce(2, 3), StatusEffectRepo.VULNERABLE).To(ChooseAgentTarget(AgentSet.ENEMY)))).create
+    Anger = CardDefinition("Anger", CardType.ATTACK, ConstValue(0), Character.IRON_CLAD, Rarity.COMMON, DealAttackDamage(UpgradableOnce(6, 8)).To(ChooseAgentTarget(AgentSet.ENEMY)), AddCopy(CardPile.DISCARD).To(SelfCardTarget())).create
     # TODO upgrade for Armament
-    Armaments = lambda: Card("Armament", CardType.SKILL, ConstValue(1), Character.IRON_CLAD, Rarity.COMMON, AddBlock(ConstValue(5)).To(SelfAgentTarget()), UpgradeCard().To(ChooseCardTarget(CardPile.HAND)))
-    Cleave = lambda: Card("Cleave", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.COMMON, DealAttackDamage(UpgradableOnce(8, 11)).To(AllAgentsTarget(AgentSet.ENEMY)))
-    Impervious = lambda: Card("Impervious", CardType.SKILL, ConstValue(2), Character.IRON_CLAD, Rarity.RARE, AddBlock(UpgradableOnce(30, 40)).To(SelfAgentTarget()), Exhaust().To(SelfCardTarget()))
+    Armaments = CardDefinition("Armament", CardType.SKILL, ConstValue(1), Character.IRON_CLAD, Rarity.COMMON, AddBlock(ConstValue(5)).To(SelfAgentTarget()), UpgradeCard().To(ChooseCardTarget(CardPile.HAND))).create
+    Cleave = CardDefinition("Cleave", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.COMMON, DealAttackDamage(UpgradableOnce(8, 11)).To(AllAgentsTarget(AgentSet.ENEMY))).create
+    Impervious = CardDefinition("Impervious", CardType.SKILL, ConstValue(2), Character.IRON_CLAD, Rarity.RARE, AddBlock(UpgradableOnce(30, 40)).To(SelfAgentTarget()), Exhaust().To(SelfCardTarget())).create
     # TODO this doesn't work yet, here for reference
-    Survivor = lambda: Card("Survivor", CardType.SKILL, ConstValue(1), Character.SILENT, Rarity.COMMON, AddBlock(ConstValue(8)).To(SelfAgentTarget()), DiscardCard().To(ChooseCardTarget(CardPile.HAND)))
+    Survivor = CardDefinition("Survivor", CardType.SKILL, ConstValue(1), Character.SILENT, Rarity.COMMON, AddBlock(ConstValue(8)).To(SelfAgentTarget()), DiscardCard().To(ChooseCardTarget(CardPile.HAND))).create
     # NEW CARDS
-    Stimulate = lambda: Card("Stimulate", CardType.SKILL, ConstValue(1), Character.IRON_CLAD, Rarity.COMMON, ApplyStatus(ConstValue(4), StatusEffectRepo.VIGOR).To(SelfAgentTarget()))
-    Batter = lambda: Card("Batter", CardType.SKILL, ConstValue(1), Character.IRON_CLAD, Rarity.COMMON, DealAttackDamage(ConstValue(0), ConstValue(10)).To(ChooseAgentTarget(AgentSet.ENEMY)))
-    Tolerate = lambda: Card("Tolerate", CardType.POWER, ConstValue(3), Character.IRON_CLAD, Rarity.COMMON, ApplyStatus(ConstValue(1), StatusEffectRepo.TOLERANCE).To(SelfAgentTarget()), desc="Gain 1 block every turn and increase this gain by 2.")
-    Bomb = lambda: Card("Bomb", CardType.SKILL, ConstValue(2), Character.IRON_CLAD, Rarity.COMMON, ApplyStatus(ConstValue(3), StatusEffectRepo.BOMB).To(SelfAgentTarget()), desc="At the end of 3 turns, deal 40 damage to all enemies.")
-    Suffer = lambda: Card("Suffer", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(15, 30)).To(ChooseAgentTarget(AgentSet.ENEMY)))
+    Stimulate = CardDefinition("Stimulate", CardType.SKILL, ConstValue(1), Character.IRON_CLAD, Rarity.COMMON, ApplyStatus(ConstValue(4), StatusEffectRepo.VIGOR).To(SelfAgentTarget())).create
+    Batter = CardDefinition("Batter", CardType.SKILL, ConstValue(1), Character.IRON_CLAD, Rarity.COMMON, DealAttackDamage(ConstValue(0), ConstValue(10)).To(ChooseAgentTarget(AgentSet.ENEMY))).create
+    Tolerate = CardDefinition("Tolerate", CardType.POWER, ConstValue(3), Character.IRON_CLAD, Rarity.COMMON, ApplyStatus(ConstValue(1), StatusEffectRepo.TOLERANCE).To(SelfAgentTarget()), desc="Gain 1 block every turn and increase this gain by 2.").create
+    Bomb = CardDefinition("Bomb", CardType.SKILL, ConstValue(2), Character.IRON_CLAD, Rarity.COMMON, ApplyStatus(ConstValue(3), StatusEffectRepo.BOMB).To(SelfAgentTarget()), desc="At the end of 3 turns, deal 40 damage to all enemies.").create
+    Suffer = CardDefinition("Suffer", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(15, 30)).To(ChooseAgentTarget(AgentSet.ENEMY))).create
 
 class CardRepo:
     @staticmethod
-    def get_random() -> Callable[[], Card]:
-        import random, string
-        import numpy as np
+    def get_random(rng: random.Random|None = None) -> Callable[[], Card]:
+        rng = rng if rng is not None else random.Random(random.getrandbits(64))
         def get_random_pile():
-            return random.choice([CardPile.HAND, CardPile.DISCARD, CardPile.DRAW])
+            return rng.choice([CardPile.HAND, CardPile.DISCARD, CardPile.DRAW])
         def get_random_target():
-            return random.choice([AllAgentsTarget(AgentSet.ALL), AllAgentsTarget(AgentSet.ENEMY), SelfAgentTarget(), ChooseAgentTarget(AgentSet.ENEMY), RandomAgentTarget(AgentSet.ENEMY)])
+            return rng.choice([AllAgentsTarget(AgentSet.ALL), AllAgentsTarget(AgentSet.ENEMY), SelfAgentTarget(), ChooseAgentTarget(AgentSet.ENEMY), RandomAgentTarget(AgentSet.ENEMY)])
         def get_deal_damage(cost: Value) -> Action:
-            val = random.randint(0, int((cost.peek() + 1) * 10))
-            multi = 1 if random.randint(0, 3) != 0 else random.randint(2, 10)
+            val = rng.randint(0, int((cost.peek() + 1) * 10))
+            multi = 1 if rng.randint(0, 3) != 0 else rng.randint(2, 10)
             target = get_random_target()
             return DealAttackDamage(ConstValue(int(val/multi)), ConstValue(multi)).To(target)
         def get_add_copy():
             return AddCopy(CardPile.DISCARD).To(SelfCardTarget())
         def get_add_block(cost: Value) -> Action:
-            val = random.randint(0, int((cost.peek() + 1) * 7))
+            val = rng.randint(0, int((cost.peek() + 1) * 7))
             return AddBlock(ConstValue(val)).To(get_random_target())
         def get_apply_status(cost: Value) -> Action:
-            val = random.randint(0, int((cost.peek() + 1) * 5))
+            val = rng.randint(0, int((cost.peek() + 1) * 5))
             ses: list[StatusEffectDefinition] = [StatusEffectRepo.STRENGTH, StatusEffectRepo.VIGOR, StatusEffectRepo.VULNERABLE, StatusEffectRepo.WEAK]
-            status = random.choice(ses)
+            status = rng.choice(ses)
             return ApplyStatus(ConstValue(val), status).To(get_random_target())
         def get_random_action(cost: Value) -> Action|CardTargetedL1:
-            return random.choice([
+            return rng.choice([
                 get_deal_damage(cost), get_add_copy(), get_add_block(cost), get_apply_status(cost)
                 ])
-        name = RandomStr.get_random()
-        type = random.choice([CardType.ATTACK, CardType.POWER, CardType.SKILL])
-        p = np.array([1, 1, 0.8, 0.3, 0.1, 0.05])
-        p /= sum(p)
-        cost = np.random.choice([0, 1, 2, 3, 4, 5], p=p)
+        name = RandomStr.get_random(rng=rng)
+        type = rng.choice([CardType.ATTACK, CardType.POWER, CardType.SKILL])
+        cost = rng.choices([0, 1, 2, 3, 4, 5], weights=[1, 1, 0.8, 0.3, 0.1, 0.05])[0]
         char = Character.IRON_CLAD
         rarity = Rarity.COMMON
         acs: list[CardTargetedL1|Action] = []
-        p = np.array([1, 0.5, 0.1])
-        p /= sum(p)
-        ac_count = np.random.choice([1, 2, 3], p=p)
+        ac_count = rng.choices([1, 2, 3], weights=[1, 0.5, 0.1])[0]
         if type == CardType.ATTACK:
             acs.append(get_deal_damage(ConstValue(int(cost/ac_count))))
         while len(acs) != ac_count:
             acs.append(get_random_action(ConstValue(int(cost/ac_count))))
-        if random.randint(0, 3) == 0:
+        if rng.randint(0, 3) == 0:
             acs.append(Exhaust().To(SelfCardTarget()))
         # TODO check copy
-        gen = lambda: Card(name, type, ConstValue(cost), char, rarity, *acs)
-        return gen
+        return CardDefinition(name, type, ConstValue(cost), char, rarity, *acs).create
 
     @staticmethod
     def get_starter(character: Character) -> list[Card]:
@@ -182,6 +273,10 @@ class CardRepo:
     
     @staticmethod
     def anonymize_deck(cards: list[Card]):
+        renamed: dict[int, CardDefinition] = {}
         for card in cards:
-            card.name = RandomStr.get_hashed(card.name)
+            if id(card.definition) not in renamed:
+                renamed[id(card.definition)] = card.definition.renamed(RandomStr.get_hashed(card.name))
+            card.definition = renamed[id(card.definition)]
+            card.level = card.definition.get_level(card.upgrade_count)
         return cards
\ No newline at end of file
@@ -4,6 +4,21 @@ MAX_BLOCK = 999
 MAX_MANA = 999
 MAX_STATUS = 999
 
+# check the incremental state hash against a full recomputation on every lookup
+DEBUG_STATE_HASH = False
+
+# battle logs are kept in memory up to this many characters, and written at the end of the battle
+LOG_BUFFER_SIZE = 1 << 20
+# write the battle logs from a background thread
+LOG_IN_THREAD = False
+
+# size of the on-disk cache of llm responses, the least recently used are evicted past it
+PROMPT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# number of option previews of the llm prompts kept in memory, keyed by state and option
+OPTION_RESULT_CACHE_SIZE = 4096
+# number of rendered rule and deck descriptions of the llm prompts kept in memory
+GAME_CONTEXT_CACHE_SIZE = 1024
+
 class Character(Enum):
     IRON_CLAD = 1
     SILENT = 2
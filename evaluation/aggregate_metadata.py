@@ -1,28 +1,41 @@
 import argparse
+import json
+
+def read_metadata(filename: str) -> list[dict]:
+    # the metadata file has one json object for each game, appended one after another
+    with open(filename, 'r') as f:
+        text = f.read()
+    decoder = json.JSONDecoder()
+    metadata: list[dict] = []
+    index = 0
+    while True:
+        while index < len(text) and text[index].isspace():
+            index += 1
+        if index == len(text):
+            return metadata
+        obj, index = decoder.raw_decode(text, index)
+        metadata.append(obj)
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('filename')
     args = parser.parse_args()
     filename = args.filename
-    with open(filename, 'r') as f:
-        lines = f.readlines()
-    wrong_format_count = 0
-    wrong_range_count = 0
-    response_times = []
-    for line in lines:
-        words = line.split()
-        if "wrong_format_count" in line:
-            wrong_format_count += int(words[-1][:-1])
-        elif "wrong_range_count" in line:
-            wrong_range_count += int(words[-1])
-        elif words[-1][-1] == ',' and words[-1][-2] != ']':
-            response_times.append(float(words[-1][:-1]))
+    metadata = read_metadata(filename)
+    wrong_format_count = sum([game["wrong_format_count"] for game in metadata])
+    wrong_range_count = sum([game["wrong_range_count"] for game in metadata])
+    response_times = [response_time for game in metadata for response_time in game["response_time"]]
     print(wrong_format_count)
     print(wrong_range_count)
     print(len(response_times))
     print(100*(wrong_format_count + wrong_range_count)/len(response_times))
     print(sum(response_times)/len(response_times))
+    estimated_tokens = [tokens for game in metadata for tokens in game.get("estimated_prompt_tokens", [])]
+    prompt_tokens = [tokens for game in metadata for tokens in game.get("prompt_tokens", [])]
+    if len(prompt_tokens) > 0:
+        # the mean prompt tokens, and the mean error of their estimate in percent
+        print(sum(prompt_tokens)/len(prompt_tokens))
+        print(100*sum([abs(estimated - used)/used for estimated, used in zip(estimated_tokens, prompt_tokens)])/len(prompt_tokens))
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,7 +1,12 @@
 from tqdm import tqdm
+import copy
+import numpy as np
 import pandas as pd
 import time
+import math
+import statistics
 import argparse
+import openai
 from typing import Callable
 from joblib import delayed, Parallel
 import sys
@@ -12,21 +17,50 @@ sys.path.append(parent_dir)
 
 from game import GameState
 from battle import BattleState
-from config import Character, Verbose
+from config import Character, Verbose, PROMPT_CACHE_MAX_BYTES
 from agent import AcidSlimeSmall, SpikeSlimeSmall, JawWorm, Goblin, HobGoblin, Leech, Enemy
 from card import CardGen, Card, CardRepo
 from ggpa.ggpa import GGPA
 from ggpa.random_bot import RandomBot
 from ggpa.backtrack import BacktrackBot
+from ggpa.backtrack_parallel import BacktrackParallelBot
+from ggpa.mcts import MCTSBot
+from ggpa.transposition_table import TranspositionTable, LRUTranspositionTable, DepthPreferredTranspositionTable
 from ggpa.chatgpt_bot import ChatGPTBot
+from ggpa.prompt_cache import PromptCache
 from ggpa.prompt2 import PromptOption
 
-def name_to_bot(name: str, limit_share: float) -> GGPA:
+def name_to_bot(name: str, limit_share: float, prompt_cache: PromptCache|None = None) -> GGPA:
     if name == 'r':
         return RandomBot()
+    if len(name) > 5 and name[0:5] == 'mctst':
+        return MCTSBot(time_budget=int(name[5:])/1000)
+    if len(name) > 4 and name[0:4] == 'mcts':
+        return MCTSBot(iterations=int(name[4:]))
+    if len(name) > 3 and name[0:3] == 'btp':
+        depth, worker_count = name[3:].split('-')
+        return BacktrackParallelBot(int(depth), int(worker_count))
+    if len(name) > 3 and name[0:3] == 'bti':
+        # bti<milliseconds>[-<max depth>]
+        budget, *max_depth = name[3:].split('-')
+        return BacktrackBot(int(max_depth[0]) if len(max_depth) > 0 else 10, True, time_budget=int(budget)/1000)
+    if len(name) > 3 and name[0:3] == 'bte':
+        return BacktrackBot(int(name[3:]), False, expectimax=True)
+    if len(name) > 3 and name[0:3] == 'btu':
+        return BacktrackBot(int(name[3:]), False, make_unmake=True)
     if len(name) > 3 and name[0:3] == 'bts':
-        depth = int(name[3:])
-        return BacktrackBot(depth, True)
+        # bts<depth>[-lru|-dp][-<megabytes>]
+        depth, *options = name[3:].split('-')
+        table_type: type[TranspositionTable] = LRUTranspositionTable
+        max_bytes = TranspositionTable.DEFAULT_MAX_BYTES
+        for option in options:
+            if option == 'lru':
+                table_type = LRUTranspositionTable
+            elif option == 'dp':
+                table_type = DepthPreferredTranspositionTable
+            else:
+                max_bytes = int(option) * 1024 * 1024
+        return BacktrackBot(int(depth), True, table_type(max_bytes))
     if len(name) > 2 and name[0:2] == 'bt':
         depth = int(name[2:])
         return BacktrackBot(depth, False)
@@ -52,7 +86,7 @@ def name_to_bot(name: str, limit_share: float) -> GGPA:
             'cotr': PromptOption.CoT_rev,
         }
         fs = int(fs[1:])
-        return ChatGPTBot(model_dict[model], prompt_dict[prompt], fs, show_results, limit_share)
+        return ChatGPTBot(model_dict[model], prompt_dict[prompt], fs, show_results, limit_share, prompt_cache)
     raise Exception("Bot name not recognized")
 
 def get_scenario(index: int, anonymize: bool) -> Callable[[], tuple[str, list[Card]]]:
@@ -88,17 +122,135 @@ def get_enemies(enemies: str, game_state: GameState) -> list[Enemy]:
             raise Exception(f"Enemies not recognized for {char} in {enemies}")
     return ret
 
-def simulate_one(index: int, bot: GGPA, deck: list[Card], enemies: str, path: str, verbose: Verbose):
-    game_state = GameState(Character.IRON_CLAD, bot, 0)
+def get_game_seed(seed: int|None, game_index: int) -> int|None:
+    # independent stream per game, the same for every bot so that their games can be compared in pairs
+    if seed is None:
+        return None
+    return int(np.random.SeedSequence(seed, spawn_key=(game_index,)).generate_state(1, np.uint64)[0])
+
+def get_parallel(thread_count: int, bot: GGPA) -> Parallel:
+    # the games of the gpt bots mostly wait for responses, they run as threads of this process
+    # so that their requests are in flight together and share the token buckets of ChatGPTClient
+    if isinstance(bot, ChatGPTBot):
+        return Parallel(n_jobs=thread_count, prefer='threads')
+    return Parallel(n_jobs=thread_count)
+
+def simulate_games(games: list[tuple[int, GGPA, int|None]], thread_count: int, scenario: Callable[[], tuple[str, list[Card]]], enemies: str,
+                   path: str, verbose: Verbose, trace: bool) -> list[list]:
+    # plays (index, bot, seed) games, those of the gpt bots on threads and the others in processes,
+    # and returns the results in the order of the games
+    outputs: list[list] = [[] for _ in games]
+    for uses_threads in [False, True]:
+        indices = [i for i, (_, bot, _) in enumerate(games) if isinstance(bot, ChatGPTBot) == uses_threads]
+        if len(indices) == 0:
+            continue
+        results = get_parallel(thread_count, games[indices[0]][1])(delayed(simulate_one)(games[i][0], games[i][1], scenario()[1], enemies, path, verbose, games[i][2], trace) for i in tqdm(indices))
+        assert isinstance(results, list), "Parallel jobs have not resulted in an output of type list"
+        for i, result in zip(indices, results):
+            outputs[i] = result
+    return outputs
+
+def simulate_one(index: int, bot: GGPA, deck: list[Card], enemies: str, path: str, verbose: Verbose, seed: int|None = None, trace: bool = False):
+    # every game plays with its own copy of the bot, as it does in a worker process
+    bot = copy.deepcopy(bot)
+    game_state = GameState(Character.IRON_CLAD, bot, 0, seed)
     game_state.set_deck(*deck)
     battle_state = BattleState(game_state, *get_enemies(enemies, game_state),
-                               verbose=verbose, log_filename=os.path.join(path, f'{index}_{bot.name}'))
-    battle_state.run()
+                               verbose=verbose, log_filename=os.path.join(path, f'{index}_{bot.name}'),
+                               trace_filename=os.path.join(path, f'{index}_{bot.name}') if trace else None)
+    try:
+        battle_state.run()
+    finally:
+        # the worker processes of the copy are not used after its game
+        if isinstance(bot, BacktrackParallelBot):
+            bot.shutdown()
     if isinstance(bot, ChatGPTBot):
         bot.dump_history(os.path.join(path, f'{index}_{bot.name}_history'))
         bot.dump_metadata(os.path.join(path, f'{bot.name}_metadata'))
+    elif isinstance(bot, BacktrackBot) and bot.should_save_states:
+        bot.dump_metadata(os.path.join(path, f'{bot.name}_metadata'))
     return [bot.name, game_state.player.health, game_state.get_end_results() != -1]
 
+def get_win_interval(wins: list[bool], z: float) -> tuple[float, float]:
+    # wilson score interval
+    n = len(wins)
+    p = sum(wins)/n
+    center = (p + z*z/(2*n))/(1 + z*z/n)
+    half_width = z*math.sqrt(p*(1 - p)/n + z*z/(4*n*n))/(1 + z*z/n)
+    return center - half_width, center + half_width
+
+def get_mean_interval(values: list[float], z: float) -> tuple[float, float]:
+    mean = statistics.fmean(values)
+    half_width = z*statistics.stdev(values)/math.sqrt(len(values)) if len(values) > 1 else math.inf
+    return mean - half_width, mean + half_width
+
+def get_difference_p_value(a: list[float], b: list[float], paired: bool) -> float:
+    # two sided normal approximation, on the per-game differences if the games share their seeds
+    # with fewer than two games there is no variance, the bots are not told apart
+    if min(len(a), len(b)) < 2:
+        return 1.0
+    if paired:
+        n = min(len(a), len(b))
+        diffs = [a[i] - b[i] for i in range(n)]
+        mean, se = statistics.fmean(diffs), statistics.stdev(diffs)/math.sqrt(n)
+    else:
+        mean = statistics.fmean(a) - statistics.fmean(b)
+        se = math.sqrt(statistics.variance(a)/len(a) + statistics.variance(b)/len(b))
+    if se == 0:
+        return 1.0 if mean == 0 else 0.0
+    return 2*(1 - statistics.NormalDist().cdf(abs(mean)/se))
+
+def simulate_adaptive(bots: list[GGPA], max_count: int, thread_count: int, scenario: Callable[[], tuple[str, list[Card]]], enemies: str,
+                      path: str, verbose: Verbose, trace_battles: bool, seed: int|None, round_size: int, min_count: int, win_width: float, health_width: float, alpha: float) -> list[list]:
+    # runs games in rounds, a bot stops when its intervals are narrow enough or when it is separated from every other bot
+    round_count = math.ceil(max_count/round_size)
+    # the significance is split between all rounds, since every round looks at the results again
+    z = statistics.NormalDist().inv_cdf(1 - alpha/(2*round_count))
+    results: list[list[list]] = [[] for _ in bots]
+    stopped: list[str] = ['' for _ in bots]
+    trace: list[list] = []
+    pair_trace: list[list] = []
+    for round_index in range(round_count):
+        games = [(bot_id, game) for bot_id in range(len(bots)) if stopped[bot_id] == ''
+                 for game in range(len(results[bot_id]), min(len(results[bot_id]) + round_size, max_count))]
+        if len(games) == 0:
+            break
+        outputs = simulate_games([(bot_id * max_count + game, bots[bot_id], get_game_seed(seed, game)) for bot_id, game in games],
+                                 thread_count, scenario, enemies, path, verbose, trace_battles)
+        for (bot_id, _), output in zip(games, outputs):
+            results[bot_id].append(output)
+        separated: list[bool] = [len(bots) > 1 for _ in bots]
+        for bot_id in range(len(bots)):
+            for other_id in range(bot_id + 1, len(bots)):
+                if len(results[bot_id]) < min_count or len(results[other_id]) < min_count:
+                    separated[bot_id] = separated[other_id] = False
+                    continue
+                win_p = get_difference_p_value([float(row[2]) for row in results[bot_id]], [float(row[2]) for row in results[other_id]], seed is not None)
+                health_p = get_difference_p_value([row[1] for row in results[bot_id]], [row[1] for row in results[other_id]], seed is not None)
+                decided = min(win_p, health_p) < alpha/round_count
+                if not decided:
+                    separated[bot_id] = separated[other_id] = False
+                pair_trace.append([round_index, bots[bot_id].name, bots[other_id].name, min(len(results[bot_id]), len(results[other_id])), win_p, health_p, decided])
+        for bot_id in range(len(bots)):
+            wins = [row[2] for row in results[bot_id]]
+            healths = [row[1] for row in results[bot_id]]
+            win_low, win_high = get_win_interval(wins, z)
+            health_low, health_high = get_mean_interval(healths, z)
+            if stopped[bot_id] == '':
+                if len(results[bot_id]) >= max_count:
+                    stopped[bot_id] = 'max_count'
+                elif len(results[bot_id]) >= min_count and win_high - win_low <= win_width and health_high - health_low <= health_width:
+                    stopped[bot_id] = 'interval'
+                elif separated[bot_id]:
+                    stopped[bot_id] = 'separated'
+            trace.append([round_index, bots[bot_id].name, len(wins), statistics.fmean(wins), win_low, win_high,
+                          statistics.fmean(healths), health_low, health_high, stopped[bot_id]])
+        if all([reason != '' for reason in stopped]):
+            break
+    pd.DataFrame(trace, columns=["Round", "BotName", "Games", "Win", "WinLow", "WinHigh", "PlayerHealth", "HealthLow", "HealthHigh", "Stopped"]).to_csv(os.path.join(path, "stopping_trace.csv"), index=False)
+    pd.DataFrame(pair_trace, columns=["Round", "BotName", "OtherBotName", "Games", "WinP", "HealthP", "Decided"]).to_csv(os.path.join(path, "stopping_trace_pairs.csv"), index=False)
+    return [row for bot_results in results for row in bot_results]
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('test_count', type=int)
@@ -111,6 +263,17 @@ def main():
     parser.add_argument('--log', action=argparse.BooleanOptionalAction)
     parser.add_argument('--anonymize', action=argparse.BooleanOptionalAction)
     parser.add_argument('--time', action=argparse.BooleanOptionalAction)
+    parser.add_argument('--trace', action=argparse.BooleanOptionalAction)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--adaptive', action=argparse.BooleanOptionalAction)
+    parser.add_argument('--round_size', type=int, default=None)
+    parser.add_argument('--min_count', type=int, default=10)
+    parser.add_argument('--win_width', type=float, default=0.2)
+    parser.add_argument('--health_width', type=float, default=10)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--prompt_cache', type=str, default=None)
+    parser.add_argument('--replay', action=argparse.BooleanOptionalAction)
+    parser.add_argument('--api_base', type=str, default=None)
     args = parser.parse_args()
 
     test_count = args.test_count
@@ -125,7 +288,15 @@ def main():
     custom_name = args.name
     custom_dir = args.dir
     verbose = Verbose.LOG if args.log else Verbose.NO_LOG
-    bots: list[GGPA] = [name_to_bot(name, 1/thread_count) for name in args.bots]  
+    trace = bool(args.trace)
+    seed = args.seed
+    if args.api_base is not None:
+        # e.g. the local mock_openai_server
+        openai.api_base = args.api_base
+    # the gpt bots of all threads share one token bucket per model, each can use the whole limit
+    assert args.prompt_cache is not None or not args.replay, "The replay option needs a prompt cache"
+    prompt_cache = PromptCache(args.prompt_cache, PROMPT_CACHE_MAX_BYTES, bool(args.replay)) if args.prompt_cache is not None else None
+    bots: list[GGPA] = [name_to_bot(name, 1, prompt_cache) for name in args.bots]
     bot_names = '_'.join([bot.name for bot in bots])
     dir_name = f'{int(time.time())}_{custom_name}_{scenario_name}_enemies_{enemies}_{test_count}_boteval'
     if custom_dir != "":
@@ -134,14 +305,20 @@ def main():
     os.makedirs(path)
     print(f'simulating {test_count} times, for {bot_names} - {thread_count} threads')
     print(f'results can be found at {path}')
-    if not time_execution:
-        results_dataset = Parallel(n_jobs=thread_count)(delayed(simulate_one)(i, bots[i//test_count], scenario()[1], enemies, path, verbose) for i in tqdm(range(test_count * len(bots))))
+    if args.adaptive:
+        assert not time_execution, "The time option is not supported in the adaptive mode"
+        round_size = args.round_size if args.round_size is not None else thread_count
+        results_dataset = simulate_adaptive(bots, test_count, thread_count, scenario, enemies, path, verbose, trace, seed,
+                                            round_size, args.min_count, args.win_width, args.health_width, args.alpha)
+    elif not time_execution:
+        results_dataset = simulate_games([(i, bots[i//test_count], get_game_seed(seed, i % test_count)) for i in range(test_count * len(bots))],
+                                         thread_count, scenario, enemies, path, verbose, trace)
     else:
         results_dataset = []
         execution_times = {}
         for bot_id in range(len(bots)):
             start_time = time.time()
-            results_dataset += Parallel(n_jobs=thread_count)(delayed(simulate_one)(i, bots[bot_id], scenario()[1], enemies, path, verbose) for i in tqdm(range(test_count * bot_id, test_count * (bot_id + 1))))
+            results_dataset += get_parallel(thread_count, bots[bot_id])(delayed(simulate_one)(i, bots[bot_id], scenario()[1], enemies, path, verbose, get_game_seed(seed, i % test_count), trace) for i in tqdm(range(test_count * bot_id, test_count * (bot_id + 1))))
             execution_times[bots[bot_id].name] = {'avg_execution': (time.time() - start_time)/test_count}
             import json
             with open(os.path.join(path, "execution_times_partial.json"), "a") as fp:
@@ -12,7 +12,7 @@ from game import GameState
 from battle import BattleState
 from config import Character, Verbose, CardType, Rarity
 from agent import AcidSlimeSmall, SpikeSlimeSmall, JawWorm
-from card import CardGen, Card
+from card import CardGen, Card, CardDefinition
 from ggpa.backtrack import BacktrackBot
 from value import ConstValue, UpgradableOnce
 from action.agent_targeted_action import DealAttackDamage
@@ -28,11 +28,11 @@ def main():
     card_lists: list[tuple[str, list[Card]]] = [
         ("Starter", []),
         ("Cleave", [CardGen.Cleave()]),
-        ("BidDamage", [Card("BigDamage", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(100, 110)).To(ChooseAgentTarget(AgentSet.ENEMY)))]),
-        ("WinCard", [Card("Win", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(100, 110)).To(AllAgentsTarget(AgentSet.ENEMY)))]),
-        ("WinCard_10", [Card("Win", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(100, 110)).To(AllAgentsTarget(AgentSet.ENEMY)))] * 10),
-        ("NothingCard", [Card("DoesNothing", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(0, 0)).To(AllAgentsTarget(AgentSet.ENEMY)))]),
-        ("NothingCard_10", [Card("DoesNothing", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(0, 0)).To(AllAgentsTarget(AgentSet.ENEMY)))] * 10),
+        ("BidDamage", [CardDefinition("BigDamage", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(100, 110)).To(ChooseAgentTarget(AgentSet.ENEMY))).create()]),
+        ("WinCard", [CardDefinition("Win", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(100, 110)).To(AllAgentsTarget(AgentSet.ENEMY))).create()]),
+        ("WinCard_10", [CardDefinition("Win", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(100, 110)).To(AllAgentsTarget(AgentSet.ENEMY))).create()] * 10),
+        ("NothingCard", [CardDefinition("DoesNothing", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(0, 0)).To(AllAgentsTarget(AgentSet.ENEMY))).create()]),
+        ("NothingCard_10", [CardDefinition("DoesNothing", CardType.ATTACK, ConstValue(1), Character.IRON_CLAD, Rarity.STARTER, DealAttackDamage(UpgradableOnce(0, 0)).To(AllAgentsTarget(AgentSet.ENEMY))).create()] * 10),
     ]
     for name, card_list in card_lists:
         for _ in tqdm(range(test_count)):
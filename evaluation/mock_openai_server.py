@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from typing import Any, Callable
+from aiohttp import web
+
+# a local stand-in for the part of the openai api that ChatGPTBot uses, for load tests without quota
+# run it, then point evaluate_bot at it with --api_base http://localhost:<port>/v1
+
+# an answer policy picks the index of an option, given the number of options in the prompt
+ANSWER_POLICIES: dict[str, Callable[[int, random.Random], int]] = {
+    'random': lambda option_count, rng: rng.randrange(option_count),
+    'first': lambda option_count, rng: 0,
+    'last': lambda option_count, rng: option_count - 1,
+}
+
+MALFORMED_ANSWERS: list[Callable[[int], str]] = [
+    lambda option_count: '',
+    lambda option_count: 'I would play the card that deals the most damage.',
+    lambda option_count: str(option_count + 3),
+]
+
+def get_option_count(prompt: str) -> int:
+    # the action prompts give the range of the answer, the target prompts list their options last
+    range_match = list(re.finditer(r'in range 0-(\d+)', prompt))
+    target_index = prompt.rfind('The valid options are')
+    if len(range_match) > 0 and range_match[-1].start() > target_index:
+        return int(range_match[-1].group(1)) + 1
+    if target_index >= 0:
+        return max(1, len(re.findall(r'^\d+: ', prompt[target_index:], re.MULTILINE)))
+    return 1
+
+def format_answer(prompt: str, answer: str) -> str:
+    # where strip_response looks for the answer depends on the prompt option
+    if 'In the first line, write only the index' in prompt:
+        return f'{answer}\nThis option looks the best right now.'
+    if 'In the first paragraph' in prompt:
+        return f'This option looks the best right now.\n\n{answer}'
+    return answer
+
+class MockServer:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.policy = ANSWER_POLICIES[args.policy]
+        self.rng = random.Random(args.seed)
+        # tokens used in the last minute, to answer like the real api when a client goes over the limit
+        self.usage: list[tuple[float, int]] = []
+        self.stats: dict[str, Any] = {
+            'requests': 0,
+            'responses': 0,
+            'rate_limited': 0,
+            'injected_rate_limited': 0,
+            'malformed': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'in_flight': 0,
+            'max_in_flight': 0,
+        }
+        self.start = time.time()
+
+    def get_latency(self) -> float:
+        mean = self.args.latency
+        if self.args.latency_distribution == 'constant':
+            return mean
+        elif self.args.latency_distribution == 'exponential':
+            return self.rng.expovariate(1/mean) if mean > 0 else 0
+        elif self.args.latency_distribution == 'lognormal':
+            sigma = self.args.latency_sigma
+            return self.rng.lognormvariate(0, sigma) * mean / math.exp(sigma**2/2) if mean > 0 else 0
+        else:
+            raise Exception(f"Unrecognized latency distribution: {self.args.latency_distribution}")
+
+    def is_over_limit(self, tokens: int) -> bool:
+        if self.args.tokens_per_minute <= 0:
+            return False
+        now = time.time()
+        self.usage = [(timestamp, count) for timestamp, count in self.usage if timestamp > now - 60]
+        if sum([count for _, count in self.usage]) + tokens > self.args.tokens_per_minute:
+            return True
+        self.usage.append((now, tokens))
+        return False
+
+    def rate_limit_response(self, message: str) -> web.Response:
+        self.stats['rate_limited'] += 1
+        return web.json_response({'error': {'message': message, 'type': 'requests', 'param': None, 'code': 'rate_limit_exceeded'}}, status=429)
+
+    async def handle(self, request: web.Request, is_chat: bool) -> web.Response:
+        body = await request.json()
+        self.stats['requests'] += 1
+        if is_chat:
+            prompt = body['messages'][-1]['content']
+            prompt_tokens = sum([len(message['content']) for message in body['messages']])//4
+        else:
+            prompt = body['prompt']
+            prompt_tokens = len(prompt)//4
+        if self.rng.random() < self.args.rate_limit_rate:
+            self.stats['injected_rate_limited'] += 1
+            return self.rate_limit_response('Rate limit reached (injected by the mock server).')
+        option_count = get_option_count(prompt)
+        if self.rng.random() < self.args.malformed_rate:
+            self.stats['malformed'] += 1
+            content = self.rng.choice(MALFORMED_ANSWERS)(option_count)
+        else:
+            content = format_answer(prompt, str(self.policy(option_count, self.rng)))
+        completion_tokens = max(1, len(content)//4)
+        if self.is_over_limit(prompt_tokens + completion_tokens):
+            return self.rate_limit_response(f'Rate limit reached for {body["model"]} on tokens per min. Limit: {self.args.tokens_per_minute}.')
+        self.stats['in_flight'] += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+        try:
+            await asyncio.sleep(self.get_latency())
+        finally:
+            self.stats['in_flight'] -= 1
+        self.stats['responses'] += 1
+        self.stats['prompt_tokens'] += prompt_tokens
+        self.stats['completion_tokens'] += completion_tokens
+        if is_chat:
+            choice = {'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}
+        else:
+            choice = {'index': 0, 'text': content, 'logprobs': None, 'finish_reason': 'stop'}
+        return web.json_response({
+            'id': f'mock-{self.stats["requests"]}',
+            'object': 'chat.completion' if is_chat else 'text_completion',
+            'created': int(time.time()),
+            'model': body['model'],
+            'choices': [choice],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens},
+        })
+
+    async def handle_chat(self, request: web.Request) -> web.Response:
+        return await self.handle(request, True)
+
+    async def handle_completion(self, request: web.Request) -> web.Response:
+        return await self.handle(request, False)
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.get_stats())
+
+    def get_stats(self) -> dict[str, Any]:
+        elapsed = time.time() - self.start
+        return self.stats | {
+            'elapsed': elapsed,
+            'tokens_per_minute': 60 * (self.stats['prompt_tokens'] + self.stats['completion_tokens']) / elapsed,
+        }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--policy', type=str, default='random', choices=list(ANSWER_POLICIES.keys()))
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--latency_distribution', type=str, default='lognormal', choices=['constant', 'exponential', 'lognormal'])
+    parser.add_argument('--latency_sigma', type=float, default=0.5)
+    parser.add_argument('--tokens_per_minute', type=int, default=0)
+    parser.add_argument('--rate_limit_rate', type=float, default=0)
+    parser.add_argument('--malformed_rate', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = MockServer(args)
+    app = web.Application()
+    app.add_routes([
+        web.post('/v1/chat/completions', server.handle_chat),
+        web.post('/v1/completions', server.handle_completion),
+        web.get('/stats', server.handle_stats),
+    ])
+    try:
+        web.run_app(app, port=args.port)
+    finally:
+        print(json.dumps(server.get_stats(), indent=4))
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+from __future__ import annotations
 import pandas as pd
 import seaborn as sns
 import argparse
@@ -6,6 +7,7 @@ from matplotlib import pyplot as plt
 from enum import StrEnum
 import numpy as np
 from typing import Callable
+from joblib import delayed, Parallel
 import sys
 import os.path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -245,6 +247,85 @@ class LogData:
                 f"Turns:\n{nl.join([f'{turn}' for turn in self.turns])}" +\
                 f"Outcome: {self.outcome}"
 
+class LogTable:
+    # the logs of a results directory as two tables, one row per turn data and one row per action
+    TURN_COLUMNS = ["Id", "CaseName", "TurnIndex", "Turn", "Agent", "PlayerHealth", "PlayerStatus", "Hand"]
+    ACTION_COLUMNS = ["Id", "CaseName", "TurnIndex", "Turn", "Action", "Card", "EndTurnCount", "Vigor"]
+    CACHE_FILENAME = 'property_cache.pkl'
+
+    def __init__(self, turns: pd.DataFrame, actions: pd.DataFrame):
+        self.turns = turns
+        self.actions = actions
+
+    @staticmethod
+    def get_rows(id: int, case_name: str, data: LogData) -> tuple[list[list], list[list]]:
+        turn_rows: list[list] = []
+        action_rows: list[list] = []
+        end_turn_count = 0
+        for turn_index, turn in enumerate(data.turns):
+            # the last turn data of a battle without enemies parses one pile short
+            hands = [pile.card_names for pile in turn.piles if pile.name == 'hand']
+            hand = hands[0] if len(hands) > 0 else []
+            turn_rows.append([id, case_name, turn_index, turn.turn, turn.agent, turn.player.agent_data.hp, turn.player.agent_data.status, hand])
+            vigor = 'Vigor' in turn.player.agent_data.status
+            for action in turn.actions:
+                card_name = None
+                if isinstance(action, PlayCardAction):
+                    assert action.pile_name == 'hand', "Card play from outside hand!"
+                    card_name = hand[action.ind]
+                    kind = 'play'
+                elif isinstance(action, EndTurnAction):
+                    kind = 'end'
+                elif isinstance(action, AgentChoiceAction):
+                    kind = 'agent'
+                else:
+                    kind = 'enemy'
+                action_rows.append([id, case_name, turn_index, turn.turn, kind, card_name, end_turn_count, vigor])
+                if kind == 'end':
+                    end_turn_count += 1
+        return turn_rows, action_rows
+
+    @staticmethod
+    def read_log(dirname: str, log_filename: str) -> tuple[list[list], list[list]]:
+        id, case_name = log_filename[:-4].split('_')
+        return LogTable.get_rows(int(id), case_name, LogData.from_file(os.path.join(dirname, log_filename)))
+
+    @staticmethod
+    def from_dir(dirname: str, thread_count: int) -> LogTable:
+        # parses every log once, the tables are cached next to the logs until a log is added, removed or changed
+        log_filenames = sorted([filename for filename in os.listdir(dirname) if filename[-4:] == '.log'])
+        log_times = [(filename, os.path.getmtime(os.path.join(dirname, filename))) for filename in log_filenames]
+        cache_filename = os.path.join(dirname, LogTable.CACHE_FILENAME)
+        if os.path.isfile(cache_filename):
+            cached = pd.read_pickle(cache_filename)
+            # caches without the list of logs are rebuilt
+            if len(cached) == 3 and cached[0] == log_times:
+                _, turns, actions = cached
+                return LogTable(turns, actions)
+        rows = Parallel(n_jobs=thread_count, batch_size=64)(delayed(LogTable.read_log)(dirname, filename) for filename in log_filenames)
+        assert isinstance(rows, list), "Parallel jobs have not resulted in an output of type list"
+        turns = pd.DataFrame([row for turn_rows, _ in rows for row in turn_rows], columns=LogTable.TURN_COLUMNS)
+        actions = pd.DataFrame([row for _, action_rows in rows for row in action_rows], columns=LogTable.ACTION_COLUMNS)
+        turns = turns.sort_values(["Id", "TurnIndex"], kind='stable', ignore_index=True)
+        actions = actions.sort_values(["Id", "TurnIndex"], kind='stable', ignore_index=True)
+        pd.to_pickle((log_times, turns, actions), cache_filename)
+        return LogTable(turns, actions)
+
+    def get_case_names(self) -> pd.Series:
+        return self.turns.groupby("Id")["CaseName"].first()
+
+    def get_played_cards(self) -> pd.DataFrame:
+        # card plays of the turns that were ended, EndTurnCount is the index of the turn
+        plays = self.actions[self.actions["Action"] == 'play']
+        end_turn_counts = self.actions[self.actions["Action"] == 'end'].groupby("Id").size()
+        return plays[plays["EndTurnCount"] < plays["Id"].map(end_turn_counts).fillna(0)]
+
+    def get_available_cards(self) -> pd.DataFrame:
+        # the hand at the first decision of each turn, TurnOrdinal is the index of the turn
+        first_turns = self.turns[~self.turns.duplicated(["Id", "Turn"])]
+        first_turns = first_turns.assign(TurnOrdinal=first_turns.groupby("Id").cumcount())
+        return first_turns.explode("Hand").rename(columns={"Hand": "Card"})
+
 class Property(StrEnum):
     FinalPlayerHealth = 'Player Health'
     DecisionCount = 'Number of Decisions'
@@ -257,102 +338,40 @@ class Property(StrEnum):
     BombTurn = 'First turn Bomb was used'
     TurnCount = 'Number of Turns'
 
-def get_played_cards(data: LogData):
-    cards_per_turn: list[list[str]] = [[]]
-    for turn in data.turns:
-        for action in turn.actions:
-            if isinstance(action, EndTurnAction):
-                cards_per_turn.append([])
-            if not isinstance(action, PlayCardAction):
-                continue
-            assert action.pile_name == 'hand', "Card play from outside hand!"
-            pile = [pile for pile in turn.piles if pile.name == action.pile_name][0]
-            card_name = pile.card_names[action.ind]
-            cards_per_turn[-1].append(card_name)
-    return cards_per_turn[:-1]
-
-def get_available_cards(data: LogData):
-    cards_per_turn: list[list[str]] = []
-    for turn in data.turns:
-        if turn.turn > len(cards_per_turn):
-            cards_per_turn.append([])
-            hand = [pile for pile in turn.piles if pile.name == 'hand'][0]
-            for card_name in hand.card_names:
-                cards_per_turn[-1].append(card_name)
-    return cards_per_turn
-
-def get_prop(prop: Property, data: LogData) -> int:
+def is_card(card_names: pd.Series, name: str) -> pd.Series:
+    return card_names.isin([name, RandomStr.get_hashed(name)])
+
+def get_prop(prop: Property, table: LogTable) -> pd.Series:
+    # one value per log, indexed by the log id
+    ids = table.get_case_names().index
+    per_log = lambda series, fill: series.reindex(ids, fill_value=fill).astype(int)
     if prop == Property.FinalPlayerHealth:
-        return data.turns[-1].player.agent_data.hp
+        return per_log(table.turns.groupby("Id")["PlayerHealth"].last(), 0)
     elif prop == Property.DecisionCount:
-        return len(data.turns)
+        return per_log(table.turns.groupby("Id").size(), 0)
     elif prop == Property.TurnCount:
-        return data.turns[-1].turn
+        return per_log(table.turns.groupby("Id")["Turn"].last(), 0)
     elif prop == Property.BatterStimulateCombo:
-        ret = 0
-        st_count = 0
-        for turn in data.turns:
-            for action in turn.actions:
-                if not isinstance(action, PlayCardAction):
-                    continue
-                assert action.pile_name == 'hand', "Card play from outside hand!"
-                pile = [pile for pile in turn.piles if pile.name == action.pile_name][0]
-                card_name = pile.card_names[action.ind]
-                if card_name == 'Stimulate' or card_name == RandomStr.get_hashed("Stimulate"):
-                    st_count += 1
-                if (card_name == 'Batter' or card_name == RandomStr.get_hashed("Batter")) and 'Vigor' in turn.player.agent_data.status:
-                    ret += st_count
-        return ret
-    elif prop == Property.ToleranceCombo:
-        cards_per_turn = get_played_cards(data)
-        for cards in cards_per_turn:
-            for card_name in cards:
-                if card_name == 'Tolerate' or card_name == RandomStr.get_hashed("Tolerate"):
-                    return 1
-        return 0
-    elif prop == Property.BombPlayed:
-        cards_per_turn = get_played_cards(data)
-        for cards in cards_per_turn:
-            for card_name in cards:
-                if card_name == "Bomb" or card_name == RandomStr.get_hashed("Bomb"):
-                    return 1
-        return 0
-    elif prop == Property.BombCount:
-        cards_per_turn = get_played_cards(data)
-        ret = 0
-        for cards in cards_per_turn:
-            for card_name in cards:
-                if card_name == "Bomb" or card_name == RandomStr.get_hashed("Bomb"):
-                    ret += 1
-        return ret
+        plays = table.actions[table.actions["Action"] == 'play']
+        stimulate_count = is_card(plays["Card"], "Stimulate").groupby(plays["Id"]).cumsum()
+        combo = stimulate_count.where(is_card(plays["Card"], "Batter") & plays["Vigor"], 0)
+        return per_log(combo.groupby(plays["Id"]).sum(), 0)
+    elif prop in [Property.ToleranceCombo, Property.BombPlayed, Property.BombCount]:
+        plays = table.get_played_cards()
+        played = is_card(plays["Card"], "Tolerate" if prop == Property.ToleranceCombo else "Bomb").groupby(plays["Id"]).sum()
+        return per_log(played if prop == Property.BombCount else played > 0, 0)
     elif prop == Property.SufferChooseChance:
-        cards_played_per_turn = get_played_cards(data)
-        cards_available_per_turn = get_available_cards(data)
-        played = 0
-        available = 0
-        for turn in range(len(cards_played_per_turn)):
-            for card_name in cards_played_per_turn[turn]:
-                assert card_name in cards_available_per_turn[turn]
-                if card_name == "Suffer" or card_name == RandomStr.get_hashed("Suffer"):
-                    played += 1
-            for card_name in cards_available_per_turn[turn]:
-                if card_name == "Suffer" or card_name == RandomStr.get_hashed("Suffer"):
-                    available += 1
-        return int(100*played/available) if available > 0 else 0
-    elif prop == Property.ToleranceTurn:
-        cards_per_turn = get_played_cards(data)
-        for i, cards in enumerate(cards_per_turn):
-            for card_name in cards:
-                if card_name == 'Tolerate' or card_name == RandomStr.get_hashed("Tolerate"):
-                    return i
-        return -1
-    elif prop == Property.BombTurn:
-        cards_per_turn = get_played_cards(data)
-        for i, cards in enumerate(cards_per_turn):
-            for card_name in cards:
-                if card_name == "Bomb" or card_name == RandomStr.get_hashed("Bomb"):
-                    return i
-        return -1
+        plays = table.get_played_cards()
+        played = is_card(plays["Card"], "Suffer").groupby(plays["Id"]).sum().reindex(ids, fill_value=0)
+        end_turn_counts = table.actions[table.actions["Action"] == 'end'].groupby("Id").size()
+        hands = table.get_available_cards()
+        hands = hands[hands["TurnOrdinal"] < hands["Id"].map(end_turn_counts).fillna(0)]
+        available = is_card(hands["Card"], "Suffer").groupby(hands["Id"]).sum().reindex(ids, fill_value=0)
+        return (100*played/available.where(available > 0)).fillna(0).astype(int)
+    elif prop in [Property.ToleranceTurn, Property.BombTurn]:
+        plays = table.get_played_cards()
+        plays = plays[is_card(plays["Card"], "Tolerate" if prop == Property.ToleranceTurn else "Bomb")]
+        return per_log(plays.groupby("Id")["EndTurnCount"].min(), -1)
     else:
         raise Exception("Property retrieval unrecognized")
     
@@ -445,22 +464,22 @@ def plot_density_2d(prop1: Property, prop2: Property, prop_dict1: dict[str, list
     plt.ylabel(str(prop2))
     plt.show()
 
-def get_prop_dict(prop: Property, dataset: list[tuple[int, str, LogData]]):
+def get_prop_dict(prop: Property, dataset: LogTable):
+    values = get_prop(prop, dataset)
+    case_names = dataset.get_case_names()
     prop_dict: dict[str, list[int]] = {}
-    for id, case_name, data in dataset:
-        if case_name not in prop_dict:
-            prop_dict[case_name] = []
-        prop_dict[case_name].append(get_prop(prop, data))
+    for case_name in case_names.unique():
+        prop_dict[case_name] = values[case_names == case_name].tolist()
     for key, val in prop_dict.items():
         print(f"{key} mean: {sum(val)/len(val)}")
     return prop_dict
 
-def plot_prop(prop: Property, dataset: list[tuple[int, str, LogData]], plot_func: Callable[[Property, dict[str, list[int]]], None]):
+def plot_prop(prop: Property, dataset: LogTable, plot_func: Callable[[Property, dict[str, list[int]]], None]):
     prop_dict: dict[str, list[int]] = get_prop_dict(prop, dataset)
     print(prop_dict)
     plot_func(prop, prop_dict)
 
-def plot_prop_2d(prop1: Property, prop2: Property, dataset: list[tuple[int, str, LogData]], plot_func: Callable[[Property, Property, dict[str, list[int]], dict[str, list[int]]], None]):
+def plot_prop_2d(prop1: Property, prop2: Property, dataset: LogTable, plot_func: Callable[[Property, Property, dict[str, list[int]], dict[str, list[int]]], None]):
     prop_dict1: dict[str, list[int]] = get_prop_dict(prop1, dataset)
     prop_dict2: dict[str, list[int]] = get_prop_dict(prop2, dataset)
     print(prop_dict1)
@@ -470,14 +489,10 @@ def plot_prop_2d(prop1: Property, prop2: Property, dataset: list[tuple[int, str,
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('dirname')
+    parser.add_argument('--thread_count', type=int, default=1)
     args = parser.parse_args()
     dirname = args.dirname
-    log_filename = [filename for filename in os.listdir(dirname) if filename[-4:] == '.log']
-    dataset: list[tuple[int, str, LogData]] = []
-    for log_filename in log_filename:
-        id, case_name = log_filename[:-4].split('_')
-        dataset.append((int(id), case_name, LogData.from_file(os.path.join(dirname, log_filename))))
-    # dataset.sort(key=lambda it: it[0])
+    dataset: LogTable = LogTable.from_dir(dirname, args.thread_count)
     # plot_prop(Property.FinalPlayerHealth, dataset, plot_histplot_gen('Card'))
     # plot_prop(Property.SufferChooseChance, dataset, plot_histplot_gen('Card'))
     # plot_prop(Property.BombCount, dataset, plot_histplot_gen('Card'))
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import copy
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from card import Card
@@ -6,11 +7,18 @@ if TYPE_CHECKING:
 from agent import Player
 from config import Character
 from card import CardRepo
+from utility import CountedRandom
 
 class GameState:
-    def __init__(self, character: Character, bot: GGPA, ascention: int):
+    def __init__(self, character: Character, bot: GGPA, ascention: int, seed: int|None = None):
         self.player = Player(character, bot)
         self.ascention = ascention
+        self.seed = seed
+        # the environment stream: used to build the enemies, and by default shared with the battle
+        self.rng = CountedRandom(seed)
+        # the policy stream: the choices of the bots and the seeds of the search copies. it is kept apart,
+        # so that bots that search differently still get the same draws and enemy moves for the same seed
+        self.policy_rng = CountedRandom(None if seed is None else f'policy-{seed}')
         self.deck: list[Card] = CardRepo.get_starter(character)
         self.draw_count = 5
         self.max_mana = 3
@@ -22,6 +30,12 @@ class GameState:
     def set_deck(self, *cards: Card):
         self.deck = [card for card in cards]
 
+    def clone(self) -> GameState:
+        # the deck is only read during a battle, so it is shared
+        ret = copy.copy(self)
+        ret.player = self.player.clone()
+        return ret
+
     def get_end_results(self):
         if self.player.is_dead():
             return -1
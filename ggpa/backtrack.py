@@ -1,9 +1,12 @@
 from __future__ import annotations
+import random
+import time
 from ggpa.ggpa import GGPA
+from ggpa.transposition_table import TranspositionTable, LRUTranspositionTable
 from action.action import EndAgentTurn, PlayCard
 from typing import TYPE_CHECKING
-import random
 from config import Verbose
+from utility import UndoLog
 if TYPE_CHECKING:
     from game import GameState
     from battle import BattleState
@@ -13,12 +16,23 @@ if TYPE_CHECKING:
     from card import Card
 
 class BacktrackBot(GGPA):
-    def __init__(self, depth: int, should_save_states: bool):
-        super().__init__(f"Backtrack-Depth{depth}{'-save' if should_save_states else ''}")
+    class TimeUp(Exception):
+        pass
+
+    def __init__(self, depth: int, should_save_states: bool, table: TranspositionTable|None = None, make_unmake: bool = False, expectimax: bool = False,
+                 time_budget: float|None = None):
+        super().__init__(f"Backtrack-Depth{depth}{'-save' if should_save_states else ''}{'-undo' if make_unmake else ''}{'-expectimax' if expectimax else ''}" +
+                         (f"-{int(time_budget*1000)}ms" if time_budget is not None else ''))
         self.depth = depth
         self.should_save_states = should_save_states
-        self.memory: dict[str, float|None] = {}
-        self.memory_hit = 0
+        # search by changing the battle state in place and undoing the changes, instead of copying it for every option
+        self.make_unmake = make_unmake
+        # ending the turn is averaged over every hand that can be drawn, instead of over one random draw order
+        self.expectimax = expectimax
+        # with a time budget, each decision searches depth 1, 2, ... up to depth until the budget runs out
+        self.time_budget = time_budget
+        self.deadline: float|None = None
+        self.table = table if table is not None else LRUTranspositionTable()
 
     def _rollout_state(self, game_state: GameState, battle_state: BattleState, count: int) -> list[BattleState]:
         def stop(battle_state: BattleState):
@@ -30,7 +44,7 @@ class BacktrackBot(GGPA):
             ret[i].verbose = Verbose.NO_LOG
             while not stop(ret[i]):
                 options = self.get_choose_card_options(ret[i].game_state, ret[i])
-                option = random.choice(options)
+                option = ret[i].policy_rng.choice(options)
                 ret[i].tick_player(option)
         return ret
 
@@ -46,35 +60,66 @@ class BacktrackBot(GGPA):
         values = [_get_value(rolledout_battle_state) for rolledout_battle_state in rollout]
         return sum(values)/len(values)
     
+    def _evaluate_option(self, game_state: GameState, battle_state: BattleState, option: PlayCard|EndAgentTurn, depth_remaining: int) -> float|None:
+        if self.expectimax and isinstance(option, EndAgentTurn):
+            return self._evaluate_end_turn(battle_state, option, depth_remaining)
+        if self.make_unmake:
+            estimate = self._evaluate_ticked(battle_state, battle_state.make(option), depth_remaining)
+            battle_state.unmake()
+            return estimate
+        battle_state_copy: BattleState = battle_state.copy_undeterministic()
+        battle_state_copy.verbose = Verbose.NO_LOG
+        #print(f"{depth_remaining}: Tick battle {option}")
+        return self._evaluate_ticked(battle_state_copy, battle_state_copy.tick_player(option), depth_remaining)
+
+    def _evaluate_end_turn(self, battle_state: BattleState, option: EndAgentTurn, depth_remaining: int) -> float|None:
+        battle_state_copy: BattleState = battle_state.copy_undeterministic()
+        battle_state_copy.verbose = Verbose.NO_LOG
+        if not battle_state_copy.tick_player(option, draw=False) or battle_state_copy.ended() or depth_remaining == 1:
+            # the hand doesn't matter anymore, or the state is evaluated before the hand is looked at
+            return self._evaluate_ticked(battle_state_copy, False, depth_remaining)
+        total, weight = 0.0, 0.0
+        for probability, outcome in battle_state_copy.get_draw_outcomes():
+            estimate = self._evaluate_ticked(outcome, True, depth_remaining)
+            if estimate is not None:
+                total += probability * estimate
+                weight += probability
+        return total / weight if weight > 0 else None
+
+    def _evaluate_ticked(self, battle_state_copy: BattleState, ticked: bool, depth_remaining: int) -> float|None:
+        if not ticked:
+            estimate = self._evaluate_state(battle_state_copy.game_state, battle_state_copy)
+            #print(f"{depth_remaining-1}: Ended {estimate}")
+        else:
+            if self.should_save_states:
+                state_hash = battle_state_copy.get_zobrist_hash()
+                estimate = self.table.get(state_hash, depth_remaining-1)
+                if estimate is None:
+                    estimate, _ = self._get_best_choose_card(battle_state_copy.game_state, battle_state_copy, depth_remaining-1)
+                    if estimate is not None:
+                        self.table.put(state_hash, depth_remaining-1, estimate)
+            else:
+                #print(f"{depth_remaining}: Recursive")
+                estimate, _ = self._get_best_choose_card(battle_state_copy.game_state, battle_state_copy, depth_remaining-1)
+                #print(f"{depth_remaining}: Back")
+        return estimate
+
     def _get_best_choose_card(self, game_state: GameState, battle_state: BattleState, depth_remaining: int) -> tuple[float|None, PlayCard|EndAgentTurn|None]:
         #print(f"Depth remaining: {depth_remaining}")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BacktrackBot.TimeUp()
         if depth_remaining == 0:
             value = self._evaluate_state(game_state, battle_state), None
             #print(f"{depth_remaining}: Returning: {value}")
             return value
         options = self.get_choose_card_options(game_state, battle_state)
+        estimates = [self._evaluate_option(game_state, battle_state, option, depth_remaining) for option in options]
+        return self._get_best_estimate(options, estimates)
+
+    @staticmethod
+    def _get_best_estimate(options: list[PlayCard|EndAgentTurn], estimates: list[float|None]) -> tuple[float|None, PlayCard|EndAgentTurn|None]:
         best_value, best_action = None, None
-        for option in options:
-            battle_state_copy: BattleState = battle_state.copy_undeterministic()
-            battle_state_copy.verbose = Verbose.NO_LOG
-            #print(f"{depth_remaining}: Tick battle {option}")
-            if not battle_state_copy.tick_player(option):
-                estimate = self._evaluate_state(battle_state_copy.game_state, battle_state_copy)
-                #print(f"{depth_remaining-1}: Ended {estimate}")
-            else:
-                state_hash = ''
-                if self.should_save_states:
-                    state_hash = battle_state_copy.get_undeterministic_repr_hash()
-                    if state_hash in self.memory:
-                        estimate = self.memory[state_hash]
-                        self.memory_hit += 1
-                    else:
-                        estimate, _ = self._get_best_choose_card(battle_state_copy.game_state, battle_state_copy, depth_remaining-1)
-                        self.memory[state_hash] = estimate
-                else:
-                    #print(f"{depth_remaining}: Recursive")
-                    estimate, _ = self._get_best_choose_card(battle_state_copy.game_state, battle_state_copy, depth_remaining-1)
-                    #print(f"{depth_remaining}: Back")
+        for option, estimate in zip(options, estimates):
             #print(f"{depth_remaining}: Estimate: {estimate}")
             if best_value is None or (estimate is not None and best_value < estimate):
                 best_value = estimate
@@ -84,8 +129,61 @@ class BacktrackBot(GGPA):
         #print(f"{depth_remaining}: Returning: {best_value}, {best_action}")
         return best_value, best_action
 
+    def _evaluate_root_option(self, game_state: GameState, battle_state: BattleState, option: PlayCard|EndAgentTurn, depth: int, seed: int) -> float|None:
+        # each option of a decision is searched with its own stream, so its estimate doesn't depend on the options searched
+        # before it. BacktrackParallelBot gets the same estimates, and a decision takes one draw from the policy stream
+        policy_rng = battle_state.policy_rng
+        battle_state.policy_rng = random.Random(seed)
+        try:
+            return self._evaluate_option(game_state, battle_state, option, depth)
+        finally:
+            battle_state.policy_rng = policy_rng
+
+    def _get_best_iterative(self, game_state: GameState, battle_state: BattleState, options: list[PlayCard|EndAgentTurn], seed: int) -> PlayCard|EndAgentTurn|None:
+        # each depth searches the options in the order of the previous depth's estimates, so a depth that runs
+        # out of time still has a result if the previous best option was searched. the first depth always completes.
+        assert self.time_budget is not None
+        deadline = time.monotonic() + self.time_budget
+        order = list(range(len(options)))
+        action = None
+        completed_depth = 0
+        for depth in range(1, self.depth + 1):
+            self.deadline = deadline if depth > 1 else None
+            estimates: list[float|None] = []
+            try:
+                for i in order:
+                    estimates.append(self._evaluate_root_option(game_state, battle_state, options[i], depth, seed + i))
+            except BacktrackBot.TimeUp:
+                # the changes of the interrupted make calls are taken back
+                while UndoLog.active is not None:
+                    battle_state.unmake()
+            if len(estimates) > 0:
+                _, action = self._get_best_estimate([options[i] for i in order[:len(estimates)]], estimates)
+            if len(estimates) < len(options):
+                break
+            completed_depth = depth
+            ranked = sorted(zip(estimates, order), key=lambda pair: (pair[0] is None, -(pair[0] or 0), pair[1]))
+            order = [i for _, i in ranked]
+            if time.monotonic() > deadline:
+                break
+        self.deadline = None
+        self.metadata.setdefault("completed_depth", []).append(completed_depth)
+        return action
+
     def choose_card(self, game_state: GameState, battle_state: BattleState) -> EndAgentTurn|PlayCard:
-        _, action = self._get_best_choose_card(game_state, battle_state, self.depth)
+        options = self.get_choose_card_options(game_state, battle_state)
+        if self.depth == 0:
+            raise Exception("Depth is 0 or no action is available")
+        if len(options) == 1:
+            return options[0]
+        seed = battle_state.policy_rng.getrandbits(64)
+        if self.time_budget is not None:
+            action = self._get_best_iterative(game_state, battle_state, options, seed)
+        else:
+            estimates = [self._evaluate_root_option(game_state, battle_state, option, self.depth, seed + i) for i, option in enumerate(options)]
+            _, action = self._get_best_estimate(options, estimates)
+        if self.should_save_states:
+            self.metadata.update(self.table.get_stats())
         if action is None:
             raise Exception("Depth is 0 or no action is available")
         return action
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from ggpa.backtrack import BacktrackBot
+from action.action import EndAgentTurn, PlayCard
+from battle_trace import _get_fields, _set_fields
+from card import Card
+from config import Verbose
+from target.card_target import CardPile
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from game import GameState
+    from battle import BattleState
+    from agent import Agent
+    from card import CardDefinition
+
+# each worker process keeps its own bot, and with it its own transposition table, between decisions.
+# it also keeps the battle it was started for, the decisions only send the fields of the state (see _get_fields)
+_worker_bot: BacktrackBot|None = None
+_worker_battle: BattleState|None = None
+_worker_definitions: list[CardDefinition] = []
+
+def _get_definitions(battle_state: BattleState) -> list[CardDefinition]:
+    # the definitions of the cards of a battle in pile order, a card is sent as its definition's index and its upgrade count
+    definitions: list[CardDefinition] = []
+    for card_pile in CardPile:
+        for card in battle_state.get_pile(card_pile):
+            if all(definition is not card.definition for definition in definitions):
+                definitions.append(card.definition)
+    return definitions
+
+def _get_battle_state(battle: BattleState, definitions: list[CardDefinition], fields: list[list[int]]) -> BattleState:
+    battle_state = battle.clone()
+    _set_fields(battle_state, [battle_state.player] + battle_state.enemies, fields,
+                lambda card_id: Card(definitions[card_id % len(definitions)], card_id // len(definitions)))
+    return battle_state
+
+def _init_worker(depth: int, should_save_states: bool, battle: bytes):
+    global _worker_bot, _worker_battle, _worker_definitions
+    _worker_bot = BacktrackBot(depth, should_save_states)
+    _worker_battle = pickle.loads(battle)
+    _worker_definitions = _get_definitions(_worker_battle)
+
+def _evaluate_root_option(fields: list[list[int]], option_index: int, depth: int, seed: int) -> float|None:
+    assert _worker_bot is not None and _worker_battle is not None, "Worker process is not initialized"
+    battle_state = _get_battle_state(_worker_battle, _worker_definitions, fields)
+    battle_state.player.bot = _worker_bot
+    options = _worker_bot.get_choose_card_options(battle_state.game_state, battle_state)
+    return _worker_bot._evaluate_root_option(battle_state.game_state, battle_state, options[option_index], depth, seed)
+
+class BacktrackParallelBot(BacktrackBot):
+    def __init__(self, depth: int, worker_count: int, should_save_states: bool = False):
+        super().__init__(depth, should_save_states)
+        self.name = f"BacktrackParallel-Depth{depth}-Workers{worker_count}{'-save' if should_save_states else ''}"
+        self.worker_count = worker_count
+        self.executor: ProcessPoolExecutor|None = None
+        # the battle the workers were started for, the copy of it they got, its agents (dead enemies included) and card definitions
+        self.battle_state: BattleState|None = None
+        self.battle: BattleState|None = None
+        self.agents: list[Agent] = []
+        self.definitions: list[CardDefinition] = []
+
+    def __getstate__(self):
+        # the process pool cannot be pickled, a copy of the bot starts its own
+        state = self.__dict__.copy()
+        state['executor'] = None
+        state['battle_state'] = None
+        state['battle'] = None
+        state['agents'] = []
+        state['definitions'] = []
+        return state
+
+    def _is_started_for(self, battle_state: BattleState) -> bool:
+        return self.executor is not None and self.battle_state is battle_state and \
+            all(any(definition is card.definition for definition in self.definitions) for card_pile in CardPile for card in battle_state.get_pile(card_pile))
+
+    def _get_executor(self, battle_state: BattleState) -> ProcessPoolExecutor:
+        # the workers get the battle once, and are started again for another battle or a card they don't know
+        if not self._is_started_for(battle_state):
+            self.shutdown()
+            battle = battle_state.clone()
+            battle.verbose = Verbose.NO_LOG
+            battle.log_writer = None
+            battle.player.bot = None
+            self.battle_state = battle_state
+            self.battle = battle
+            self.agents = [battle_state.player] + battle_state.enemies
+            self.definitions = _get_definitions(battle)
+            self.executor = ProcessPoolExecutor(max_workers=self.worker_count, initializer=_init_worker,
+                                                initargs=(self.depth, self.should_save_states, pickle.dumps(battle, protocol=pickle.HIGHEST_PROTOCOL)))
+        assert self.executor is not None
+        return self.executor
+
+    def _get_fields(self, battle_state: BattleState) -> list[list[int]]:
+        definition_count = len(self.definitions)
+        def get_card_id(card: Card) -> int:
+            index = next(i for i, definition in enumerate(self.definitions) if definition is card.definition)
+            return index + definition_count * card.upgrade_count
+        return _get_fields(battle_state, self.agents, get_card_id)
+
+    def choose_card(self, game_state: GameState, battle_state: BattleState) -> EndAgentTurn|PlayCard:
+        options = self.get_choose_card_options(game_state, battle_state)
+        if self.depth == 0:
+            raise Exception("Depth is 0 or no action is available")
+        if len(options) == 1:
+            return options[0]
+        seed = battle_state.policy_rng.getrandbits(64)
+        executor = self._get_executor(battle_state)
+        fields = self._get_fields(battle_state)
+        futures = [executor.submit(_evaluate_root_option, fields, i, self.depth, seed + i) for i in range(len(options))]
+        _, action = self._get_best_estimate(options, [future.result() for future in futures])
+        if action is None:
+            raise Exception("Depth is 0 or no action is available")
+        return action
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -1,9 +1,12 @@
 from __future__ import annotations
 import openai
 import time
+import math
 import json
 from enum import StrEnum
 from ggpa.ggpa import GGPA
+from ggpa.chatgpt_client import ChatGPTClient
+from ggpa.prompt_cache import PromptCache
 from action.action import EndAgentTurn, PlayCard
 from auth import GPT_AUTH
 from utility import get_unique_filename
@@ -26,8 +29,6 @@ class ChatGPTBot(GGPA):
         Instruct_Davinci = "text-davinci-003"
         Instruct_GPT_Turbo_35 = "gpt-3.5-turbo-instruct"
     
-    call_timestamp: dict[ModelName, float] = {}
-    token_count: dict[ModelName, int] = {}
     token_limit_per_minute = { #https://platform.openai.com/account/limits
         ModelName.GPT_4: 80000, #10000,
         ModelName.GPT_Turbo_4: 600000, #150000,
@@ -39,13 +40,21 @@ class ChatGPTBot(GGPA):
     CHAT_MODELS = [ModelName.GPT_4, ModelName.GPT_Turbo_4, ModelName.GPT_Turbo_35]
     COMPLETION_MODELS = [ModelName.Instruct_GPT_Turbo_35, ModelName.Instruct_Davinci]
 
+    # token estimate of a request, used to take from the token bucket before the usage is known
+    # https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
+    TOKENS_PER_MESSAGE = 3
+    TOKENS_PER_REPLY = 3
+    DEFAULT_CHARS_PER_TOKEN = 4.0
+    chars_per_token: dict[str, float] = {}
+
     # argmax
     # temp=0
     def get_request(self) -> dict[str, Any]:
         if self.model_name in ChatGPTBot.CHAT_MODELS:
             return {
                 'model': self.model_name,
-                'messages': self.messages,
+                # a snapshot, self.messages is trimmed in place
+                'messages': list(self.messages),
                 'request_timeout': 30,
             }
         elif self.model_name in ChatGPTBot.COMPLETION_MODELS:
@@ -59,46 +68,32 @@ class ChatGPTBot(GGPA):
     
     def ask_gpt(self) -> str:
         request = self.get_request()
-        current = time.time()
-        prev = ChatGPTBot.call_timestamp.get(self.model_name, current - 1000) # default: long time ago
         if self.model_name in ChatGPTBot.CHAT_MODELS:
-            est_tokens: int = sum([len(key) + len(val) for d in request['messages'] for key, val in d.items()])//4
+            prompt_chars = sum([len(message['content']) for message in request['messages']])
+            overhead_tokens = ChatGPTBot.TOKENS_PER_MESSAGE * len(request['messages']) + ChatGPTBot.TOKENS_PER_REPLY
         elif self.model_name in ChatGPTBot.COMPLETION_MODELS:
-            est_tokens: int = len(request['prompt'])//4
+            prompt_chars = len(request['prompt'])
+            overhead_tokens = 0
         else:
             raise Exception(f"Model type not recognized for {self.model_name}")
-        if self.model_name not in ChatGPTBot.call_timestamp or\
-            ChatGPTBot.token_count[self.model_name] + est_tokens > (ChatGPTBot.token_limit_per_minute[self.model_name] * self.share_of_limit):
-            sleep_time = 60 - min(current - prev, 60)
-            sleep_time += 3 # eps
-            print(f'{self.name} sleeping for {sleep_time}')
-            time.sleep(sleep_time)
-            ChatGPTBot.call_timestamp[self.model_name] = current
-            ChatGPTBot.token_count[self.model_name] = 0
-        print(f'name: {self.name}, tokens: {ChatGPTBot.token_count[self.model_name]}, est: {est_tokens}')
-        try:
-            if self.model_name in ChatGPTBot.CHAT_MODELS:
-                before_request = time.time()
-                response = openai.ChatCompletion.create(**request)
-                self.metadata["response_time"].append(time.time() - before_request)
-                print(f"Added to metadata: {self.metadata['response_time'][-1]}")
-                self.history.append({'request': request, 'response': response})
-                ChatGPTBot.token_count[self.model_name] += int(response['usage']['total_tokens'])
-                return response['choices'][0]['message']['content']
-            elif self.model_name in ChatGPTBot.COMPLETION_MODELS:
-                before_request = time.time()
-                response = openai.Completion.create(**request)
-                self.metadata["response_time"].append(time.time() - before_request)
-                print(f"Added to metadata: {self.metadata['response_time'][-1]}")
-                self.history.append({'request': request, 'response': response})
-                ChatGPTBot.token_count[self.model_name] += int(response['usage']['total_tokens'])
-                return response['choices'][0]['text']
-            else:
-                raise Exception(f"Model API type not recognized for {self.model_name}")
-        except openai.error.RateLimitError as e:
-            ChatGPTBot.token_count[self.model_name] = int(ChatGPTBot.token_limit_per_minute[self.model_name] * self.share_of_limit + 100)
-            raise e
-            
+        chars_per_token = ChatGPTBot.chars_per_token.get(self.model_name, ChatGPTBot.DEFAULT_CHARS_PER_TOKEN)
+        est_tokens = overhead_tokens + math.ceil(prompt_chars / chars_per_token)
+        # waits for the model's token bucket, which is shared by every game of this process
+        before_request = time.time()
+        response = ChatGPTClient.create(request, self.model_name in ChatGPTBot.CHAT_MODELS, est_tokens,
+                                        ChatGPTBot.token_limit_per_minute[self.model_name] * self.share_of_limit)
+        self.metadata["response_time"].append(time.time() - before_request)
+        prompt_tokens = int(response['usage']['prompt_tokens'])
+        self.metadata["estimated_prompt_tokens"].append(est_tokens)
+        self.metadata["prompt_tokens"].append(prompt_tokens)
+        if prompt_tokens > overhead_tokens:
+            # a moving average of the characters per token the api reports for the model
+            ChatGPTBot.chars_per_token[self.model_name] = 0.8 * chars_per_token + 0.2 * prompt_chars / (prompt_tokens - overhead_tokens)
+        self.history.append({'request': request, 'response': response})
+        if self.model_name in ChatGPTBot.CHAT_MODELS:
+            return response['choices'][0]['message']['content']
+        else:
+            return response['choices'][0]['text']
 
     # loosely adapted from https://github.com/adamkarvonen/chess_gpt_eval/blob/master/gpt_query.py
     def translate_to_string_input(self, openai_messages: list[dict[str, str]]):
@@ -107,7 +102,7 @@ class ChatGPTBot(GGPA):
 
     API_KEY = GPT_AUTH # redacted
 
-    def __init__(self, model_name: ChatGPTBot.ModelName, prompt_option: PromptOption, few_shot: int, show_option_results: bool, share_of_limit: float=1):
+    def __init__(self, model_name: ChatGPTBot.ModelName, prompt_option: PromptOption, few_shot: int, show_option_results: bool, share_of_limit: float=1, prompt_cache: PromptCache|None = None):
         model_name_dict = {
             ChatGPTBot.ModelName.GPT_4: '4',
             ChatGPTBot.ModelName.GPT_Turbo_4: 't4',
@@ -124,6 +119,7 @@ class ChatGPTBot(GGPA):
         self.model_name = model_name
         self.prompt_option = prompt_option
         self.share_of_limit = share_of_limit
+        self.prompt_cache = prompt_cache
         self.few_shot = few_shot
         self.show_option_results = show_option_results
         self.messages: list[dict[str, str]] = []
@@ -136,6 +132,18 @@ class ChatGPTBot(GGPA):
             self.history.append({'auto-answer': str(min)})
             self.messages = self.messages[:-1]
             return min
+        cache_key = PromptCache.get_key(self.get_request(), prompt_option) if self.prompt_cache is not None else None
+        if self.prompt_cache is not None and cache_key is not None:
+            cached = self.prompt_cache.get(cache_key)
+            if cached is not None:
+                # only responses with a valid answer are cached
+                self.metadata["prompt_cache_hits"] += 1
+                self.history.append({'cached-response': cached})
+                self.messages.append({"role": "assistant", "content": cached})
+                return int(strip_response(cached, prompt_option))
+            self.metadata["prompt_cache_misses"] += 1
+            if self.prompt_cache.read_only:
+                raise PromptCache.MissingEntryException(f"Request of {self.name} is not in the prompt cache {self.prompt_cache.filename}")
         while True:
             try:
                 response: str = self.ask_gpt()
@@ -152,6 +160,8 @@ class ChatGPTBot(GGPA):
                 continue
             print(f'Wrong range for {self.name}: *{response}*\nValue: {value}')
             self.metadata["wrong_range_count"] +=1
+        if self.prompt_cache is not None and cache_key is not None:
+            self.prompt_cache.put(cache_key, response)
         self.messages.append({"role": "assistant", "content": response})
         return value
 
@@ -166,11 +176,15 @@ class ChatGPTBot(GGPA):
                 {"role": "system", "content": "You are a bot specialized in playing a card game."},
                 {"role": "user", "content": _get_game_context(game_state, battle_state, options)}
             ]
-        if len(self.messages)-2+2 > self.few_shot*2:
-            self.messages = self.messages[:2] + self.messages[-(self.few_shot-1)*2:]
+        # keeps the system message and the context, and the last few_shot-1 prompts with their answers
+        kept_count = max(0, self.few_shot-1)*2
+        if len(self.messages) > 2 + kept_count:
+            del self.messages[2:len(self.messages)-kept_count]
         prompt = get_action_prompt(game_state, battle_state, options, self.prompt_option, get_context, self.show_option_results)
         self.messages.append({"role": "user", "content": prompt})
-        openai.api_key = self.API_KEY
+        if self.API_KEY != '':
+            # otherwise openai reads OPENAI_API_KEY from the environment
+            openai.api_key = self.API_KEY
         value = self.get_integer_response(0, len(options)-1, self.prompt_option)
         return options[value]
     
@@ -201,6 +215,10 @@ class ChatGPTBot(GGPA):
         self.metadata["response_time"] = []
         self.metadata["wrong_format_count"] = 0
         self.metadata["wrong_range_count"] = 0
+        self.metadata["prompt_cache_hits"] = 0
+        self.metadata["prompt_cache_misses"] = 0
+        self.metadata["estimated_prompt_tokens"] = []
+        self.metadata["prompt_tokens"] = []
 
     def clear_history(self):
         self.history: list[dict[str, Any]] = [{
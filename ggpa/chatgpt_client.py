@@ -0,0 +1,94 @@
+from __future__ import annotations
+import asyncio
+import random
+import threading
+import time
+import openai
+from typing import Any
+
+class TokenBucket:
+    # refills at the tokens per minute of the model, and holds at most a minute's worth
+    def __init__(self, tokens_per_minute: float):
+        self.rate = tokens_per_minute / 60
+        self.capacity = tokens_per_minute
+        self.tokens = tokens_per_minute
+        self.updated = time.monotonic()
+        # requests take their tokens in the order they arrive
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: int):
+        tokens = min(tokens, int(self.capacity))
+        async with self.lock:
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+
+    def refund(self, tokens: int):
+        # corrects the estimate taken by acquire once the real usage is known, negative if it used more
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+    def drain(self):
+        # the server says the quota is used up, the next requests wait for the bucket to refill
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+class ChatGPTClient:
+    # every request of the process goes through one event loop in a background thread,
+    # so the games running in threads have their requests in flight together and share one bucket per model
+    _loop: asyncio.AbstractEventLoop|None = None
+    _loop_lock = threading.Lock()
+    buckets: dict[str, TokenBucket] = {}
+
+    RETRY_COUNT = 8
+    BACKOFF_BASE = 1.0
+    BACKOFF_CAP = 60.0
+
+    @staticmethod
+    def _get_loop() -> asyncio.AbstractEventLoop:
+        with ChatGPTClient._loop_lock:
+            if ChatGPTClient._loop is None:
+                ChatGPTClient._loop = asyncio.new_event_loop()
+                threading.Thread(target=ChatGPTClient._loop.run_forever, daemon=True).start()
+            return ChatGPTClient._loop
+
+    @staticmethod
+    def _get_bucket(model: str, tokens_per_minute: float) -> TokenBucket:
+        # only called on the loop thread
+        if model not in ChatGPTClient.buckets:
+            ChatGPTClient.buckets[model] = TokenBucket(tokens_per_minute)
+        return ChatGPTClient.buckets[model]
+
+    @staticmethod
+    def create(request: dict[str, Any], is_chat: bool, est_tokens: int, tokens_per_minute: float) -> Any:
+        # blocks the calling thread until the response arrives
+        future = asyncio.run_coroutine_threadsafe(ChatGPTClient.acreate(request, is_chat, est_tokens, tokens_per_minute), ChatGPTClient._get_loop())
+        return future.result()
+
+    @staticmethod
+    async def acreate(request: dict[str, Any], is_chat: bool, est_tokens: int, tokens_per_minute: float) -> Any:
+        bucket = ChatGPTClient._get_bucket(request['model'], tokens_per_minute)
+        for attempt in range(ChatGPTClient.RETRY_COUNT):
+            await bucket.acquire(est_tokens)
+            try:
+                if is_chat:
+                    response = await openai.ChatCompletion.acreate(**request)
+                else:
+                    response = await openai.Completion.acreate(**request)
+            except openai.error.RateLimitError as e:
+                bucket.drain()
+                if attempt == ChatGPTClient.RETRY_COUNT - 1:
+                    raise e
+                # full jitter, so that the waiting requests don't all come back at once
+                await asyncio.sleep(random.uniform(0, min(ChatGPTClient.BACKOFF_CAP, ChatGPTClient.BACKOFF_BASE * 2**attempt)))
+                continue
+            bucket.refund(est_tokens - int(response['usage']['total_tokens']))
+            return response
+        raise Exception(f"Request to {request['model']} is not sent")
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import json
 from typing import TYPE_CHECKING
 from action.action import EndAgentTurn, PlayCard
 if TYPE_CHECKING:
@@ -31,4 +32,9 @@ class GGPA:
         raise NotImplementedError("The \"choose_agent_target\" method is not implemented for {}.".format(self.__class__.__name__))
     
     def choose_card_target(self, battle_state: BattleState, list_name: str, card_list: list[Card]) -> Card:
-        raise NotImplementedError("The \"choose_card_target\" method is not implemented for {}.".format(self.__class__.__name__))
\ No newline at end of file
+        raise NotImplementedError("The \"choose_card_target\" method is not implemented for {}.".format(self.__class__.__name__))
+
+    def dump_metadata(self, filename: str):
+        with open(filename, "a") as file:
+            json.dump(self.metadata, file, indent=4)
+            file.write('\n')
\ No newline at end of file
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import math
+import time
+from ggpa.ggpa import GGPA
+from action.action import EndAgentTurn, PlayCard
+from config import Verbose
+from typing import TYPE_CHECKING, Hashable
+if TYPE_CHECKING:
+    from game import GameState
+    from battle import BattleState
+    from agent import Agent
+    from card import Card
+
+class RolloutPolicy:
+    def choose(self, game_state: GameState, battle_state: BattleState, options: list[PlayCard|EndAgentTurn]) -> PlayCard|EndAgentTurn:
+        raise NotImplementedError("The \"choose\" method is not implemented for {}.".format(self.__class__.__name__))
+
+class RandomRolloutPolicy(RolloutPolicy):
+    def choose(self, game_state: GameState, battle_state: BattleState, options: list[PlayCard|EndAgentTurn]) -> PlayCard|EndAgentTurn:
+        return battle_state.policy_rng.choice(options)
+
+class PlayAllRolloutPolicy(RolloutPolicy):
+    # plays random cards while any is playable, only ends the turn when there are none left
+    def choose(self, game_state: GameState, battle_state: BattleState, options: list[PlayCard|EndAgentTurn]) -> PlayCard|EndAgentTurn:
+        play_card_options = [option for option in options if isinstance(option, PlayCard)]
+        if len(play_card_options) == 0:
+            return options[-1]
+        return battle_state.policy_rng.choice(play_card_options)
+
+class MCTSNode:
+    def __init__(self, parent: MCTSNode|None):
+        self.parent = parent
+        self.children: dict[Hashable, MCTSNode] = {}
+        self.visits = 0
+        self.total_value = 0.0
+        # how many times this node could have been selected, the hands differ between determinizations
+        self.availability = 0
+
+    def get_ucb(self, exploration: float) -> float:
+        return self.total_value/self.visits + exploration * math.sqrt(math.log(self.availability)/self.visits)
+
+class MCTSBot(GGPA):
+    def __init__(self, iterations: int|None = None, time_budget: float|None = None, exploration: float = math.sqrt(2),
+                 rollout_policy: RolloutPolicy|None = None, rollout_turns: int = 2):
+        assert iterations is not None or time_budget is not None, "MCTSBot needs an iteration or a time budget"
+        budget = [f'{iterations}it'] if iterations is not None else []
+        budget += [f'{int(time_budget*1000)}ms'] if time_budget is not None else []
+        super().__init__(f"MCTS-{'-'.join(budget)}")
+        self.iterations = iterations
+        self.time_budget = time_budget
+        self.exploration = exploration
+        self.rollout_policy = rollout_policy if rollout_policy is not None else RandomRolloutPolicy()
+        self.rollout_turns = rollout_turns
+
+    @staticmethod
+    def _get_option_key(battle_state: BattleState, option: PlayCard|EndAgentTurn) -> Hashable:
+        # options are matched by card name, the same index holds different cards in different determinizations
+        if isinstance(option, PlayCard):
+            return battle_state.hand[option.get_card_index()].get_name()
+        return None
+
+    def _get_keyed_options(self, battle_state: BattleState) -> dict[Hashable, PlayCard|EndAgentTurn]:
+        keyed_options: dict[Hashable, PlayCard|EndAgentTurn] = {}
+        for option in self.get_choose_card_options(battle_state.game_state, battle_state):
+            keyed_options.setdefault(self._get_option_key(battle_state, option), option)
+        return keyed_options
+
+    def _evaluate_state(self, battle_state: BattleState, enemy_max_health: int) -> float:
+        # in [0, 1]: 0 for a loss, otherwise the player's health against the enemies' health
+        if battle_state.get_end_result() == -1:
+            return 0
+        player = battle_state.player
+        enemy_health = sum([enemy.health for enemy in battle_state.enemies])
+        return 0.5 + 0.5 * (player.health/player.max_health - enemy_health/max(enemy_max_health, 1))
+
+    def _select(self, node: MCTSNode, battle_state: BattleState) -> tuple[MCTSNode, bool]:
+        keyed_options = self._get_keyed_options(battle_state)
+        untried = [key for key in keyed_options if key not in node.children]
+        for key in keyed_options:
+            if key in node.children:
+                node.children[key].availability += 1
+        if len(untried) > 0:
+            key = battle_state.policy_rng.choice(untried)
+            node.children[key] = MCTSNode(node)
+            node.children[key].availability = 1
+            expanded = True
+        else:
+            key = max(keyed_options, key=lambda key: node.children[key].get_ucb(self.exploration))
+            expanded = False
+        battle_state.tick_player(keyed_options[key])
+        return node.children[key], expanded
+
+    def _rollout(self, battle_state: BattleState):
+        last_turn = battle_state.turn + self.rollout_turns
+        while not battle_state.ended() and battle_state.turn < last_turn:
+            options = self.get_choose_card_options(battle_state.game_state, battle_state)
+            battle_state.tick_player(self.rollout_policy.choose(battle_state.game_state, battle_state, options))
+
+    def _run_iteration(self, root: MCTSNode, battle_state: BattleState, enemy_max_health: int):
+        # each iteration samples its own order of the draw pile
+        battle_state = battle_state.copy_undeterministic()
+        battle_state.verbose = Verbose.NO_LOG
+        node = root
+        expanded = False
+        while not expanded and not battle_state.ended():
+            node, expanded = self._select(node, battle_state)
+        self._rollout(battle_state)
+        value = self._evaluate_state(battle_state, enemy_max_health)
+        while node is not None:
+            node.visits += 1
+            node.total_value += value
+            node = node.parent
+
+    def choose_card(self, game_state: GameState, battle_state: BattleState) -> EndAgentTurn|PlayCard:
+        keyed_options = self._get_keyed_options(battle_state)
+        if len(keyed_options) == 1:
+            return list(keyed_options.values())[0]
+        root = MCTSNode(None)
+        enemy_max_health = sum([enemy.max_health for enemy in battle_state.enemies])
+        deadline = time.time() + self.time_budget if self.time_budget is not None else None
+        iteration = 0
+        while iteration == 0 or ((self.iterations is None or iteration < self.iterations) and (deadline is None or time.time() < deadline)):
+            self._run_iteration(root, battle_state, enemy_max_health)
+            iteration += 1
+        self.metadata.setdefault("iterations", []).append(iteration)
+        best_key = max(root.children, key=lambda key: root.children[key].visits)
+        return keyed_options[best_key]
+
+    def choose_agent_target(self, battle_state: BattleState, list_name: str, agent_list: list[Agent]) -> Agent:
+        return agent_list[0]
+
+    def choose_card_target(self, battle_state: BattleState, list_name: str, card_list: list[Card]) -> Card:
+        return card_list[0]
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from enum import Enum
+from target.card_target import CardPile
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from game import GameState
@@ -63,7 +64,7 @@ You have the following cards in your <DISCARD_PILE>:
 You have the following cards in your <DRAW_PILE>, but in an unknown order:
 {'-empty-' if len(battle_state.draw_pile) == 0 else
  nl.join([f'{i}: name:{card.get_name()}, cost:{card.mana_cost.peek()}, type:{card.card_type}{nl}' +
-          f'description: {" ".join([f"{action}" for action in card.actions])}' for i, card in enumerate(sorted(battle_state.draw_pile, key=lambda card: repr(card)))])}
+          f'description: {" ".join([f"{action}" for action in card.actions])}' for i, card in enumerate(battle_state.get_sorted_pile(CardPile.DRAW))])}
 You have the following cards in your <HAND>:
 {'-empty-' if len(battle_state.hand) == 0 else
  nl.join([f'{i}: name:{card.get_name()}, cost:{card.mana_cost.peek()}, type:{card.card_type}{nl}' +
@@ -1,11 +1,17 @@
 from __future__ import annotations
+import copy
+import random
+import threading
+from collections import OrderedDict
 from enum import Enum
-from config import Verbose
+from config import OPTION_RESULT_CACHE_SIZE, GAME_CONTEXT_CACHE_SIZE
+from action.action import PlayCard
+from utility import Zobrist, UndoLog
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from game import GameState
     from battle import BattleState
-    from action.action import PlayCard, EndAgentTurn
+    from action.action import EndAgentTurn
     from agent import Agent
     from card import Card
 
@@ -24,14 +30,27 @@ def get_action_prompt(game_state: GameState, battle_state: BattleState, options:
         return f'{context}\n{state}\n{request}'
     return f'{state}\n{request}'
 
+# the rules and the deck description, rendered once for each deck listing
+_game_contexts: dict[tuple[int, int, tuple[tuple[int, int], ...]], str] = {}
+
 def _get_game_context(game_state: GameState, battle_state: BattleState, options: list[PlayCard|EndAgentTurn]):
-    nl = '\n'
     deck: dict[str, tuple[Card, int]] = {}
     for card in battle_state.exhaust_pile + battle_state.discard_pile + battle_state.draw_pile + battle_state.hand:
         name: str = card.get_name()
         if name not in deck:
             deck[name] = (card, 0)
         deck[name] = (deck[name][0], deck[name][1] + 1)
+    key = (game_state.max_mana, game_state.draw_count, tuple([(card.get_zobrist_key(), count) for card, count in deck.values()]))
+    context = _game_contexts.get(key)
+    if context is None:
+        if len(_game_contexts) >= GAME_CONTEXT_CACHE_SIZE:
+            _game_contexts.clear()
+        context = _render_game_context(game_state, list(deck.values()))
+        _game_contexts[key] = context
+    return context
+
+def _render_game_context(game_state: GameState, deck: list[tuple[Card, int]]):
+    nl = '\n'
     return \
 f'''In this game, the player have a deck of cards. The game is played in a number of turns.
 Every turn, in this exact order:
@@ -56,17 +75,12 @@ Your goal is to win the game with as much remaining health as possible.
 To "Exhaust" a card means that the cards will move to your <EXHAUST_PILE> and will not be playable for the rest of the game.
 You started with the following cards in your deck:
 {nl.join([f'{count} of card <name: {card.name}, mana cost:{card.mana_cost.peek()}, type:{card.card_type}{nl}' +
-          f'description: {card.get_description()}>' for card, count in deck.values()])}'''
+          f'description: {card.get_description()}>' for card, count in deck])}'''
 
 def _get_game_state(game_state: GameState, battle_state: BattleState, options: list[PlayCard|EndAgentTurn], show_option_results: bool):
     player = battle_state.player
+    option_results = get_option_results(battle_state, options) if show_option_results else None
     nl = '\n'
-    deck: dict[str, tuple[Card, int]] = {}
-    for card in battle_state.exhaust_pile + battle_state.discard_pile + battle_state.draw_pile + battle_state.hand:
-        name: str = card.get_name()
-        if name not in deck:
-            deck[name] = (card, 0)
-        deck[name] = (deck[name][0], deck[name][1] + 1)
     return \
 f'''Right now, the game is in turn {battle_state.turn}, and it's time for you to play.
 You have {battle_state.mana} <MANA> out of the {game_state.max_mana} <MANA> that you get every turn.
@@ -87,12 +101,66 @@ You have the following cards in your <HAND>:
 {'-empty-' if len(battle_state.hand) == 0 else
  ' '.join([f'{i}: {card.get_name()}' for i, card in enumerate(battle_state.hand)])}
 This turn, you can do one of the following (your <OPIONS>):
-{nl.join([f'{i}: {option}{(nl + get_option_result(game_state, battle_state, option)) if show_option_results else ""}' for i, option in enumerate(options)])}'''
+{nl.join([f'{i}: {option}{(nl + option_results[i]) if option_results is not None else ""}' for i, option in enumerate(options)])}'''
+
+# option previews, keyed by the state hash, the intentions and cursors of the enemies, and the played card
+_option_results: OrderedDict[tuple[int, tuple[tuple[int, ...], ...], int], str] = OrderedDict()
+_option_results_lock = threading.Lock()
+
+def _get_option_key(battle_state: BattleState, option: PlayCard|EndAgentTurn) -> int:
+    # copies of a card have the same outcome, so only the name and upgrades of the played card matter
+    if isinstance(option, PlayCard):
+        return battle_state.hand[option.get_card_index()].get_zobrist_key()
+    return Zobrist.key('end_turn')
+
+def get_option_results(battle_state: BattleState, options: list[PlayCard|EndAgentTurn]) -> list[str]:
+    # each option is played on the state itself and undone (see BattleState.make), instead of on a deep copy
+    # the draws of a preview come from a stream seeded by the state and the option, so a preview only
+    # depends on those two and can be memoized, and the battle's own stream is left untouched
+    # the intentions shown in the prompt are peeked first, so that the previews play against them
+    for enemy in battle_state.enemies:
+        enemy.get_intention(battle_state.game_state, battle_state)
+    state_hash = battle_state.get_zobrist_hash()
+    # the state hash doesn't hold what the enemies will do, their action sets do
+    intentions = tuple(tuple(enemy.action_set.get_state()) for enemy in battle_state.enemies)
+    option_keys = [_get_option_key(battle_state, option) for option in options]
+    results: dict[int, str] = {}
+    with _option_results_lock:
+        for option_key in option_keys:
+            result = _option_results.get((state_hash, intentions, option_key))
+            if result is not None:
+                _option_results.move_to_end((state_hash, intentions, option_key))
+                results[option_key] = result
+    if len(results) < len(set(option_keys)):
+        player = battle_state.player
+        bot = player.bot
+        policy_rng = battle_state.policy_rng
+        # keep any target choices out of the live conversation
+        player.bot = copy.deepcopy(bot)
+        try:
+            for option, option_key in zip(options, option_keys):
+                if option_key in results:
+                    continue
+                # make seeds the preview's stream from the policy stream
+                battle_state.policy_rng = random.Random(hash((state_hash, intentions, option_key)))
+                battle_state.make(option)
+                results[option_key] = get_option_result(battle_state)
+                battle_state.unmake()
+        finally:
+            while UndoLog.active is not None:
+                battle_state.unmake()
+            player.bot = bot
+            battle_state.policy_rng = policy_rng
+        with _option_results_lock:
+            for option_key in option_keys:
+                _option_results[(state_hash, intentions, option_key)] = results[option_key]
+                _option_results.move_to_end((state_hash, intentions, option_key))
+            while len(_option_results) > OPTION_RESULT_CACHE_SIZE:
+                _option_results.popitem(last=False)
+    return [results[option_key] for option_key in option_keys]
 
-def get_option_result(game_state: GameState, battle_state: BattleState, option: PlayCard|EndAgentTurn):
-    battle_state = battle_state.copy_undeterministic()
-    battle_state.verbose = Verbose.NO_LOG
-    battle_state.tick_player(option)
+def get_option_result(battle_state: BattleState) -> str:
+    # the state after the option is played
     game_state = battle_state.game_state
     nl = '\n*** '
     player = battle_state.player
@@ -0,0 +1,78 @@
+from __future__ import annotations
+import hashlib
+import os
+import json
+import sqlite3
+import time
+from typing import Any
+
+class PromptCache:
+    # responses of the llm bots on disk, keyed by the request without its transport options
+    # only the settings are kept in the object, so copies of the bots in other threads and processes share the file
+    class MissingEntryException(Exception):
+        pass
+
+    def __init__(self, filename: str, max_bytes: int, read_only: bool = False):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        # replays a previous evaluation, a request that is not in the cache is an error instead of an api call
+        self.read_only = read_only
+        if read_only and not os.path.isfile(filename):
+            raise Exception(f"Prompt cache {filename} does not exist")
+        if not read_only:
+            with self._connect() as connection:
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)')
+                connection.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+                # the total size of the entries, kept up to date by put so that it doesn't sum the table on every insert
+                connection.execute('CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)')
+                connection.execute('INSERT OR IGNORE INTO meta VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM entries))')
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection per call, sqlite connections cannot be shared between threads or pickled
+        if self.read_only:
+            return sqlite3.connect(f'file:{self.filename}?mode=ro', uri=True, timeout=30)
+        return sqlite3.connect(self.filename, timeout=30)
+
+    @staticmethod
+    def get_key(request: dict[str, Any], prompt_option: object) -> str:
+        normalized = {key: value for key, value in request.items() if key != 'request_timeout'}
+        normalized['prompt_option'] = str(prompt_option)
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+    def get(self, key: str) -> str|None:
+        connection = self._connect()
+        try:
+            row = connection.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is not None and not self.read_only:
+                with connection:
+                    connection.execute('UPDATE entries SET used = ? WHERE key = ?', (time.time(), key))
+        finally:
+            connection.close()
+        return None if row is None else row[0]
+
+    def put(self, key: str, value: str):
+        if self.read_only:
+            return
+        size = len(key) + len(value.encode())
+        connection = self._connect()
+        try:
+            with connection:
+                # takes the write lock first, so that the size of a replaced entry and the total are read by one writer at a time
+                connection.execute('BEGIN IMMEDIATE')
+                row = connection.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+                connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', (key, value, size, time.time()))
+                connection.execute('UPDATE meta SET total = total + ?', (size - (row[0] if row is not None else 0),))
+                total = connection.execute('SELECT total FROM meta').fetchone()[0]
+                if total > self.max_bytes:
+                    # least recently used first
+                    evicted: list[tuple[str]] = []
+                    for old_key, old_size in connection.execute('SELECT key, size FROM entries ORDER BY used'):
+                        if total <= self.max_bytes:
+                            break
+                        evicted.append((old_key,))
+                        total -= old_size
+                    connection.executemany('DELETE FROM entries WHERE key = ?', evicted)
+                    connection.execute('UPDATE meta SET total = ?', (total,))
+        finally:
+            connection.close()
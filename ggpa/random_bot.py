@@ -1,5 +1,4 @@
 from __future__ import annotations
-import random
 from ggpa.ggpa import GGPA
 from action.action import EndAgentTurn, PlayCard
 from typing import TYPE_CHECKING
@@ -17,11 +16,11 @@ class RandomBot(GGPA):
 
     def choose_card(self, game_state: GameState, battle_state: BattleState) -> EndAgentTurn|PlayCard:
         options = self.get_choose_card_options(game_state, battle_state)
-        return random.choice(options)
+        return battle_state.policy_rng.choice(options)
     
     def choose_agent_target(self, battle_state: BattleState, list_name: str, agent_list: list[Agent]) -> Agent:
-        return random.choice(agent_list)
+        return battle_state.policy_rng.choice(agent_list)
     
     def choose_card_target(self, battle_state: BattleState, list_name: str, card_list: list[Card]) -> Card:
-        return random.choice(card_list)
+        return battle_state.policy_rng.choice(card_list)
     
\ No newline at end of file
@@ -0,0 +1,116 @@
+from __future__ import annotations
+import sys
+import math
+from array import array
+from collections import OrderedDict
+
+class TranspositionTable:
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: int, depth: int) -> float|None:
+        # returns None on a miss, or if the entry was searched shallower than depth
+        raise NotImplementedError("The \"get\" method is not implemented for {}.".format(self.__class__.__name__))
+
+    def put(self, key: int, depth: int, value: float):
+        raise NotImplementedError("The \"put\" method is not implemented for {}.".format(self.__class__.__name__))
+
+    def clear(self):
+        raise NotImplementedError("The \"clear\" method is not implemented for {}.".format(self.__class__.__name__))
+
+    def get_resident_bytes(self) -> int:
+        raise NotImplementedError("The \"get_resident_bytes\" method is not implemented for {}.".format(self.__class__.__name__))
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            'tt_hits': self.hits,
+            'tt_misses': self.misses,
+            'tt_evictions': self.evictions,
+            'tt_resident_bytes': self.get_resident_bytes(),
+        }
+
+class LRUTranspositionTable(TranspositionTable):
+    # the dict slot, the ordered dict link and the free space of both, per entry. measured with tracemalloc over
+    # 2*10^3 to 3*10^5 puts, it is 54 to 108 bytes depending on how full the tables are, the upper end is used
+    DICT_ENTRY_BYTES = 112
+    # per entry: the 64 bit key, the (depth, value) tuple with its float, and the dict entry
+    ENTRY_BYTES = sys.getsizeof(2**63) + sys.getsizeof((0, 0.0)) + sys.getsizeof(0.0) + DICT_ENTRY_BYTES
+
+    def __init__(self, max_bytes: int = TranspositionTable.DEFAULT_MAX_BYTES):
+        super().__init__(max_bytes)
+        self.capacity = max(1, max_bytes // LRUTranspositionTable.ENTRY_BYTES)
+        self.entries: OrderedDict[int, tuple[int, float]] = OrderedDict()
+
+    def get(self, key: int, depth: int) -> float|None:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: int, depth: int, value: float):
+        self.entries[key] = (depth, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_resident_bytes(self) -> int:
+        return len(self.entries) * LRUTranspositionTable.ENTRY_BYTES
+
+class DepthPreferredTranspositionTable(TranspositionTable):
+    # one slot per key % capacity, a colliding entry only replaces a shallower or equally deep one
+    ENTRY_BYTES = array('Q').itemsize + array('b').itemsize + array('d').itemsize
+    EMPTY = -1
+
+    def __init__(self, max_bytes: int = TranspositionTable.DEFAULT_MAX_BYTES):
+        super().__init__(max_bytes)
+        self.capacity = max(1, max_bytes // DepthPreferredTranspositionTable.ENTRY_BYTES)
+        self.clear()
+
+    def get(self, key: int, depth: int) -> float|None:
+        if self.depths is None:
+            self.misses += 1
+            return None
+        slot = key % self.capacity
+        if self.depths[slot] == DepthPreferredTranspositionTable.EMPTY or self.keys[slot] != key or self.depths[slot] < depth:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.values[slot]
+
+    def put(self, key: int, depth: int, value: float):
+        if self.depths is None:
+            # allocated on first use, so that empty tables stay cheap to pickle for worker processes
+            self.keys = array('Q', [0]) * self.capacity
+            self.depths = array('b', [DepthPreferredTranspositionTable.EMPTY]) * self.capacity
+            self.values = array('d', [math.nan]) * self.capacity
+        slot = key % self.capacity
+        stored_depth = self.depths[slot]
+        if stored_depth != DepthPreferredTranspositionTable.EMPTY and self.keys[slot] != key:
+            if stored_depth > depth:
+                return
+            self.evictions += 1
+        self.keys[slot] = key
+        self.depths[slot] = depth
+        self.values[slot] = value
+
+    def clear(self):
+        self.keys: array[int]|None = None
+        self.depths: array[int]|None = None
+        self.values: array[float]|None = None
+
+    def get_resident_bytes(self) -> int:
+        if self.depths is None:
+            return 0
+        return self.capacity * DepthPreferredTranspositionTable.ENTRY_BYTES
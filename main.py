@@ -13,6 +13,7 @@ from ggpa.backtrack_parallel import BacktrackParallelBot
 def main():
     agent = HumanInput(True)
     # agent = BacktrackBot(4, False)
+    # agent = BacktrackParallelBot(4, 4)
     # agent = ChatGPTBot(ChatGPTBot.ModelName.GPT_Turbo_35, PromptOption.CoT, 0, False, 1)
     game_state = GameState(Character.IRON_CLAD, agent, 0)
     game_state.set_deck(*CardRepo.get_scenario_0()[1])
@@ -20,7 +21,11 @@ def main():
     # game_state.add_to_deck(CardGen.Strike(), CardGen.Defend(), CardGen.Defend())
     battle_state = BattleState(game_state, JawWorm(game_state), verbose=Verbose.LOG)
     start = time.time()
-    battle_state.run()
+    try:
+        battle_state.run()
+    finally:
+        if isinstance(agent, BacktrackParallelBot):
+            agent.shutdown()
     end = time.time()
     print(f"run ended in {end-start} seconds")
     # to save all the requests and responses for the ChatGPTBot agent, use:
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from enum import StrEnum, Enum
 from config import MAX_STATUS
+from utility import Zobrist, SlotCopy, UndoLog
 from typing import Callable
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -73,7 +74,7 @@ class StatusEffectDefinition:
     
     @staticmethod
     def remove(se: StatusEffectObject):
-        se.done = lambda: True
+        se.alive = False
     
     @staticmethod
     def no_change(se: StatusEffectObject):
@@ -87,6 +88,13 @@ class StatusEffectDefinition:
     def _hidden_repr(se: StatusEffectObject):
         raise Exception(f"Hidden status effect {se.definition.name} does not have a representation.")
     
+    def __reduce__(self):
+        # definitions are shared constants holding lambdas, so they are pickled by name
+        return (StatusEffectRepo.get, (self.name,))
+
+    def __deepcopy__(self, memo: dict):
+        return self
+
     def __repr__(self):
         return self.name
 SEDef = StatusEffectDefinition
@@ -99,71 +107,159 @@ class StatusEffectRepo:
     TOLERANCE = SEDef("Tolerance", SEDef.no_stack, SEDef.get_increase(2), SEDef.zero_done, SEDef.key_value_repr)
     BOMB = SEDef("Bomb", SEDef.unique_stack, SEDef.get_decrease(1), SEDef.zero_done, SEDef.key_value_repr)
 
-class StatusEffectObject:
+    @staticmethod
+    def get(name: str) -> StatusEffectDefinition:
+        for definition in vars(StatusEffectRepo).values():
+            if isinstance(definition, StatusEffectDefinition) and definition.name == name:
+                return definition
+        raise Exception(f"Status effect {name} is not defined in StatusEffectRepo")
+
+class StatusEffectObject(SlotCopy):
+    __slots__ = ('val', 'definition', 'alive')
+
     def __init__(self, definition: StatusEffectDefinition, val: int):
         self.val = val
         self.definition = definition
+        # cleared when the effect is removed or stacked into another one
+        self.alive = True
     
     def done(self):
-        return self.definition.done(self)
+        return not self.alive or self.definition.done(self)
+
+    def clone(self) -> StatusEffectObject:
+        return StatusEffectObject(self.definition, self.val)
     
     def __repr__(self) -> str:
         return self.definition.repr(self)
 
-class StatusEffectState:
+class StatusEffectState(SlotCopy):
+    __slots__ = ('status_effects', 'by_name', 'zobrist_hash', 'repr_cache')
+
     def __init__(self):
+        # in the order they were applied, which is the order of the repr
         self.status_effects: list[StatusEffectObject] = []
+        # the same objects by definition name, kept in sync with status_effects
+        self.by_name: dict[str, list[StatusEffectObject]] = {}
+        self.zobrist_hash: int|None = None
+        self.repr_cache: str|None = None
     
     def get(self, status: StatusEffectDefinition) -> int:
-        values = self._get_obj(status)
-        if len(values) > 1:
-            raise Exception(f"Cannot return a single value for {status}")
-        elif len(values) == 0:
+        values = self.by_name.get(status.name)
+        if values is None:
             return 0
+        elif len(values) > 1:
+            raise Exception(f"Cannot return a single value for {status}")
         return values[0].val
 
     def has(self, status: StatusEffectDefinition) -> bool:
-        return len(self._get_obj(status)) > 0
+        return status.name in self.by_name
 
     def _get_obj(self, status: StatusEffectDefinition) -> list[StatusEffectObject]:
-        ret: list[StatusEffectObject] = []
-        for se_obj in self.status_effects:
-            if se_obj.definition.name == status.name:
-                ret.append(se_obj)
-        return ret
+        return self.by_name.get(status.name, [])
     
     def end_turn(self):
+        self._save()
         for se in self.status_effects:
             se.definition.end_turn(se)
         self.clean()
         
     def remove_status(self, sed: StatusEffectDefinition):
-        find = self._get_obj(sed)
+        find = self.by_name.get(sed.name)
+        if find is None:
+            return
+        self._save()
+        del self.by_name[sed.name]
         for se in find:
-            se.done = lambda: True
-        self.clean()
+            se.alive = False
+        self.status_effects = [se for se in self.status_effects if se.alive]
+        self._changed()
     
     def apply_status(self, definition: StatusEffectDefinition, amount: int):
-        self.status_effects.append(StatusEffectObject(definition, amount))
-        find = self._get_obj(definition)
+        self._save()
+        new_se = StatusEffectObject(definition, amount)
+        self.status_effects.append(new_se)
+        find = self._get_obj(definition) + [new_se]
         keep = definition.stack(find)
         for se, should_keep in zip(find, keep):
-            if not should_keep:
-                se.done = lambda: True
-        self.clean()
+            if not should_keep or se.definition.done(se):
+                se.alive = False
+        # only the effects of this definition can have changed
+        kept = [se for se in find if se.alive]
+        if len(kept) == len(find) - 1 and not new_se.alive:
+            # stacked into an existing effect, the common case
+            self.status_effects.pop()
+        elif len(kept) < len(find):
+            self.status_effects = [se for se in self.status_effects if se.alive]
+        if len(kept) > 0:
+            self.by_name[definition.name] = kept
+        else:
+            self.by_name.pop(definition.name, None)
+        self._changed()
 
     def clean_up(self):
+        self._save()
         self.status_effects = []
+        self.by_name = {}
+        self._changed()
 
     def clean(self):
-        self.status_effects = [se for se in self.status_effects if not se.done()]
+        # the lists are only rebuilt when an effect has run out
+        if any(se.done() for se in self.status_effects):
+            self._save()
+            self.status_effects = [se for se in self.status_effects if not se.done()]
+            self.by_name = {}
+            for se in self.status_effects:
+                self.by_name.setdefault(se.definition.name, []).append(se)
+        self._changed()
+
+    def _changed(self):
+        self.zobrist_hash = None
+        self.repr_cache = None
+
+    def _save(self):
+        # records how to undo the change that follows, effects are changed in place so their values are kept too
+        if UndoLog.active is not None:
+            UndoLog.active.record(self._restore, [se for se in self.status_effects], dict(self.by_name),
+                [(se.val, se.alive) for se in self.status_effects], self.zobrist_hash, self.repr_cache)
+
+    def _restore(self, status_effects: list[StatusEffectObject], by_name: dict[str, list[StatusEffectObject]],
+                 values: list[tuple[int, bool]], zobrist_hash: int|None, repr_cache: str|None):
+        self.status_effects = status_effects
+        self.by_name = by_name
+        for se, (val, alive) in zip(status_effects, values):
+            se.val = val
+            se.alive = alive
+        self.zobrist_hash = zobrist_hash
+        self.repr_cache = repr_cache
+
+    def clone(self) -> StatusEffectState:
+        ret = StatusEffectState()
+        ret.status_effects = [se.clone() for se in self.status_effects]
+        for se in ret.status_effects:
+            ret.by_name.setdefault(se.definition.name, []).append(se)
+        ret.zobrist_hash = self.zobrist_hash
+        ret.repr_cache = self.repr_cache
+        return ret
+
+    def get_zobrist_hash(self) -> int:
+        # every change goes through _changed, which drops the cached value
+        if self.zobrist_hash is None:
+            self.zobrist_hash = self._compute_zobrist_hash()
+        return self.zobrist_hash
+
+    def _compute_zobrist_hash(self) -> int:
+        # follows __repr__: order sensitive and hidden effects are left out
+        visible = [se for se in self.status_effects if not se.definition.is_hidden]
+        return sum([Zobrist.key('status', i, se.definition.name, se.val) for i, se in enumerate(visible)])
 
     def __repr__(self) -> str:
-        return f'[{",".join([repr(se) for se in self.status_effects if not se.definition.is_hidden])}]'
+        if self.repr_cache is None:
+            self.repr_cache = f'[{",".join([repr(se) for se in self.status_effects if not se.definition.is_hidden])}]'
+        return self.repr_cache
 
 def tolerance_after(__: None, additional_info: tuple[Agent, GameState, BattleState, list[Agent]]):
     by, _, _, _ = additional_info
-    by.block += by.status_effect_state.get(StatusEffectRepo.TOLERANCE)
+    by.gain_block(by.status_effect_state.get(StatusEffectRepo.TOLERANCE))
 
 def bomb_after(__: None, additional_info: tuple[Agent, GameState, BattleState, list[Agent]]):
     by, _, _, other_side = additional_info
@@ -1,10 +1,10 @@
 from __future__ import annotations
-import random
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from agent import Agent
     from battle import BattleState
 from enum import Enum
+from utility import SlotCopy
 
 class AgentSet(Enum):
         ENEMY = 1
@@ -29,7 +29,9 @@ def get_agent_set_data(agent_set: AgentSet, battle_state: BattleState) -> list[A
     else:
         raise Exception("AgentSet {} not recognized.".format(agent_set))
 
-class AgentTarget:
+class AgentTarget(SlotCopy):
+    __slots__ = ()
+
     def get(self, performer: Agent, battle_state: BattleState) -> list[Agent]:
         raise NotImplementedError("The \"get\" method is not implemented for this AgentTarget.")
 
@@ -37,6 +39,8 @@ class AgentTarget:
         return self.__class__.__name__
 
 class SelfAgentTarget(AgentTarget):
+    __slots__ = ()
+
     def get(self, performer: Agent, battle_state: BattleState) -> list[Agent]:
         return [performer]
     
@@ -44,6 +48,8 @@ class SelfAgentTarget(AgentTarget):
         return "self"
 
 class PlayerAgentTarget(AgentTarget):
+    __slots__ = ()
+
     def get(self, performer: Agent, battle_state: BattleState) -> list[Agent]:
         return [battle_state.player]
     
@@ -51,6 +57,8 @@ class PlayerAgentTarget(AgentTarget):
         return "player"
 
 class ChooseAgentTarget(AgentTarget):
+    __slots__ = ('among', 'count')
+
     def __init__(self, among: AgentSet, count: int = 1):
         self.among = among
         self.count = count
@@ -65,6 +73,8 @@ class ChooseAgentTarget(AgentTarget):
         return f"your choice between {get_agent_set_name(self.among)}"
         
 class AllAgentsTarget(AgentTarget):
+    __slots__ = ('among',)
+
     def __init__(self, among: AgentSet):
         self.among = among
     
@@ -76,12 +86,14 @@ class AllAgentsTarget(AgentTarget):
         return f"all {get_agent_set_name(self.among)}"
 
 class RandomAgentTarget(AgentTarget):
+    __slots__ = ('among',)
+
     def __init__(self, among: AgentSet):
         self.among = among
     
     def get(self, performer: Agent, battle_state: BattleState) -> list[Agent]:
         agent_list: list[Agent] = get_agent_set_data(self.among, battle_state)
-        agent = random.choice(agent_list)
+        agent = battle_state.rng.choice(agent_list)
         return [agent]
     
     def __repr__(self) -> str:
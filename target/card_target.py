@@ -4,6 +4,7 @@ if TYPE_CHECKING:
     from card import Card
     from battle import BattleState
 from enum import Enum
+from utility import SlotCopy
 
 class CardPile(Enum):
     HAND = 1
@@ -39,7 +40,9 @@ def get_card_pile_data(card_pile: CardPile, battle_state: BattleState) -> list[C
     else:
         raise Exception("CardPile {} not recognized.".format(card_pile))
 
-class CardTarget:
+class CardTarget(SlotCopy):
+    __slots__ = ()
+
     class NoneAvailabeException(Exception):
         pass
 
@@ -50,6 +53,8 @@ class CardTarget:
         return self.__class__.__name__
     
 class SelfCardTarget(CardTarget):
+    __slots__ = ()
+
     def get(self, by: Card, battle_state: BattleState) -> list[Card]:
         return [by]
     
@@ -57,6 +62,8 @@ class SelfCardTarget(CardTarget):
         return "self (this card)"
 
 class ChooseCardTarget(CardTarget):
+    __slots__ = ('among', 'count')
+
     def __init__(self, among: CardPile, count: int = 1):
         self.among = among
         self.count = count
@@ -0,0 +1,38 @@
+import time
+from game import GameState
+from battle import BattleState
+from config import Character, Verbose
+from agent import JawWorm, Goblin
+from card import CardRepo
+from ggpa.backtrack import BacktrackBot
+
+class TimedBacktrackBot(BacktrackBot):
+    # keeps how long each decision took
+    def __init__(self, depth: int, time_budget: float):
+        super().__init__(depth, False, time_budget=time_budget)
+        self.decision_times: list[float] = []
+
+    def choose_card(self, game_state, battle_state):
+        start = time.monotonic()
+        action = super().choose_card(game_state, battle_state)
+        self.decision_times.append(time.monotonic() - start)
+        return action
+
+def play(bot: BacktrackBot, seed: int):
+    game_state = GameState(Character.IRON_CLAD, bot, 0, seed)
+    game_state.set_deck(*CardRepo.get_scenario_1()[1])
+    BattleState(game_state, JawWorm(game_state), Goblin(game_state), verbose=Verbose.NO_LOG).run()
+
+def test_time_budget_bounds_each_decision():
+    bot = TimedBacktrackBot(20, 0.05)
+    play(bot, 0)
+    # a depth that runs out of time stops at its next node, the first depth always completes
+    assert max(bot.decision_times) < 0.05 + 0.1
+    completed_depths = bot.metadata["completed_depth"]
+    assert len(completed_depths) > 0
+    assert all(1 <= depth < 20 for depth in completed_depths)
+
+def test_time_budget_completes_shallow_depths():
+    bot = TimedBacktrackBot(2, 60)
+    play(bot, 1)
+    assert set(bot.metadata["completed_depth"]) == {2}
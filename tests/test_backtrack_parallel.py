@@ -0,0 +1,57 @@
+import multiprocessing
+from evaluate_bot import simulate_one
+from game import GameState
+from battle import BattleState
+from agent import JawWorm, Goblin
+from card import CardRepo
+from config import Character, Verbose
+from ggpa.backtrack import BacktrackBot
+from ggpa.backtrack_parallel import BacktrackParallelBot, _get_battle_state
+from target.card_target import CardPile
+
+def get_snapshot(battle_state: BattleState):
+    # unlike the visualization, this doesn't sample the intentions of the enemies
+    return (battle_state.get_zobrist_hash(), battle_state._compute_zobrist_hash(), battle_state.turn, battle_state.turn_phase, battle_state.mana,
+            battle_state.agent_turn_ended, [repr(agent) for agent in [battle_state.player] + battle_state.enemies],
+            [enemy.action_set.get_state() for enemy in battle_state.enemies],
+            [[repr(card) for card in battle_state.get_pile(card_pile)] for card_pile in CardPile])
+
+class ComparingBot(BacktrackBot):
+    # plays as the sequential search, and asks the parallel search for every decision from the same policy stream
+    def __init__(self, depth: int, parallel: BacktrackParallelBot):
+        super().__init__(depth, False)
+        self.parallel = parallel
+        self.actions: list[tuple[str, str]] = []
+        self.rebuilt: list[bool] = []
+
+    def choose_card(self, game_state, battle_state):
+        policy_state = battle_state.policy_rng.getstate()
+        action = super().choose_card(game_state, battle_state)
+        battle_state.policy_rng.setstate(policy_state)
+        parallel_action = self.parallel.choose_card(game_state, battle_state)
+        self.actions.append((repr(action), repr(parallel_action)))
+        # the state the workers rebuild from the fields is the state of the battle
+        if self.parallel.battle_state is battle_state:
+            assert self.parallel.battle is not None
+            rebuilt = _get_battle_state(self.parallel.battle, self.parallel.definitions, self.parallel._get_fields(battle_state))
+            self.rebuilt.append(get_snapshot(rebuilt) == get_snapshot(battle_state))
+        return action
+
+def test_parallel_chooses_like_sequential():
+    parallel = BacktrackParallelBot(2, 2)
+    try:
+        for seed in range(3):
+            bot = ComparingBot(2, parallel)
+            game_state = GameState(Character.IRON_CLAD, bot, 0, seed)
+            game_state.set_deck(*CardRepo.get_scenario_1()[1])
+            BattleState(game_state, JawWorm(game_state), Goblin(game_state), verbose=Verbose.NO_LOG).run()
+            assert len(bot.actions) > 5
+            assert all(action == parallel_action for action, parallel_action in bot.actions)
+            assert len(bot.rebuilt) > 5 and all(bot.rebuilt)
+    finally:
+        parallel.shutdown()
+
+def test_game_shuts_down_its_workers(tmp_path):
+    for index in range(2):
+        simulate_one(index, BacktrackParallelBot(1, 2), CardRepo.get_scenario_0()[1], 'j', str(tmp_path), Verbose.NO_LOG, index)
+    assert multiprocessing.active_children() == []
@@ -0,0 +1,49 @@
+import math
+import numpy as np
+import pytest
+from game import GameState
+from battle import BattleState
+from config import Character, Verbose
+from agent import JawWorm, Goblin, Leech, AcidSlimeSmall, SpikeSlimeSmall
+from card import CardRepo, CardGen
+from ggpa.random_bot import RandomBot
+from batch_battle import BatchBattle, simulate_random_bot
+
+COUNT = 4000
+# the largest difference allowed between the two engines, in standard errors of the difference
+MAX_Z = 4
+
+def simulate_scalar(get_deck, enemy_factories, count: int) -> tuple[np.ndarray, np.ndarray]:
+    healths: list[int] = []
+    wins: list[bool] = []
+    for seed in range(count):
+        game_state = GameState(Character.IRON_CLAD, RandomBot(), 0, seed)
+        game_state.set_deck(*get_deck())
+        BattleState(game_state, *[factory(game_state) for factory in enemy_factories], verbose=Verbose.NO_LOG).run()
+        healths.append(game_state.player.health)
+        wins.append(game_state.get_end_results() != -1)
+    return np.array(healths), np.array(wins)
+
+def get_z(a: np.ndarray, b: np.ndarray) -> float:
+    se = math.sqrt(a.var()/len(a) + b.var()/len(b))
+    return 0 if se == 0 else float(abs(a.mean() - b.mean())/se)
+
+def check_agreement(get_deck, enemy_factories):
+    healths, wins = simulate_scalar(get_deck, enemy_factories, COUNT)
+    result = simulate_random_bot(get_deck(), enemy_factories, COUNT, seed=0)
+    assert get_z(wins.astype(float), result.win.astype(float)) < MAX_Z
+    assert get_z(healths.astype(float), result.player_health.astype(float)) < MAX_Z
+
+def test_batch_agrees_with_scalar_against_one_enemy():
+    check_agreement(lambda: CardRepo.get_scenario_0()[1], [JawWorm])
+
+def test_batch_agrees_with_scalar_against_two_enemies():
+    check_agreement(lambda: CardRepo.get_scenario_1()[1], [Goblin, Leech])
+
+def test_batch_agrees_with_scalar_with_exhaust_and_copies():
+    check_agreement(lambda: CardRepo.get_basics() + [CardGen.Anger(), CardGen.Cleave(), CardGen.Impervious(), CardGen.BashStar()],
+                    [AcidSlimeSmall, SpikeSlimeSmall])
+
+def test_unsupported_card_raises():
+    with pytest.raises(BatchBattle.UnsupportedException):
+        simulate_random_bot(CardRepo.get_basics() + [CardGen.Armaments()], [JawWorm], 10, seed=0)
@@ -0,0 +1,46 @@
+import random
+from collections import Counter
+from game import GameState
+from battle import BattleState
+from config import Character, Verbose
+from agent import JawWorm
+from card import CardRepo, CardGen
+from target.card_target import CardPile
+from ggpa.random_bot import RandomBot
+
+TRIAL_COUNT = 20000
+
+def get_battle(draw_count: int) -> BattleState:
+    # the first draw_count cards of the deck in the draw pile, the rest in the discard pile, an empty hand
+    game_state = GameState(Character.IRON_CLAD, RandomBot(), 0, 0)
+    game_state.set_deck(*CardRepo.get_scenario_1()[1], CardGen.Anger(), CardGen.Bomb())
+    battle_state = BattleState(game_state, JawWorm(game_state), verbose=Verbose.NO_LOG)
+    deck = [card for card in battle_state.discard_pile]
+    battle_state.set_pile(CardPile.DRAW, deck[:draw_count])
+    battle_state.set_pile(CardPile.DISCARD, deck[draw_count:])
+    return battle_state
+
+def get_outcome(battle_state: BattleState) -> tuple[tuple[str, ...], ...]:
+    return tuple(tuple(sorted(repr(card) for card in battle_state.get_pile(card_pile))) for card_pile in [CardPile.HAND, CardPile.DRAW, CardPile.DISCARD])
+
+def check_draw_outcomes(draw_count: int):
+    battle_state = get_battle(draw_count)
+    probabilities: Counter = Counter()
+    for probability, outcome in battle_state.get_draw_outcomes():
+        probabilities[get_outcome(outcome)] += probability
+    assert abs(sum(probabilities.values()) - 1) < 1e-9
+    frequencies: Counter = Counter()
+    for trial in range(TRIAL_COUNT):
+        trial_state = battle_state.clone()
+        trial_state.rng = random.Random(trial)
+        trial_state.set_pile(CardPile.DRAW, random.Random(-trial).sample(trial_state.draw_pile, len(trial_state.draw_pile)))
+        trial_state.draw_hand()
+        frequencies[get_outcome(trial_state)] += 1
+    assert set(frequencies) <= set(probabilities)
+    assert max(abs(frequencies[outcome]/TRIAL_COUNT - probability) for outcome, probability in probabilities.items()) < 0.01
+
+def test_draw_outcomes_match_draws():
+    check_draw_outcomes(8)
+
+def test_draw_outcomes_match_draws_with_reshuffle():
+    check_draw_outcomes(3)
@@ -0,0 +1,128 @@
+import copy
+import random
+from game import GameState
+from battle import BattleState
+from config import Character, Verbose
+from agent import JawWorm, AcidSlimeSmall, Leech
+from card import CardRepo, CardGen
+from action.action import EndAgentTurn
+from target.card_target import CardPile
+from ggpa.ggpa import GGPA
+from ggpa.random_bot import RandomBot
+from ggpa.backtrack import BacktrackBot
+from utility import UndoLog
+
+def get_battle(seed: int) -> BattleState:
+    deck = CardRepo.get_basics() + [CardGen.Anger(), CardGen.Armaments(), CardGen.Impervious(), CardGen.Bomb(),
+                                    CardGen.Tolerate(), CardGen.Bash(), CardGen.Stimulate(), CardGen.Batter(), CardGen.Cleave()]
+    game_state = GameState(Character.IRON_CLAD, RandomBot(), 0, seed)
+    game_state.set_deck(*deck)
+    battle_state = BattleState(game_state, JawWorm(game_state), AcidSlimeSmall(game_state), Leech(game_state), verbose=Verbose.NO_LOG)
+    battle_state.reshuffle()
+    battle_state.draw_hand()
+    battle_state.mana = game_state.max_mana
+    battle_state.turn = 1
+    return battle_state
+
+def get_snapshot(battle_state: BattleState):
+    return (battle_state.get_zobrist_hash(), battle_state.get_visualization(),
+            [[repr(card) for card in battle_state.get_pile(card_pile)] for card_pile in CardPile],
+            [enemy.action_set.get_state() for enemy in battle_state.enemies])
+
+def play(battle_state: BattleState, seed: int, step_count: int) -> list:
+    # a seeded random playout, with the snapshot after every step
+    battle_state.rng = random.Random(seed)
+    battle_state.policy_rng = random.Random(seed + 1)
+    snapshots = []
+    for _ in range(step_count):
+        if battle_state.ended():
+            break
+        options = GGPA.get_play_card_options(battle_state.game_state, battle_state) + [EndAgentTurn()]
+        battle_state.tick_player(battle_state.policy_rng.choice(options))
+        snapshots.append(get_snapshot(battle_state))
+    return snapshots
+
+def test_clone_plays_like_deepcopy():
+    for seed in range(40):
+        battle_state = get_battle(seed)
+        play(battle_state, seed*7, seed % 13)
+        before = get_snapshot(battle_state)
+        deep_copy = copy.deepcopy(battle_state)
+        clone = battle_state.clone()
+        assert get_snapshot(deep_copy) == get_snapshot(clone) == before
+        assert play(deep_copy, seed, 40) == play(clone, seed, 40)
+        assert get_snapshot(battle_state) == before
+
+def test_original_is_independent_of_clone():
+    for seed in range(20):
+        battle_state = get_battle(seed)
+        clone = battle_state.clone()
+        play(battle_state, seed, 20)
+        after = get_snapshot(battle_state)
+        play(clone, seed + 100, 40)
+        assert get_snapshot(battle_state) == after
+
+def test_upgrade_card_copies_on_write():
+    battle_state = get_battle(0)
+    deck = [repr(card) for card in battle_state.game_state.deck]
+    before = get_snapshot(battle_state)
+    clone = battle_state.clone()
+    card = clone.hand[0]
+    assert card is battle_state.hand[0]
+    clone.upgrade_card(card)
+    assert clone.hand[0] is not card
+    assert clone.hand[0].upgrade_count == card.upgrade_count + 1
+    assert clone.get_zobrist_hash() != before[0]
+    assert clone.is_present(clone.hand[0]) and not clone.is_present(card)
+    assert get_snapshot(battle_state) == before
+    assert battle_state.is_present(card)
+    assert [repr(card) for card in battle_state.game_state.deck] == deck
+
+def test_incremental_hash_matches_recompute():
+    step_count = 0
+    for seed in range(250):
+        battle_state = get_battle(seed)
+        battle_state.policy_rng = random.Random(seed)
+        while not battle_state.ended():
+            options = GGPA.get_play_card_options(battle_state.game_state, battle_state) + [EndAgentTurn()]
+            battle_state.tick_player(battle_state.policy_rng.choice(options))
+            assert battle_state.get_zobrist_hash() == battle_state._compute_zobrist_hash()
+            step_count += 1
+    assert step_count > 5000
+
+def explore(battle_state: BattleState, depth: int):
+    # every option, made and unmade, down to depth
+    if depth == 0 or battle_state.ended():
+        return
+    options = battle_state.player.bot.get_choose_card_options(battle_state.game_state, battle_state)
+    for option in options:
+        before = get_snapshot(battle_state)
+        if battle_state.make(option):
+            explore(battle_state, depth - 1)
+        battle_state.unmake()
+        assert get_snapshot(battle_state) == before
+
+def test_unmake_restores_the_state():
+    for seed in range(60):
+        battle_state = get_battle(seed)
+        play(battle_state, seed*7, seed % 13)
+        rng, policy_rng, draw_pile = battle_state.rng, battle_state.policy_rng, battle_state.draw_pile
+        before = get_snapshot(battle_state)
+        explore(battle_state, 3)
+        assert get_snapshot(battle_state) == before
+        assert battle_state.rng is rng and battle_state.policy_rng is policy_rng and battle_state.draw_pile is draw_pile
+        assert UndoLog.active is None
+
+def test_make_unmake_search_chooses_like_copies():
+    for seed in range(30):
+        battle_state = get_battle(seed)
+        play(battle_state, seed*7, seed % 13)
+        if battle_state.ended():
+            continue
+        actions = []
+        for bot in [BacktrackBot(2, False), BacktrackBot(2, False, make_unmake=True)]:
+            copy_state = battle_state.clone()
+            copy_state.policy_rng = random.Random(seed)
+            copy_state.player.bot = bot
+            actions.append(repr(bot.choose_card(copy_state.game_state, copy_state)))
+        assert actions[0] == actions[1]
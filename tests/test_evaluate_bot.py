@@ -0,0 +1,6 @@
+from evaluate_bot import get_difference_p_value
+
+def test_difference_of_single_games_is_undecided():
+    assert get_difference_p_value([1.0], [0.0], True) == 1.0
+    assert get_difference_p_value([1.0], [0.0, 1.0], False) == 1.0
+    assert get_difference_p_value([1.0, 1.0, 0.9], [0.0, 0.1, 0.0], True) < 0.05
@@ -0,0 +1,42 @@
+import threading
+import pytest
+from game import GameState
+from battle import BattleState
+from config import Character, Verbose
+from agent import JawWorm
+from ggpa.random_bot import RandomBot
+from utility import LogWriter
+
+class FailingBot(RandomBot):
+    # raises on its third choice, in the middle of the battle
+    def __init__(self):
+        super().__init__()
+        self.choice_count = 0
+
+    def choose_card(self, game_state, battle_state):
+        self.choice_count += 1
+        if self.choice_count == 3:
+            raise Exception("failing bot")
+        return super().choose_card(game_state, battle_state)
+
+def test_log_is_written_when_the_battle_raises(tmp_path):
+    game_state = GameState(Character.IRON_CLAD, FailingBot(), 0, 0)
+    battle_state = BattleState(game_state, JawWorm(game_state), verbose=Verbose.LOG, log_filename=str(tmp_path / 'battle'))
+    with pytest.raises(Exception, match="failing bot"):
+        battle_state.run()
+    with open(battle_state.log_filename, 'r') as f:
+        assert '*Turn 1 - Player*' in f.read()
+
+def test_threads_share_one_log_queue(monkeypatch):
+    monkeypatch.setattr(LogWriter, '_queue', None)
+    queues = []
+    start = threading.Barrier(8)
+    def get_queue():
+        start.wait()
+        queues.append(LogWriter._get_queue())
+    threads = [threading.Thread(target=get_queue) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(q is queues[0] for q in queues)
@@ -0,0 +1,27 @@
+import os
+import pytest
+from game import GameState
+from battle import BattleState
+from config import Character, Verbose
+from agent import JawWorm
+from card import CardRepo
+from ggpa.random_bot import RandomBot
+pytest.importorskip('seaborn')
+from plot_property import LogTable
+
+def write_log(dirname: str, index: int):
+    game_state = GameState(Character.IRON_CLAD, RandomBot(), 0, index)
+    game_state.set_deck(*CardRepo.get_scenario_0()[1])
+    BattleState(game_state, JawWorm(game_state), verbose=Verbose.LOG, log_filename=os.path.join(dirname, f'{index}_RandomBot')).run()
+
+def test_cache_follows_added_and_removed_logs(tmp_path):
+    dirname = str(tmp_path)
+    for index in range(3):
+        write_log(dirname, index)
+    assert list(LogTable.from_dir(dirname, 1).get_case_names().index) == [0, 1, 2]
+    assert os.path.isfile(os.path.join(dirname, LogTable.CACHE_FILENAME))
+    os.remove(os.path.join(dirname, '1_RandomBot.log'))
+    assert list(LogTable.from_dir(dirname, 1).get_case_names().index) == [0, 2]
+    write_log(dirname, 5)
+    assert list(LogTable.from_dir(dirname, 1).get_case_names().index) == [0, 2, 5]
+    assert list(LogTable.from_dir(dirname, 1).get_case_names().index) == [0, 2, 5]
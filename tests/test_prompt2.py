@@ -0,0 +1,31 @@
+from game import GameState
+from battle import BattleState
+from config import Character, Verbose
+from agent import JawWorm
+from card import CardRepo
+from action.action import EndAgentTurn
+from ggpa.random_bot import RandomBot
+from ggpa.prompt2 import get_option_results
+
+def set_intention(enemy: JawWorm, name: str):
+    items = enemy.action_set.get_items()
+    state = enemy.action_set.get_state()
+    state[0] = next(i for i, item in enumerate(items) if name in repr(item))
+    enemy.action_set.set_state(state)
+
+def test_previews_differ_for_states_that_differ_only_in_enemy_intention():
+    game_state = GameState(Character.IRON_CLAD, RandomBot(), 0, 0)
+    game_state.set_deck(*CardRepo.get_scenario_1()[1])
+    jaw_worm = JawWorm(game_state)
+    battle_state = BattleState(game_state, jaw_worm, verbose=Verbose.NO_LOG)
+    battle_state.turn = 1
+    battle_state.mana = game_state.max_mana
+    battle_state.draw_hand()
+    state_hash = battle_state.get_zobrist_hash()
+    previews: dict[str, str] = {}
+    for name in ['Strength', 'Deal 11', 'Strength']:
+        set_intention(jaw_worm, name)
+        assert battle_state.get_zobrist_hash() == state_hash
+        preview = get_option_results(battle_state, [EndAgentTurn()])[0]
+        assert previews.setdefault(name, preview) == preview
+    assert previews['Strength'] != previews['Deal 11']
@@ -0,0 +1,29 @@
+import sqlite3
+from ggpa.prompt_cache import PromptCache
+
+def get_total(filename: str) -> tuple[int, int]:
+    # the running total, and the sum it should be equal to
+    with sqlite3.connect(filename) as connection:
+        return connection.execute('SELECT total FROM meta').fetchone()[0], connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+def test_total_follows_inserts_replacements_and_evictions(tmp_path):
+    filename = str(tmp_path / 'cache.sqlite')
+    cache = PromptCache(filename, 1000)
+    for i in range(30):
+        cache.put(f'key{i % 12}', 'x'*(10*i))
+        total, size_sum = get_total(filename)
+        assert total == size_sum
+        assert total <= 1000
+    assert cache.get('key5') == 'x'*290
+    assert cache.get('key0') is None
+
+def test_total_is_built_for_a_cache_without_it(tmp_path):
+    filename = str(tmp_path / 'cache.sqlite')
+    cache = PromptCache(filename, 1000)
+    cache.put('a', 'x'*100)
+    with sqlite3.connect(filename) as connection:
+        connection.execute('DROP TABLE meta')
+    cache = PromptCache(filename, 1000)
+    assert get_total(filename) == (101, 101)
+    cache.put('b', 'x'*100)
+    assert get_total(filename) == (202, 202)
@@ -0,0 +1,46 @@
+from game import GameState
+from battle import BattleState
+from config import Character, Verbose
+from agent import JawWorm, Goblin, Leech
+from card import CardRepo, CardGen
+from ggpa.random_bot import RandomBot
+
+class FirstOptionBot(RandomBot):
+    # a policy without random choices, so that only the battle's events can make two games differ
+    def __init__(self):
+        super().__init__()
+        self.states: list[str] = []
+
+    def choose_card(self, game_state, battle_state):
+        self.states.append(battle_state.get_visualization())
+        return self.get_choose_card_options(game_state, battle_state)[0]
+
+    def choose_agent_target(self, battle_state, list_name, agent_list):
+        return agent_list[0]
+
+    def choose_card_target(self, battle_state, list_name, card_list):
+        return card_list[0]
+
+class SearchingFirstOptionBot(FirstOptionBot):
+    # plays like FirstOptionBot, after copying and playing out every option the way the search bots do
+    def choose_card(self, game_state, battle_state):
+        for option in self.get_choose_card_options(game_state, battle_state):
+            copy = battle_state.copy_undeterministic()
+            copy.verbose = Verbose.NO_LOG
+            copy.player.bot = RandomBot()
+            copy.tick_player(option)
+        return super().choose_card(game_state, battle_state)
+
+def play(bot: FirstOptionBot, seed: int) -> list[str]:
+    game_state = GameState(Character.IRON_CLAD, bot, 0, seed)
+    game_state.set_deck(*CardRepo.get_scenario_1()[1], CardGen.Anger(), CardGen.Bomb())
+    BattleState(game_state, JawWorm(game_state), Goblin(game_state), Leech(game_state), verbose=Verbose.NO_LOG).run()
+    return bot.states
+
+def test_search_does_not_change_the_battle():
+    for seed in range(10):
+        assert play(FirstOptionBot(), seed) == play(SearchingFirstOptionBot(), seed)
+
+def test_seed_reproduces_the_battle():
+    assert play(FirstOptionBot(), 3) == play(FirstOptionBot(), 3)
+    assert play(FirstOptionBot(), 3) != play(FirstOptionBot(), 4)
@@ -0,0 +1,31 @@
+from game import GameState
+from battle import BattleState
+from battle_trace import Replayer
+from config import Character, Verbose
+from agent import JawWorm, Goblin
+from card import CardRepo
+from ggpa.random_bot import RandomBot
+
+class RecordingBot(RandomBot):
+    # keeps the positions of the random streams at each of its decisions
+    def __init__(self):
+        super().__init__()
+        self.rng_states: list[tuple[tuple, tuple]] = []
+
+    def choose_card(self, game_state, battle_state):
+        self.rng_states.append((battle_state.rng.getstate(), battle_state.policy_rng.getstate()))
+        return super().choose_card(game_state, battle_state)
+
+def test_replayed_states_restore_the_random_streams(tmp_path):
+    bot = RecordingBot()
+    game_state = GameState(Character.IRON_CLAD, bot, 0, 11)
+    game_state.set_deck(*CardRepo.get_scenario_1()[1])
+    battle_state = BattleState(game_state, JawWorm(game_state), Goblin(game_state), verbose=Verbose.NO_LOG, trace_filename=str(tmp_path / 'battle'))
+    battle_state.run()
+    replayer = Replayer(battle_state.trace_writer.filename)
+    player_steps = [step for step in range(replayer.get_step_count() - 1) if replayer.get_choice(step)[0] == 0]
+    assert len(player_steps) == len(bot.rng_states)
+    for step, (rng_state, policy_rng_state) in zip(player_steps, bot.rng_states):
+        replayed = replayer.get_battle_state(step)
+        assert replayed.rng.getstate() == rng_state
+        assert replayed.policy_rng.getstate() == policy_rng_state
@@ -0,0 +1,51 @@
+import tracemalloc
+from ggpa.transposition_table import LRUTranspositionTable, DepthPreferredTranspositionTable
+
+def test_lru_evicts_least_recently_used():
+    table = LRUTranspositionTable(3 * LRUTranspositionTable.ENTRY_BYTES)
+    for key in [1, 2, 3]:
+        table.put(key, 1, float(key))
+    assert table.get(1, 1) == 1.0
+    table.put(4, 1, 4.0)
+    assert table.get(2, 1) is None
+    assert [table.get(key, 1) for key in [1, 3, 4]] == [1.0, 3.0, 4.0]
+    table.put(5, 1, 5.0)
+    assert table.get(1, 1) is None
+    assert table.get_stats() == {'tt_hits': 4, 'tt_misses': 2, 'tt_evictions': 2, 'tt_resident_bytes': 3 * LRUTranspositionTable.ENTRY_BYTES}
+
+def test_deeper_get_misses():
+    for table in [LRUTranspositionTable(), DepthPreferredTranspositionTable(1024)]:
+        table.put(7, 2, 1.5)
+        assert table.get(7, 3) is None
+        assert table.get(7, 2) == 1.5
+        assert table.get(7, 0) == 1.5
+        assert table.get(8, 0) is None
+        stats = table.get_stats()
+        assert (stats['tt_hits'], stats['tt_misses'], stats['tt_evictions']) == (2, 2, 0)
+
+def test_depth_preferred_keeps_deeper_entries():
+    table = DepthPreferredTranspositionTable(16 * DepthPreferredTranspositionTable.ENTRY_BYTES)
+    key, colliding = 5, 5 + table.capacity
+    table.put(key, 3, 1.0)
+    table.put(colliding, 2, 2.0)
+    assert table.get(key, 3) == 1.0
+    assert table.get(colliding, 0) is None
+    assert table.get_stats()['tt_evictions'] == 0
+    table.put(colliding, 3, 3.0)
+    assert table.get(colliding, 3) == 3.0
+    assert table.get(key, 0) is None
+    table.put(colliding, 1, 4.0)
+    assert table.get(colliding, 1) == 4.0
+    stats = table.get_stats()
+    assert (stats['tt_hits'], stats['tt_misses'], stats['tt_evictions']) == (3, 2, 1)
+    assert stats['tt_resident_bytes'] == 16 * DepthPreferredTranspositionTable.ENTRY_BYTES
+
+def test_lru_entry_bytes_covers_measured_size():
+    count = 50000
+    table = LRUTranspositionTable(1 << 40)
+    tracemalloc.start()
+    for i in range(count):
+        table.put((i * 0x9E3779B97F4A7C15) & (2**64 - 1), i % 4, i * 0.5)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert 0.6 * LRUTranspositionTable.ENTRY_BYTES < used / count <= LRUTranspositionTable.ENTRY_BYTES
@@ -1,10 +1,47 @@
+from __future__ import annotations
 from typing import TypeVar, Generic
 from typing import Callable
 import random
+import copy
+import hashlib
+import functools
 import os.path
+import queue
+import threading
 
 T = TypeVar("T")
 
+class SlotCopy:
+    # copy and deepcopy for slotted classes, attribute by attribute instead of through the generic reduce path
+    __slots__ = ()
+    _slot_names: dict[type, tuple[str, ...]] = {}
+    _missing = object()
+
+    @classmethod
+    def _get_slot_names(cls) -> tuple[str, ...]:
+        names = SlotCopy._slot_names.get(cls)
+        if names is None:
+            names = tuple([name for klass in cls.__mro__ for name in klass.__dict__.get('__slots__', ())])
+            SlotCopy._slot_names[cls] = names
+        return names
+
+    def __copy__(self):
+        ret = object.__new__(self.__class__)
+        for name in self._get_slot_names():
+            value = getattr(self, name, SlotCopy._missing)
+            if value is not SlotCopy._missing:
+                setattr(ret, name, value)
+        return ret
+
+    def __deepcopy__(self, memo: dict):
+        ret = object.__new__(self.__class__)
+        memo[id(self)] = ret
+        for name in self._get_slot_names():
+            value = getattr(self, name, SlotCopy._missing)
+            if value is not SlotCopy._missing:
+                setattr(ret, name, copy.deepcopy(value, memo))
+        return ret
+
 class ItemSet(Generic[T]):
     class NoItemsAvailableExeption(Exception):
         pass
@@ -12,29 +49,59 @@ class ItemSet(Generic[T]):
     def __init__(self):
         self.cur: T|None = None
 
-    def _sample(self) -> T:
+    def _sample(self, rng: random.Random) -> T:
         raise NotImplementedError("The \"_sample\" method is not implemented for {}.".format(self.__class__.__name__))
     
-    def get(self) -> T:
-        ret = self.peek()
+    def get(self, rng: random.Random) -> T:
+        ret = self.peek(rng)
         self.cur = None
         return ret
 
-    def peek(self) -> T:
-        self.cur = self.cur if self.cur is not None else self._sample()
+    def peek(self, rng: random.Random) -> T:
+        self.cur = self.cur if self.cur is not None else self._sample(rng)
         return self.cur
 
+    def clone(self) -> ItemSet[T]:
+        # items are shared, only the sampling cursors are copied
+        return copy.copy(self)
+
+    def get_items(self) -> list[T]:
+        raise NotImplementedError("The \"get_items\" method is not implemented for {}.".format(self.__class__.__name__))
+
+    def get_state(self) -> list[int]:
+        # the sampling cursors as integers, an item is stored as its index in get_items
+        if self.cur is None:
+            return [-1]
+        items = self.get_items()
+        return [next(i for i in range(len(items)) if items[i] is self.cur)]
+
+    def set_state(self, state: list[int]) -> list[int]:
+        # restores what get_state returned and gives back the rest of the list
+        self.cur = None if state[0] == -1 else self.get_items()[state[0]]
+        return state[1:]
+
 class RoundRobinCore(ItemSet[T]):
     def __init__(self, *values: T):
         super().__init__()
         self.values = [t for t in values]
         self.index = 0
     
-    def _sample(self) -> T:
+    def _sample(self, rng: random.Random) -> T:
         ret = self.values[self.index]
         self.index = (self.index + 1) % len(self.values)
         return ret
 
+    def get_items(self) -> list[T]:
+        return self.values
+
+    def get_state(self) -> list[int]:
+        return super().get_state() + [self.index]
+
+    def set_state(self, state: list[int]) -> list[int]:
+        state = super().set_state(state)
+        self.index = state[0]
+        return state[1:]
+
 class RoundRobin(RoundRobinCore[T]):
     def __init__(self, start: int, *values: T):
         super().__init__(*values)
@@ -43,7 +110,22 @@ class RoundRobin(RoundRobinCore[T]):
 class RoundRobinRandomStart(RoundRobinCore[T]):
     def __init__(self, *values: T):
         super().__init__(*values)
-        self.index = random.randrange(0, len(self.values))
+        # the start is drawn on the first sample, from the battle's random number generator
+        self.is_started = False
+
+    def _sample(self, rng: random.Random) -> T:
+        if not self.is_started:
+            self.index = rng.randrange(0, len(self.values))
+            self.is_started = True
+        return super()._sample(rng)
+
+    def get_state(self) -> list[int]:
+        return super().get_state() + [int(self.is_started)]
+
+    def set_state(self, state: list[int]) -> list[int]:
+        state = super().set_state(state)
+        self.is_started = state[0] == 1
+        return state[1:]
 
 class ItemSequence(ItemSet[T]):
     def __init__(self, *item_sets: ItemSet[T]|T):
@@ -51,13 +133,13 @@ class ItemSequence(ItemSet[T]):
         self.item_set_list: list[ItemSet[T]|T] = [item_set for item_set in item_sets]
         self.index = 0
     
-    def _sample(self) -> T:
+    def _sample(self, rng: random.Random) -> T:
         while self.index < len(self.item_set_list):
             try:
                 value:T|ItemSet[T] = self.item_set_list[self.index]
                 if isinstance(value, ItemSet):
                     item_set: ItemSet[T] = value
-                    return item_set.get()
+                    return item_set.get(rng)
                 else:
                     self.index += 1
                     return value
@@ -65,14 +147,41 @@ class ItemSequence(ItemSet[T]):
                 self.index += 1
         raise ItemSet.NoItemsAvailableExeption()
 
+    def clone(self) -> ItemSequence[T]:
+        ret = copy.copy(self)
+        ret.item_set_list = [value.clone() if isinstance(value, ItemSet) else value for value in self.item_set_list]
+        return ret
+
+    def get_items(self) -> list[T]:
+        return [item for value in self.item_set_list for item in (value.get_items() if isinstance(value, ItemSet) else [value])]
+
+    def get_state(self) -> list[int]:
+        ret = super().get_state() + [self.index]
+        for value in self.item_set_list:
+            if isinstance(value, ItemSet):
+                ret += value.get_state()
+        return ret
+
+    def set_state(self, state: list[int]) -> list[int]:
+        state = super().set_state(state)
+        self.index = state[0]
+        state = state[1:]
+        for value in self.item_set_list:
+            if isinstance(value, ItemSet):
+                state = value.set_state(state)
+        return state
+
 class RandomizedItemSet(ItemSet[T]):
     def __init__(self, *values_and_weights: tuple[T, float]):
         super().__init__()
         self.values: list[T] = [t[0] for t in values_and_weights]
         self.weights: list[float] = [t[1] for t in values_and_weights]
 
-    def _sample(self) -> T:
-        return random.choices(self.values, weights=self.weights)[0]
+    def _sample(self, rng: random.Random) -> T:
+        return rng.choices(self.values, weights=self.weights)[0]
+
+    def get_items(self) -> list[T]:
+        return self.values
 
 class PreventRepeat(ItemSet[T]):
     MAX_TRIES = 100
@@ -85,9 +194,9 @@ class PreventRepeat(ItemSet[T]):
         self.counter: int = 0
         self.consecutive = consecutive
     
-    def _sample(self) -> T:
+    def _sample(self, rng: random.Random) -> T:
         for _ in range(PreventRepeat.MAX_TRIES):
-            ret = self.wrapped.get()
+            ret = self.wrapped.get(rng)
             if ret == self.invalid_item:
                 self.counter += 1
                 if self.counter >= self.invalid_count:
@@ -97,6 +206,22 @@ class PreventRepeat(ItemSet[T]):
                     self.counter = 0
             return ret
         raise ItemSet.NoItemsAvailableExeption()
+
+    def clone(self) -> PreventRepeat[T]:
+        ret = copy.copy(self)
+        ret.wrapped = self.wrapped.clone()
+        return ret
+
+    def get_items(self) -> list[T]:
+        return self.wrapped.get_items()
+
+    def get_state(self) -> list[int]:
+        return super().get_state() + [self.counter] + self.wrapped.get_state()
+
+    def set_state(self, state: list[int]) -> list[int]:
+        state = super().set_state(state)
+        self.counter = state[0]
+        return self.wrapped.set_state(state[1:])
     
 class PreventRepeats(ItemSet[T]):
     def __init__(self, wrapped: ItemSet[T], *invalids: tuple[T, int], consecutive: bool):
@@ -106,8 +231,22 @@ class PreventRepeats(ItemSet[T]):
             invalid_item, invalid_count = invalid
             self.wrapped = PreventRepeat(self.wrapped, invalid_item, invalid_count, consecutive)
 
-    def _sample(self) -> T:
-        return self.wrapped.get()
+    def _sample(self, rng: random.Random) -> T:
+        return self.wrapped.get(rng)
+
+    def clone(self) -> PreventRepeats[T]:
+        ret = copy.copy(self)
+        ret.wrapped = self.wrapped.clone()
+        return ret
+
+    def get_items(self) -> list[T]:
+        return self.wrapped.get_items()
+
+    def get_state(self) -> list[int]:
+        return super().get_state() + self.wrapped.get_state()
+
+    def set_state(self, state: list[int]) -> list[int]:
+        return self.wrapped.set_state(super().set_state(state))
 
 class UserInput:
     @staticmethod
@@ -180,6 +319,68 @@ def get_unique_filename(filename: str, ext: str):
         unique_filename = f'{filename}_{index}.{ext}'
     return unique_filename
 
+class LogWriter:
+    # the writes of all threaded LogWriters go through one background thread, in order
+    _queue: queue.Queue[tuple[str, str]]|None = None
+    _queue_lock = threading.Lock()
+
+    def __init__(self, filename: str, buffer_size: int, in_thread: bool):
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self.in_thread = in_thread
+        self.buffer: list[str] = []
+        self.buffered = 0
+
+    def write(self, text: str):
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+        text = ''.join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        if self.in_thread:
+            LogWriter._get_queue().put((self.filename, text))
+        else:
+            LogWriter._append(self.filename, text)
+
+    def close(self):
+        self.flush()
+        if self.in_thread:
+            LogWriter._get_queue().join()
+
+    def __getstate__(self):
+        # a copy in another process starts with an empty buffer
+        state = self.__dict__.copy()
+        state['buffer'] = []
+        state['buffered'] = 0
+        return state
+
+    @staticmethod
+    def _append(filename: str, text: str):
+        with open(filename, 'a') as f:
+            f.write(text)
+
+    @staticmethod
+    def _get_queue() -> queue.Queue[tuple[str, str]]:
+        # battles in different threads can flush at the same time, only one of them may start the writer
+        with LogWriter._queue_lock:
+            if LogWriter._queue is None:
+                LogWriter._queue = queue.Queue()
+                threading.Thread(target=LogWriter._run_writer, args=(LogWriter._queue,), daemon=True).start()
+            return LogWriter._queue
+
+    @staticmethod
+    def _run_writer(writes: queue.Queue[tuple[str, str]]):
+        while True:
+            filename, text = writes.get()
+            LogWriter._append(filename, text)
+            writes.task_done()
+
 class RandomStr:
     @staticmethod
     def _get_char_set():
@@ -187,8 +388,9 @@ class RandomStr:
         return string.ascii_uppercase + string.digits
 
     @staticmethod
-    def get_random(k: int = 6):
-        return ''.join(random.choices(RandomStr._get_char_set(), k=k))
+    def get_random(k: int = 6, rng: random.Random|None = None):
+        rng = rng if rng is not None else random.Random(random.getrandbits(64))
+        return ''.join(rng.choices(RandomStr._get_char_set(), k=k))
 
     @staticmethod
     def get_int_hashed(s: str, salt: int=42) -> int:
@@ -204,4 +406,89 @@ class RandomStr:
         splits = [s[int(len(s)*i/k):int(len(s)*(i+1)/k)] for i in range(k)]
         nums = [RandomStr.get_int_hashed(split) for split in splits]
         chrset = RandomStr._get_char_set()
-        return ''.join([chrset[n%len(chrset)] for n in nums])
\ No newline at end of file
+        return ''.join([chrset[n%len(chrset)] for n in nums])
+
+class CountedRandom(random.Random):
+    # counts the 32 bit words taken from the generator, so that a replay can return to the same point of the stream
+    def __init__(self, seed: int|str|None = None):
+        self.word_count = 0
+        super().__init__(seed)
+
+    def seed(self, a=None, version: int = 2):
+        super().seed(a, version)
+        self.word_count = 0
+
+    def random(self) -> float:
+        self.word_count += 2
+        return super().random()
+
+    def getrandbits(self, k: int) -> int:
+        self.word_count += (k + 31)//32
+        return super().getrandbits(k)
+
+    def advance(self, word_count: int):
+        # takes the words in one call, getrandbits takes exactly k/32 of them
+        if word_count > 0:
+            self.getrandbits(32*word_count)
+
+    def __reduce__(self):
+        return (self.__class__, (), (self.getstate(), self.word_count))
+
+    def __setstate__(self, state):
+        self.setstate(state[0])
+        self.word_count = state[1]
+
+class Zobrist:
+    MASK = (1 << 64) - 1
+
+    @staticmethod
+    def hash_str(s: str) -> int:
+        return int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'little')
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def key(*parts: object) -> int:
+        return Zobrist.hash_str(repr(parts))
+
+    @staticmethod
+    def mix(value: int, salt: int) -> int:
+        # splitmix64 finalizer, so that the sums kept for different components don't cancel each other out
+        z = (value + (salt + 1) * 0x9E3779B97F4A7C15) & Zobrist.MASK
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & Zobrist.MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & Zobrist.MASK
+        return z ^ (z >> 31)
+class _ActiveUndoLog(threading.local):
+    log: UndoLog|None = None
+
+class _UndoLogMeta(type):
+    # the active log is per thread, the games of an evaluation can run as threads of one process
+    _local = _ActiveUndoLog()
+
+    @property
+    def active(cls) -> UndoLog|None:
+        return cls._local.log
+
+    @active.setter
+    def active(cls, log: UndoLog|None):
+        cls._local.log = log
+
+class UndoLog(metaclass=_UndoLogMeta):
+    # UndoLog.active is the log changes are recorded to, see BattleState.make, None outside of make/unmake searches
+
+    def __init__(self):
+        # each entry undoes one change as undo(*args), they are undone in reverse order
+        self.entries: list[tuple[Callable[..., object], tuple[object, ...]]] = []
+        self.marks: list[int] = []
+
+    def record(self, undo: Callable[..., object], *args: object):
+        self.entries.append((undo, args))
+
+    def push(self):
+        self.marks.append(len(self.entries))
+
+    def pop(self):
+        mark = self.marks.pop()
+        entries = self.entries
+        while len(entries) > mark:
+            undo, args = entries.pop()
+            undo(*args)
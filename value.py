@@ -1,9 +1,12 @@
 from __future__ import annotations
 import random
+from utility import SlotCopy
 
 # Question: do we want to differentiate between CardValue and regular Value? Since only card value should be upgradable!
 
-class Value():
+class Value(SlotCopy):
+    __slots__ = ()
+
     def get(self) -> int:
         raise NotImplementedError("The \"get\" method is not defined for {}.".format(self.__class__.__name__))
     
@@ -20,6 +23,8 @@ class Value():
         return str(self.peek())
     
 class ConstValue(Value):
+    __slots__ = ('val',)
+
     def __init__(self, val: int):
         self.val = val
     
@@ -30,6 +35,8 @@ class ConstValue(Value):
         return ConstValue(self.val * -1)
 
 class Upgradable(Value):
+    __slots__ = ('upgrade_count',)
+
     def __init__(self):
         self.upgrade_count = 0
 
@@ -37,6 +44,8 @@ class Upgradable(Value):
         self.upgrade_count += times
     
 class UpgradableOnce(Upgradable):
+    __slots__ = ('val', 'upgraded', 'threshold')
+
     def __init__(self, val: int, upgraded: int, threshold: int = 1):
         super().__init__()
         self.val = val
@@ -50,7 +59,10 @@ class UpgradableOnce(Upgradable):
         return UpgradableOnce(self.val * -1, self.upgraded * -1, self.threshold)
 
 class LinearUpgradable(Upgradable):
+    __slots__ = ('val', 'step', 'threshold')
+
     def __init__(self, val: int, step: int, threshold: int = 1):
+        super().__init__()
         self.val = val
         self.step = step
         self.threshold = threshold
@@ -62,9 +74,12 @@ class LinearUpgradable(Upgradable):
         return LinearUpgradable(self.val * -1, self.step * -1, self.threshold)
     
 class RandomUniformRange(Value):
-    def __init__(self, begin: int, end: int):
+    __slots__ = ('begin', 'end', 'rng', 'value', 'peeked')
+
+    def __init__(self, begin: int, end: int, rng: random.Random|None = None):
         self.begin = begin
         self.end = end
+        self.rng = rng if rng is not None else random.Random(random.getrandbits(64))
         assert self.begin < self.end, "Begin ({}) cannot be greater than or equal to end ({}).".format(self.begin, self.end)
         self.value: int = 0
         self.peeked = False
@@ -76,8 +91,8 @@ class RandomUniformRange(Value):
     
     def peek(self):
         if not self.peeked:
-            self.value = random.randrange(self.begin, self.end)
+            self.value = self.rng.randrange(self.begin, self.end)
         return self.value
 
     def negative(self) -> RandomUniformRange:
-        return RandomUniformRange(self.end * -1, self.begin * -1)
\ No newline at end of file
+        return RandomUniformRange(self.end * -1, self.begin * -1, self.rng)
\ No newline at end of file